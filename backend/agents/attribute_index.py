@@ -0,0 +1,444 @@
+"""
+Attribute Index - In-memory bitmap index over SKU attributes
+
+"Black dress in size M in stock" asks for a product with one SKU that is
+black, size M and in stock at once. In SQL that is a join of product,
+product_variant and sku with no index on color, size or inventory. Here
+every SKU has a slot, and each attribute value (variant color, size,
+material, pattern) plus "active" and "in stock" is a set of slots. A
+filter unions the sets of the requested values within an attribute,
+intersects across attributes, and maps the surviving SKU slots to product
+ids, before any row is read.
+
+Sets are stored roaring-style, by density: a sorted uint32 array of slots
+while sparse (under 1 slot in 32), a bitmap of 64-bit words once dense.
+Intersections start from the smallest set and test the others' bits.
+
+The index is built at startup, then kept current incrementally: SKUs
+updated since the last poll (sku.updated_at, stamped by the trigger in
+migrations/006_sku_updated_at.sql) or added since are re-slotted in
+place every ATTRIBUTE_INDEX_REFRESH_SECONDS. Variant edits (which change
+many SKUs at once), SKU deletes and large batches trigger a full rebuild.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import sys
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import Integer, Select, any_, func, literal, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import Config
+from models import Product, ProductVariant, SKU
+from .facet_index import SKU_SIZE_SQL, popcount
+
+ATTRIBUTES = ("color", "size", "material", "pattern")
+
+# A sorted uint32 array costs 32 bits per member, a bitmap 1 bit per slot
+DENSE_FRACTION = 1 / 32
+
+_SKU_SQL = f"""
+    SELECT s.sku_id, v.product_id, s.status = 'ACTIVE' AS active,
+           coalesce(s.inventory_quantity, 0) > 0 AS in_stock,
+           v.color, {SKU_SIZE_SQL} AS size, v.material, v.pattern, s.updated_at
+    FROM retail.sku s
+    JOIN retail.product_variant v ON v.variant_id = s.variant_id
+"""
+
+_CHANGED_SKUS_SQL = text(_SKU_SQL + """
+    WHERE s.updated_at >= :since OR s.sku_id > :max_sku_id
+    ORDER BY s.sku_id
+""")
+
+# Variant edits and deletes, SKU deletes: changes the updated_at poll cannot see
+_REBUILD_VERSION_SQL = text("""
+    SELECT sum(CASE relname WHEN 'sku' THEN n_tup_del ELSE n_tup_upd + n_tup_del END)
+    FROM pg_stat_user_tables
+    WHERE schemaname = 'retail' AND relname IN ('product_variant', 'sku')
+""")
+
+
+class SlotSet:
+    """Set of slots: a sorted uint32 array while sparse, 64-bit words once dense"""
+
+    __slots__ = ("array", "words")
+
+    def __init__(self, array: Optional[np.ndarray] = None, words: Optional[np.ndarray] = None):
+        if words is None and array is None:
+            array = np.zeros(0, dtype=np.uint32)
+        self.array = array if words is None else None
+        self.words = words
+
+    @classmethod
+    def from_slots(cls, slots: np.ndarray, capacity: int) -> "SlotSet":
+        """From sorted, distinct slots below `capacity`"""
+        if len(slots) < capacity * DENSE_FRACTION:
+            return cls(array=slots.astype(np.uint32))
+        return cls(words=_to_words(slots, capacity))
+
+    def __len__(self) -> int:
+        return len(self.array) if self.words is None else popcount(self.words)
+
+    def contains(self, slots: np.ndarray) -> np.ndarray:
+        """Membership of each of `slots` (a bool mask)"""
+        if self.words is None:
+            if not len(self.array):
+                return np.zeros(len(slots), dtype=bool)
+            positions = np.minimum(np.searchsorted(self.array, slots), len(self.array) - 1)
+            return self.array[positions] == slots
+        slots = slots.astype(np.uint64)
+        return ((self.words[slots >> np.uint64(6)] >> (slots & np.uint64(63))) & np.uint64(1)).astype(bool)
+
+    def slots(self) -> np.ndarray:
+        if self.words is None:
+            return self.array
+        return np.flatnonzero(np.unpackbits(self.words.view(np.uint8), bitorder="little")).astype(np.uint32)
+
+    def add(self, slot: int, capacity: int) -> None:
+        if self.words is not None:
+            self.words[slot >> 6] |= np.uint64(1 << (slot & 63))
+            return
+        position = int(np.searchsorted(self.array, slot))
+        if position < len(self.array) and self.array[position] == slot:
+            return
+        self.array = np.insert(self.array, position, np.uint32(slot))
+        if len(self.array) >= capacity * DENSE_FRACTION:
+            self.words = _to_words(self.array, capacity)
+            self.array = None
+
+    def discard(self, slot: int) -> None:
+        if self.words is not None:
+            self.words[slot >> 6] &= ~np.uint64(1 << (slot & 63))
+            return
+        position = int(np.searchsorted(self.array, slot))
+        if position < len(self.array) and self.array[position] == slot:
+            self.array = np.delete(self.array, position)
+
+    def grow(self, capacity: int) -> None:
+        """Make room for slots below `capacity`"""
+        if self.words is not None and len(self.words) * 64 < capacity:
+            self.words = np.concatenate([self.words, np.zeros(_word_count(capacity) - len(self.words), np.uint64)])
+
+
+def _word_count(capacity: int) -> int:
+    return (capacity + 63) // 64
+
+
+def _to_words(slots: np.ndarray, capacity: int) -> np.ndarray:
+    bits = np.zeros(_word_count(capacity) * 64, dtype=bool)
+    bits[slots] = True
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+
+def union(sets: Sequence[SlotSet], capacity: int) -> SlotSet:
+    if len(sets) == 1:
+        return sets[0]
+    if all(s.words is None for s in sets):
+        return SlotSet.from_slots(np.unique(np.concatenate([s.array for s in sets])), capacity)
+    words = np.zeros(_word_count(capacity), dtype=np.uint64)
+    for s in sets:
+        words |= s.words if s.words is not None else _to_words(s.array, capacity)
+    return SlotSet(words=words)
+
+
+def intersect(sets: Sequence[SlotSet]) -> np.ndarray:
+    """Sorted slots in every set"""
+    arrays = sorted((s for s in sets if s.words is None), key=len)
+    bitmaps = [s for s in sets if s.words is not None]
+    if arrays:
+        # Probe every other set with the smallest array's members
+        slots = arrays[0].array
+        for other in arrays[1:]:
+            slots = np.intersect1d(slots, other.array, assume_unique=True)
+        for other in bitmaps:
+            slots = slots[other.contains(slots)]
+        return slots
+    words = bitmaps[0].words.copy()
+    for other in bitmaps[1:]:
+        words &= other.words
+    return SlotSet(words=words).slots()
+
+
+class AttributeSnapshot:
+    """Slots of SKUs with their attribute sets; updated in place"""
+
+    def __init__(self):
+        self.size = 0
+        self.capacity = 0
+        self.sku_ids = np.zeros(0, dtype=np.int64)
+        self.product_ids = np.zeros(0, dtype=np.int64)
+        self.active = SlotSet()
+        self.in_stock = SlotSet()
+        self.values: Dict[str, Dict[str, SlotSet]] = {attribute: {} for attribute in ATTRIBUTES}
+        self.labels: Dict[str, Dict[str, str]] = {attribute: {} for attribute in ATTRIBUTES}
+
+    @classmethod
+    def build(cls, rows: Sequence[Any]) -> "AttributeSnapshot":
+        """From SKU rows (_SKU_SQL columns) in sku_id order"""
+        snapshot = cls()
+        n = len(rows)
+        snapshot.size = snapshot.capacity = n
+        snapshot.sku_ids = np.fromiter((row.sku_id for row in rows), dtype=np.int64, count=n)
+        snapshot.product_ids = np.fromiter((row.product_id for row in rows), dtype=np.int64, count=n)
+        active = np.fromiter((bool(row.active) for row in rows), dtype=bool, count=n)
+        in_stock = active & np.fromiter((bool(row.in_stock) for row in rows), dtype=bool, count=n)
+        snapshot.active = SlotSet.from_slots(np.flatnonzero(active), n)
+        snapshot.in_stock = SlotSet.from_slots(np.flatnonzero(in_stock), n)
+
+        for attribute in ATTRIBUTES:
+            members: Dict[str, List[int]] = {}
+            for slot in np.flatnonzero(active):
+                value = getattr(rows[slot], attribute)
+                if value:
+                    key = value.lower()
+                    snapshot.labels[attribute].setdefault(key, value)
+                    members.setdefault(key, []).append(int(slot))
+            snapshot.values[attribute] = {
+                key: SlotSet.from_slots(np.array(slots, dtype=np.int64), n) for key, slots in members.items()
+            }
+        return snapshot
+
+    def __len__(self) -> int:
+        return self.size
+
+    def upsert(self, rows: Iterable[Any]) -> bool:
+        """Apply changed SKU rows in place; False when only a rebuild can (ids out of order)"""
+        for row in rows:
+            slot = int(np.searchsorted(self.sku_ids[:self.size], row.sku_id))
+            if slot < self.size and self.sku_ids[slot] == row.sku_id:
+                self._clear(slot)
+            elif slot == self.size:
+                slot = self._append(row.sku_id, row.product_id)
+            else:
+                return False
+            self.product_ids[slot] = row.product_id
+            if not row.active:
+                continue
+            self.active.add(slot, self.capacity)
+            if row.in_stock:
+                self.in_stock.add(slot, self.capacity)
+            for attribute in ATTRIBUTES:
+                value = getattr(row, attribute)
+                if value:
+                    key = value.lower()
+                    self.labels[attribute].setdefault(key, value)
+                    self.values[attribute].setdefault(key, SlotSet()).add(slot, self.capacity)
+        return True
+
+    def match(self, filters: Dict[str, Sequence[str]], in_stock: bool = False) -> np.ndarray:
+        """Sorted ids of products with an active SKU having one of the values of every attribute"""
+        sets = [self.in_stock if in_stock else self.active]
+        for attribute, wanted in filters.items():
+            value_sets = [self.values[attribute][key] for key in {v.lower() for v in wanted}
+                          if key in self.values[attribute]]
+            if not value_sets:
+                return np.zeros(0, dtype=np.int64)
+            sets.append(union(value_sets, self.capacity))
+        return np.unique(self.product_ids[intersect(sets)])
+
+    def vocabulary(self, attribute: str) -> List[str]:
+        return list(self.labels[attribute].values())
+
+    def _sets(self) -> Iterable[SlotSet]:
+        yield self.active
+        yield self.in_stock
+        for values in self.values.values():
+            yield from values.values()
+
+    def _clear(self, slot: int) -> None:
+        for slot_set in self._sets():
+            slot_set.discard(slot)
+
+    def _append(self, sku_id: int, product_id: int) -> int:
+        if self.size == self.capacity:
+            self.capacity = max(1024, int(self.capacity * 1.5))
+            self.sku_ids = np.resize(self.sku_ids, self.capacity)
+            self.product_ids = np.resize(self.product_ids, self.capacity)
+            for slot_set in self._sets():
+                slot_set.grow(self.capacity)
+        slot = self.size
+        self.sku_ids[slot] = sku_id
+        self.size += 1
+        return slot
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "skus": self.size,
+            "active_skus": len(self.active),
+            "in_stock_skus": len(self.in_stock),
+            "values": {attribute: len(values) for attribute, values in self.values.items()},
+            "dense_sets": sum(1 for s in self._sets() if s.words is not None),
+            "bytes": sum(s.words.nbytes if s.words is not None else s.array.nbytes for s in self._sets())
+                     + self.sku_ids.nbytes + self.product_ids.nbytes,
+        }
+
+
+class AttributeIndex:
+    """Shared SKU attribute index, built at startup and updated as SKUs change"""
+
+    def __init__(self, enabled: bool = True, refresh_seconds: float = 15.0, rebuild_ratio: float = 0.1):
+        self.enabled = enabled
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_ratio = rebuild_ratio
+        self.snapshot: Optional[AttributeSnapshot] = None
+        self.build_seconds: Optional[float] = None
+        self.builds = 0
+        self.updated_skus = 0
+        self.matches = 0
+        self._watermark: Optional[datetime] = None
+        # updated_at of SKUs applied within the overlap the next poll re-reads
+        self._applied: Dict[int, Optional[datetime]] = {}
+        self._rebuild_version: Any = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    def start(self) -> None:
+        """Build in the background, then poll for SKU changes"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def load(self) -> None:
+        """(Re)build the whole index"""
+        from database import AsyncSessionLocal
+
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            # Server clock, to compare with updated_at
+            watermark = await db.scalar(select(func.localtimestamp()))
+            rebuild_version = await db.scalar(_REBUILD_VERSION_SQL)
+            rows = (await db.execute(text(_SKU_SQL + " ORDER BY s.sku_id"))).all()
+        self.snapshot = await asyncio.to_thread(AttributeSnapshot.build, rows)
+        since = watermark - self._overlap
+        self._applied = {row.sku_id: row.updated_at for row in rows if row.updated_at and row.updated_at >= since}
+        self._watermark = watermark
+        self._rebuild_version = rebuild_version
+        self.build_seconds = time.perf_counter() - start
+        self.builds += 1
+
+    @property
+    def _overlap(self) -> timedelta:
+        # A transaction can commit an updated_at older than the poll that missed it
+        return timedelta(seconds=max(self.refresh_seconds, 5))
+
+    async def refresh(self) -> int:
+        """Apply SKUs changed since the last poll; returns how many (a rebuild counts all)"""
+        from database import AsyncSessionLocal
+
+        if self.snapshot is None or self._watermark is None:
+            await self.load()
+            return len(self.snapshot)
+        snapshot = self.snapshot
+        async with AsyncSessionLocal() as db:
+            # The next poll starts from this one's start, less the overlap
+            now = await db.scalar(select(func.localtimestamp()))
+            if await db.scalar(_REBUILD_VERSION_SQL) != self._rebuild_version:
+                rows = None
+            else:
+                since = self._watermark - self._overlap
+                max_sku_id = int(snapshot.sku_ids[snapshot.size - 1]) if snapshot.size else 0
+                rows = (await db.execute(_CHANGED_SKUS_SQL, {"since": since, "max_sku_id": max_sku_id})).all()
+        # Rows re-read by the overlap are already applied
+        changed = None if rows is None else [
+            row for row in rows if row.sku_id not in self._applied or self._applied[row.sku_id] != row.updated_at
+        ]
+        if changed is None or len(changed) > max(1024, self.rebuild_ratio * len(snapshot)) \
+                or not snapshot.upsert(changed):
+            await self.load()
+            return len(self.snapshot)
+        self._applied = {row.sku_id: row.updated_at for row in rows}
+        self._watermark = now
+        self.updated_skus += len(changed)
+        return len(changed)
+
+    def match(self, filters: Dict[str, Sequence[str]], in_stock: bool = False) -> Optional[np.ndarray]:
+        """Product ids passing the filters, or None before the first build"""
+        if self.snapshot is None:
+            return None
+        self.matches += 1
+        return self.snapshot.match(filters, in_stock)
+
+    def vocabulary(self, attribute: str) -> List[str]:
+        """Known values of an attribute (empty before the first build)"""
+        return self.snapshot.vocabulary(attribute) if self.snapshot is not None else []
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "builds": self.builds,
+            "build_seconds": round(self.build_seconds, 3) if self.build_seconds is not None else None,
+            "updated_skus": self.updated_skus,
+            "matches": self.matches,
+        }
+        if self.snapshot is not None:
+            stats.update(self.snapshot.get_stats())
+        return stats
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Attribute index refresh failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+
+# Shared instance (lazy initialization)
+_attribute_index_instance: Optional[AttributeIndex] = None
+
+
+def get_attribute_index() -> AttributeIndex:
+    """Get or create the attribute index shared by the agents"""
+    global _attribute_index_instance
+    if _attribute_index_instance is None:
+        _attribute_index_instance = AttributeIndex(
+            enabled=Config.ATTRIBUTE_INDEX_ENABLED,
+            refresh_seconds=Config.ATTRIBUTE_INDEX_REFRESH_SECONDS
+        )
+    return _attribute_index_instance
+
+
+def apply_attribute_filter(query: Select, filters: Dict[str, Sequence[str]], in_stock: bool = False,
+                           product_ids: Optional[np.ndarray] = None) -> Select:
+    """Keep products with an active SKU matching every attribute filter
+
+    `product_ids` is the index's answer for these filters, when already
+    computed; without the index the same condition is a semi-join.
+    """
+    if not filters and not in_stock:
+        return query
+    if product_ids is None:
+        product_ids = get_attribute_index().match(filters, in_stock)
+    if product_ids is not None:
+        return query.where(Product.product_id == any_(literal(product_ids.tolist(), ARRAY(Integer))))
+
+    skus = select(ProductVariant.product_id).join(SKU).where(SKU.status == "ACTIVE")
+    columns = {
+        "color": ProductVariant.color,
+        "size": func.coalesce(ProductVariant.size, func.substring(SKU.sku_code, "[^-]+$")),
+        "material": ProductVariant.material,
+        "pattern": ProductVariant.pattern,
+    }
+    for attribute, wanted in filters.items():
+        skus = skus.where(func.lower(columns[attribute]).in_([v.lower() for v in wanted]))
+    if in_stock:
+        skus = skus.where(SKU.inventory_quantity > 0)
+    return query.where(Product.product_id.in_(skus))
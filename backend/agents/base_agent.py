@@ -3,19 +3,32 @@ Base Agent class with common functionality
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
-from sqlalchemy.orm import Session
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Callable
+import time
+from sqlalchemy.ext.asyncio import AsyncSession
 import sys
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
-from llm_provider import get_llm_provider, LLMProviderFactory
+from llm_provider import get_llm_provider, LLMProviderFactory, current_agent
+from llm_cache import get_llm_cache
+
+# When set, call_llm streams tokens from the provider into this callback.
+# The orchestrator sets it per request for the streaming chat endpoint.
+token_sink: ContextVar[Optional[Callable[[str], None]]] = ContextVar("token_sink", default=None)
 
 
 class BaseAgent(ABC):
     """Base class for all agents"""
     
+    # Response cache opt-in: TTL in seconds for this agent's LLM calls (None
+    # disables caching). Only calls detected as deterministic (low temperature,
+    # no tools) are cached unless llm_cache_nondeterministic is set.
+    llm_cache_ttl: Optional[float] = None
+    llm_cache_nondeterministic: bool = False
+    
     def __init__(self, name: str, system_prompt: str):
         self.name = name
         self.system_prompt = system_prompt
@@ -23,7 +36,7 @@ class BaseAgent(ABC):
         self.default_model = LLMProviderFactory.get_default_model()
     
     @abstractmethod
-    async def process(self, message: str, context: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    async def process(self, message: str, context: Dict[str, Any], db: AsyncSession) -> Dict[str, Any]:
         """Process a message and return response"""
         pass
     
@@ -42,14 +55,61 @@ class BaseAgent(ABC):
         system_message = {"role": "system", "content": self.system_prompt}
         all_messages = [system_message] + messages
         
-        response = await self.llm_provider.chat_completion(
-            messages=all_messages,
-            model=model or self.default_model,
-            tools=tools,
-            temperature=temperature
-        )
+        agent_token = current_agent.set(self.name)
+        try:
+            return await self._complete(all_messages, tools, temperature, model or self.default_model)
+        finally:
+            current_agent.reset(agent_token)
+    
+    async def _complete(
+        self,
+        all_messages: List[Dict[str, str]],
+        tools: Optional[List],
+        temperature: float,
+        model: str
+    ) -> str:
+        """Run one completion through the response cache and token sink"""
+        cache = get_llm_cache()
+        cache_key = None
+        if cache is not None and self.llm_cache_ttl and (
+            self.llm_cache_nondeterministic or cache.is_deterministic(temperature, tools)
+        ):
+            cache_key = cache.make_key(model, all_messages, temperature, tools)
+        
+        sink = token_sink.get()
+        if sink is not None:
+            if cache_key:
+                cached = await cache.lookup(cache_key, self.name)
+                if cached is not None:
+                    sink(cached)
+                    return cached
+            
+            start = time.perf_counter()
+            chunks = []
+            async for chunk in self.llm_provider.chat_completion_stream(
+                messages=all_messages,
+                model=model,
+                tools=tools,
+                temperature=temperature
+            ):
+                chunks.append(chunk)
+                sink(chunk)
+            response = "".join(chunks)
+            if cache_key and response:
+                cache.store(cache_key, response, self.llm_cache_ttl, time.perf_counter() - start)
+            return response
+        
+        def complete():
+            return self.llm_provider.chat_completion(
+                messages=all_messages,
+                model=model,
+                tools=tools,
+                temperature=temperature
+            )
         
-        return response
+        if cache_key:
+            return await cache.get_or_call(cache_key, self.name, self.llm_cache_ttl, complete)
+        return await complete()
     
     def validate_response(self, response: Dict[str, Any]) -> bool:
         """Validate agent response"""
@@ -0,0 +1,497 @@
+"""
+Catalog Index - In-process BM25 keyword index over the product catalog
+
+Keyword search in agents otherwise costs a Postgres round-trip per query.
+CatalogIndex keeps an inverted index of active products in memory and
+answers with product ids ranked by BM25, so callers only hydrate the top-k
+rows. Indexed fields, by weight: product name and brand, hierarchy path
+and product type, metadata values.
+
+Each term's postings are two numpy arrays: document slots and the
+document's precomputed BM25 term weight (term frequency saturated and
+normalised by length), so a query only multiplies by idf and sums. Updates
+are appended to small per-term pending lists and replaced documents are
+tombstoned; both are merged back into the arrays once they grow past a
+fraction of the index, and the merge renumbers the surviving documents so
+slots freed by replacements are reclaimed. The average document length is
+fixed when the index is built.
+
+The index is built at startup from the database (or from
+data/products.parquet, then caught up with products the database changed
+since the file was written) in a worker thread, then kept current by
+polling retail.product.updated_at every CATALOG_INDEX_REFRESH_SECONDS.
+"""
+
+import asyncio
+import math
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import sys
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import DateTime, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import Config
+from models import Product, ProductHierarchy
+
+FIELD_WEIGHTS = {"name": 3.0, "brand": 3.0, "path": 2.0, "type": 2.0, "metadata": 1.0}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = {"a", "an", "and", "the", "of", "for", "with", "in", "on", "to", "or", "by", "at"}
+
+
+def _stem(token: str) -> str:
+    """Fold common English plurals ("dresses" -> "dress", "boots" -> "boot")"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("sses", "ches", "shes", "xes", "zes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [_stem(t) for t in _TOKEN_RE.findall(text.lower()) if t not in _STOP_WORDS]
+
+
+def document_terms(fields: Dict[str, Any]) -> Counter:
+    """Weighted term frequencies for one product's fields"""
+    terms: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        value = fields.get(field)
+        if field == "metadata" and isinstance(value, dict):
+            value = " ".join(str(v) for v in value.values() if isinstance(v, (str, int, float)))
+        elif field == "path" and value:
+            value = value.replace("/", " ")
+        for term in tokenize(value):
+            terms[term] += weight
+    return terms
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring, array postings and in-place updates"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, merge_ratio: float = 0.1):
+        self.k1 = k1
+        self.b = b
+        self.merge_ratio = merge_ratio
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: Dict[str, Tuple[List[int], List[float]]] = {}
+        self._pending_count = 0
+        self._posting_count = 0
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._live = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._slots: Dict[int, int] = {}
+        self._avg_length = 0.0
+        self._removed = 0
+        self.merges = 0
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[int, Dict[str, Any]]], **kwargs) -> "BM25Index":
+        """Bulk-build from (product_id, fields) pairs"""
+        index = cls(**kwargs)
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        ids: List[int] = []
+        lengths: List[float] = []
+        for product_id, fields in documents:
+            if product_id in index._slots:
+                continue
+            slot = len(ids)
+            terms = document_terms(fields)
+            for term, tf in terms.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = ([], [])
+                entry[0].append(slot)
+                entry[1].append(tf)
+            index._slots[product_id] = slot
+            ids.append(product_id)
+            lengths.append(sum(terms.values()))
+
+        index._ids = np.array(ids, dtype=np.int64)
+        index._live = np.ones(len(ids), dtype=bool)
+        index._size = len(ids)
+        index._avg_length = float(np.mean(lengths)) if lengths else 0.0
+        lengths = np.array(lengths, dtype=np.float32)
+        for term, (slots, tfs) in postings.items():
+            slots = np.array(slots, dtype=np.int32)
+            weights = index._term_weights(np.array(tfs, dtype=np.float32), lengths[slots])
+            index._postings[term] = (slots, weights)
+            index._posting_count += len(slots)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self._slots
+
+    def product_ids(self) -> List[int]:
+        return list(self._slots)
+
+    def upsert(self, product_id: int, fields: Dict[str, Any]) -> None:
+        """Index a product, replacing any earlier version of it"""
+        self.remove(product_id)
+        terms = document_terms(fields)
+        length = float(sum(terms.values()))
+        if not self._avg_length:
+            self._avg_length = length or 1.0
+        slot = self._new_slot(product_id)
+        tfs = np.fromiter(terms.values(), dtype=np.float32, count=len(terms))
+        weights = self._term_weights(tfs, np.float32(length))
+        for term, weight in zip(terms, weights.tolist()):
+            entry = self._pending.get(term)
+            if entry is None:
+                entry = self._pending[term] = ([], [])
+            entry[0].append(slot)
+            entry[1].append(weight)
+        self._pending_count += len(terms)
+        self._maybe_merge()
+
+    def remove(self, product_id: int) -> bool:
+        """Tombstone a product; its postings are dropped at the next merge"""
+        slot = self._slots.pop(product_id, None)
+        if slot is None:
+            return False
+        self._live[slot] = False
+        self._removed += 1
+        self._maybe_merge()
+        return True
+
+    def merge(self) -> None:
+        """Fold pending postings into the arrays, drop removed products and compact slots"""
+        live = self._live[:self._size]
+        live_slots = np.flatnonzero(live)
+        # Surviving documents keep their order, renumbered from 0
+        renumber = np.full(self._size, -1, dtype=np.int32)
+        renumber[live_slots] = np.arange(len(live_slots), dtype=np.int32)
+        postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        count = 0
+        for term in set(self._postings) | set(self._pending):
+            slots, weights = self._term_postings(term)
+            keep = live[slots]
+            if not keep.all():
+                slots, weights = slots[keep], weights[keep]
+            if len(slots):
+                postings[term] = (renumber[slots], weights)
+                count += len(slots)
+        self._ids = self._ids[live_slots]
+        self._live = np.ones(len(live_slots), dtype=bool)
+        self._size = len(live_slots)
+        self._slots = dict(zip(self._ids.tolist(), range(self._size)))
+        self._postings = postings
+        self._pending = {}
+        self._pending_count = 0
+        self._removed = 0
+        self._posting_count = count
+        self.merges += 1
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[int, float]]:
+        """Top-k (product_id, score) pairs for a free-text query, best first"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        n_docs = len(self._slots)
+        if not terms or not n_docs or k <= 0:
+            return []
+
+        slot_parts: List[np.ndarray] = []
+        score_parts: List[np.ndarray] = []
+        for term in terms:
+            slots, weights = self._term_postings(term)
+            # Tombstoned postings stay until the next merge; df and n_docs
+            # count live documents only, so idf stays positive
+            live = self._live[slots]
+            if not live.all():
+                slots, weights = slots[live], weights[live]
+            df = len(slots)
+            if not df:
+                continue
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            slot_parts.append(slots)
+            score_parts.append(weights * np.float32(idf))
+        if not slot_parts:
+            return []
+
+        if len(slot_parts) > 1 and sum(len(part) for part in slot_parts) * 16 > self._size:
+            # Common terms: accumulate into a dense array over all slots
+            # (slots are unique within one term's postings)
+            scores = np.zeros(self._size, dtype=np.float32)
+            for part_slots, part_scores in zip(slot_parts, score_parts):
+                scores[part_slots] += part_scores
+            slots = np.arange(self._size, dtype=np.int32)
+            if self._size > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                slots, scores = slots[top], scores[top]
+            keep = scores > 0
+            slots, scores = slots[keep], scores[keep]
+        else:
+            if len(slot_parts) == 1:
+                slots, scores = slot_parts[0], score_parts[0]
+            else:
+                slots, inverse = np.unique(np.concatenate(slot_parts), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        if len(slots) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            slots, scores = slots[top], scores[top]
+        ids = self._ids[slots]
+        order = np.lexsort((ids, -scores))
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self._slots),
+            "terms": len(self._postings) + sum(1 for t in self._pending if t not in self._postings),
+            "postings": self._posting_count,
+            "pending_postings": self._pending_count,
+            "removed_since_merge": self._removed,
+            "slots": self._size,
+            "merges": self.merges,
+        }
+
+    def _term_weights(self, tfs: np.ndarray, lengths) -> np.ndarray:
+        """BM25 term-frequency component for the given documents"""
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / self._avg_length)
+        return (tfs * (self.k1 + 1.0) / (tfs + norm)).astype(np.float32)
+
+    def _maybe_merge(self) -> None:
+        if (self._pending_count > max(1024, self.merge_ratio * self._posting_count)
+                or self._removed > max(256, self.merge_ratio * len(self._slots))):
+            self.merge()
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        base = self._postings.get(term)
+        pending = self._pending.get(term)
+        if pending is None:
+            if base is None:
+                return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+            return base
+        slots = np.array(pending[0], dtype=np.int32)
+        weights = np.array(pending[1], dtype=np.float32)
+        if base is None:
+            return slots, weights
+        return np.concatenate((base[0], slots)), np.concatenate((base[1], weights))
+
+    def _new_slot(self, product_id: int) -> int:
+        if self._size == len(self._ids):
+            capacity = max(1024, 2 * len(self._ids))
+            self._ids = np.resize(self._ids, capacity)
+            live = np.zeros(capacity, dtype=bool)
+            live[:self._size] = self._live[:self._size]
+            self._live = live
+        slot = self._size
+        self._size += 1
+        self._ids[slot] = product_id
+        self._live[slot] = True
+        self._slots[product_id] = slot
+        return slot
+
+
+def _product_query():
+    return select(
+        Product.product_id, Product.product_name, Product.brand_name, Product.product_type,
+        Product.product_metadata, Product.status, Product.updated_at, ProductHierarchy.hierarchy_path
+    ).outerjoin(ProductHierarchy, ProductHierarchy.hierarchy_id == Product.hierarchy_id)
+
+
+def _fields(row) -> Dict[str, Any]:
+    return {
+        "name": row.product_name,
+        "brand": row.brand_name,
+        "path": row.hierarchy_path,
+        "type": row.product_type,
+        "metadata": row.product_metadata,
+    }
+
+
+class CatalogIndex:
+    """Shared BM25 index of active products, loaded at startup and kept current"""
+
+    def __init__(self, source: str = "db", refresh_seconds: float = 30.0,
+                 data_dir: Optional[str] = None):
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.data_dir = Path(data_dir) if data_dir else Path(__file__).parent.parent.parent / "data"
+        self.index: Optional[BM25Index] = None
+        self.build_seconds: Optional[float] = None
+        self.refreshed_products = 0
+        self.searches = 0
+        self._watermark: Optional[datetime] = None
+        # updated_at of the rows read by the last poll, which the next poll's overlap re-reads
+        self._applied: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.source in ("db", "parquet")
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    def start(self) -> None:
+        """Build in the background, then poll for product changes"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def load(self) -> None:
+        """(Re)build the whole index from the configured source"""
+        from database import AsyncSessionLocal
+
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            # Server clock, to compare with updated_at
+            watermark = await db.scalar(select(func.localtimestamp()))
+            since = watermark - self._overlap
+            if self.source == "parquet":
+                documents, exported = await asyncio.to_thread(self._read_parquet)
+                index = await asyncio.to_thread(BM25Index.build, documents)
+                rows = await self._catch_up(db, index, exported)
+            else:
+                rows = (await db.execute(_product_query().where(Product.status == "ACTIVE"))).all()
+                documents = [(row.product_id, _fields(row)) for row in rows]
+                index = await asyncio.to_thread(BM25Index.build, documents)
+        self.index = index
+        self._watermark = watermark
+        self._applied = {row.product_id: row.updated_at for row in rows
+                         if row.updated_at and row.updated_at >= since}
+        self.build_seconds = time.perf_counter() - start
+        print(f"✓ Catalog index: {len(self.index):,} products from {self.source} "
+              f"in {self.build_seconds:.2f}s")
+
+    async def _catch_up(self, db: AsyncSession, index: BM25Index, exported: float) -> List[Any]:
+        """Apply what the database changed since the parquet export; returns the rows re-read
+
+        The file has no updated_at, so products updated after its mtime are
+        re-read, and activations and deactivations are found by comparing
+        the index with every product's status.
+        """
+        changed = func.coalesce(Product.updated_at >= cast(func.to_timestamp(exported), DateTime), False)
+        states = (await db.execute(select(Product.product_id, Product.status, changed.label("changed")))).all()
+        active = {state.product_id for state in states if state.status == "ACTIVE"}
+        stale = [state.product_id for state in states
+                 if state.product_id in active and (state.changed or state.product_id not in index)]
+        for product_id in [product_id for product_id in index.product_ids() if product_id not in active]:
+            index.remove(product_id)
+        rows = (await db.execute(_product_query().where(Product.product_id.in_(stale)))).all() if stale else []
+        for row in rows:
+            index.upsert(row.product_id, _fields(row))
+        self.refreshed_products += len(rows)
+        return rows
+
+    @property
+    def _overlap(self) -> timedelta:
+        # A transaction can commit an updated_at older than the poll that missed it
+        return timedelta(seconds=max(self.refresh_seconds, 5))
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """Apply products updated since the last load or refresh; returns rows applied"""
+        if self.index is None or self._watermark is None:
+            return 0
+        # The next poll starts from this one's start, less the overlap
+        now = await db.scalar(select(func.localtimestamp()))
+        rows = (await db.execute(
+            _product_query().where(Product.updated_at >= self._watermark - self._overlap)
+        )).all()
+        applied = 0
+        for row in rows:
+            if self._applied.get(row.product_id) == row.updated_at:
+                continue  # re-read by the overlap, already indexed
+            if row.status == "ACTIVE":
+                self.index.upsert(row.product_id, _fields(row))
+            else:
+                self.index.remove(row.product_id)
+            applied += 1
+        self._applied = {row.product_id: row.updated_at for row in rows}
+        self._watermark = now
+        self.refreshed_products += applied
+        return applied
+
+    def search(self, keywords: str, k: int = 20) -> List[Tuple[int, float]]:
+        if self.index is None:
+            return []
+        self.searches += 1
+        return self.index.search(keywords, k)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "source": self.source,
+            "ready": self.ready,
+            "build_seconds": round(self.build_seconds, 3) if self.build_seconds is not None else None,
+            "refreshed_products": self.refreshed_products,
+            "searches": self.searches,
+        }
+        if self.index is not None:
+            stats.update(self.index.get_stats())
+        return stats
+
+    async def _run(self) -> None:
+        from database import AsyncSessionLocal
+
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"⚠️ Catalog index build failed, keyword search stays on Postgres: {e}")
+            return
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.refresh(db)
+            except Exception as e:
+                print(f"⚠️ Catalog index refresh failed: {e}")
+
+    def _read_parquet(self) -> Tuple[List[Tuple[int, Dict[str, Any]]], float]:
+        """Active products of the export, and the file's mtime (epoch seconds)"""
+        import pandas as pd
+
+        path = self.data_dir / "products.parquet"
+        exported = path.stat().st_mtime
+        products = pd.read_parquet(path)
+        hierarchy = pd.read_parquet(self.data_dir / "hierarchy.parquet", columns=["hierarchy_id", "hierarchy_path"])
+        paths = dict(zip(hierarchy["hierarchy_id"], hierarchy["hierarchy_path"]))
+        products = products[products["status"] == "ACTIVE"]
+        return [
+            (int(row.product_id), {
+                "name": row.product_name,
+                "brand": row.brand_name,
+                "path": paths.get(row.hierarchy_id),
+                "type": row.product_type,
+                "metadata": row.metadata,
+            })
+            for row in products.itertuples(index=False)
+        ], exported
+
+
+# Shared instance (lazy initialization)
+_catalog_index_instance: Optional[CatalogIndex] = None
+
+
+def get_catalog_index() -> CatalogIndex:
+    """Get or create the index shared by all agents"""
+    global _catalog_index_instance
+    if _catalog_index_instance is None:
+        _catalog_index_instance = CatalogIndex(
+            source=Config.CATALOG_INDEX_SOURCE,
+            refresh_seconds=Config.CATALOG_INDEX_REFRESH_SECONDS
+        )
+    return _catalog_index_instance
@@ -0,0 +1,225 @@
+"""
+Catalog Search - Full-text product search shared by the API and agents
+
+Products carry a weighted tsvector (retail.product.search_vector, set by
+the trigger in migrations/002_product_search.sql): name and brand weigh
+most, then hierarchy path and product type, then metadata style and
+occasion, then description. Queries are parsed with websearch_to_tsquery,
+so quoted phrases, "or" and -exclusions work; matching goes through the
+GIN index and results are ordered by ts_rank.
+
+Ranking reads every matched vector, so a broad term over a large catalog
+ranks a large share of it. By default every match is ranked. Setting
+SEARCH_RANK_CANDIDATES caps that: the newest matches (highest product ids)
+up to the cap are ranked and the rest are never considered, so broad
+queries become approximate (narrower ones stay exact).
+
+Misspellings ("sneekers", "adiddas") match nothing in full text, so
+search_with_fallback() adds a trigram word-similarity branch on product
+name and brand (migrations/003_product_fuzzy_search.sql). Both branches go
+out as one statement; the fuzzy one only runs when the exact one is empty.
+
+vector_search() is the semantic counterpart: cosine-distance KNN on
+retail.product.embedding through the pgvector index, with the status and
+price filters applied in the same scan.
+
+reciprocal_rank_fusion() merges ranked lists from both (hybrid search):
+each product scores sum(1 / (k + rank)) over the lists it appears in, so
+agreement between keyword and vector rankings counts for more than a high
+score in either, and their incomparable score scales never meet.
+"""
+
+import re
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+import sys
+from pathlib import Path
+
+from sqlalchemy import Select, exists, func, literal, literal_column, or_, select, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import Config
+from models import Product, ProductVariant, SKU
+
+# Text search configuration used to build the stored vectors
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+
+
+def to_tsquery(keywords: str):
+    """Parse free text with web-search syntax"""
+    return func.websearch_to_tsquery(SEARCH_CONFIG, keywords)
+
+
+def _ranked_matches(query: Select, keywords: str) -> Tuple[Select, object]:
+    """Full-text matches of `query` (capped if configured) and the rank expression over them"""
+    tsquery = to_tsquery(keywords)
+    matches = query.where(
+        Product.search_vector.bool_op("@@")(tsquery)
+    ).with_only_columns(
+        Product.product_id, Product.search_vector
+    )
+    if Config.SEARCH_RANK_CANDIDATES > 0:
+        # Approximate: a fixed subset (the newest matches), not whichever rows come first
+        matches = matches.order_by(Product.product_id.desc()).limit(Config.SEARCH_RANK_CANDIDATES)
+    matches = matches.subquery("matches")
+    return matches, func.ts_rank(matches.c.search_vector, tsquery)
+
+
+def apply_keyword_search(query: Select, keywords: str) -> Select:
+    """Restrict a product query to full-text matches, best matches first
+
+    Apply this after the query's other filters: they narrow the matches
+    before any ranking cap is taken.
+    """
+    matches, rank = _ranked_matches(query, keywords)
+    return select(Product).join(
+        matches, matches.c.product_id == Product.product_id
+    ).order_by(rank.desc(), Product.product_id)
+
+
+def _fuzzy_similarity(keywords: str):
+    term = literal(keywords)
+    return func.greatest(
+        func.word_similarity(term, Product.product_name),
+        func.coalesce(func.word_similarity(term, Product.brand_name), 0)
+    )
+
+
+def apply_fuzzy_search(query: Select, keywords: str) -> Select:
+    """Restrict a product query to names or brands containing a word close to `keywords`"""
+    term = literal(keywords)
+    similarity = _fuzzy_similarity(keywords)
+    return query.where(
+        # <% is answered from the trigram GIN indexes
+        or_(term.op("<%")(Product.product_name), term.op("<%")(Product.brand_name)),
+        similarity >= Config.SEARCH_FUZZY_THRESHOLD
+    ).order_by(similarity.desc(), Product.product_id)
+
+
+def search_with_fallback(query: Select, keywords: str, limit: int = 20) -> Select:
+    """Full-text hits, or fuzzy hits when there are none, in a single statement
+
+    Rows are (Product, fuzzy); `fuzzy` is True for trigram matches.
+    """
+    matches, rank = _ranked_matches(query, keywords)
+    exact = select(
+        matches.c.product_id, literal(False).label("fuzzy"), rank.label("score")
+    ).order_by(rank.desc(), matches.c.product_id).limit(limit).cte("exact")
+
+    similarity = _fuzzy_similarity(keywords)
+    fuzzy = apply_fuzzy_search(query, keywords).where(
+        # Evaluated once up front: the fuzzy scan is skipped when exact matched
+        ~exists(select(exact.c.product_id))
+    ).with_only_columns(
+        Product.product_id, literal(True).label("fuzzy"), similarity.label("score")
+    ).limit(limit)
+
+    hits = union_all(select(exact), fuzzy).subquery("hits")
+    return select(Product, hits.c.fuzzy).join(
+        hits, hits.c.product_id == Product.product_id
+    ).order_by(hits.c.score.desc(), Product.product_id)
+
+
+async def match_ids(db: AsyncSession, query: Select, keywords: Optional[str],
+                    limit: int) -> Tuple[List[int], bool]:
+    """Ids of all products of `query` matching `keywords` in full text, up to `limit`
+
+    Returns the ids and whether there were more. Unranked, so it reads
+    only the GIN index and matching rows.
+    """
+    ids_query = query.with_only_columns(Product.product_id)
+    if keywords:
+        ids_query = ids_query.where(Product.search_vector.bool_op("@@")(to_tsquery(keywords)))
+    ids = (await db.execute(ids_query.limit(limit + 1))).scalars().all()
+    return list(ids[:limit]), len(ids) > limit
+
+
+def apply_price_filter(query: Select, price_min: Optional[float] = None,
+                       price_max: Optional[float] = None) -> Select:
+    """Keep products with an active SKU priced within the range"""
+    if price_min is None and price_max is None:
+        return query
+    # Semi-join, so a product with several SKUs in range is returned once
+    priced = select(ProductVariant.product_id).join(SKU).where(SKU.status == "ACTIVE")
+    if price_min is not None:
+        priced = priced.where(SKU.price >= price_min)
+    if price_max is not None:
+        priced = priced.where(SKU.price <= price_max)
+    return query.where(Product.product_id.in_(priced))
+
+
+async def search_products(db: AsyncSession, keywords: str, limit: int = 20) -> Tuple[List[Product], bool]:
+    """Active products matching `keywords`, ranked by relevance
+
+    Returns the products and whether they came from the fuzzy fallback.
+    """
+    query = search_with_fallback(select(Product).where(Product.status == "ACTIVE"), keywords, limit)
+    rows = (await db.execute(query)).all()
+    return [row[0] for row in rows], any(row[1] for row in rows)
+
+
+# pgvector version of the connected database, read once
+_pgvector_version: Optional[Tuple[int, ...]] = None
+
+
+async def configure_vector_scan(db: AsyncSession) -> None:
+    """Set this transaction's ANN scan parameters (probes, ef_search, iterative scans)"""
+    global _pgvector_version
+    if _pgvector_version is None:
+        version = await db.scalar(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+        _pgvector_version = tuple(int(part) for part in re.findall(r"\d+", version or "0"))
+
+    settings = {
+        "ivfflat.probes": Config.VECTOR_SEARCH_PROBES,
+        "hnsw.ef_search": Config.VECTOR_SEARCH_EF_SEARCH,
+    }
+    # Older pgvector rejects these names, and stops after one pass over the
+    # probed lists (or ef_search candidates) even when filters leave fewer
+    # rows than the limit
+    if _pgvector_version >= (0, 8) and Config.VECTOR_SEARCH_ITERATIVE_SCAN != "off":
+        settings["hnsw.iterative_scan"] = Config.VECTOR_SEARCH_ITERATIVE_SCAN
+        settings["ivfflat.iterative_scan"] = "relaxed_order"
+    await db.execute(select(*[func.set_config(name, str(value), True) for name, value in settings.items()]))
+
+
+def apply_vector_search(query: Select, embedding: Sequence[float]) -> Select:
+    """Order a product query by cosine distance to `embedding`; rows are (Product, distance)"""
+    distance = Product.embedding.cosine_distance(embedding)
+    return query.where(Product.embedding.is_not(None)).add_columns(
+        distance.label("distance")
+    ).order_by(distance)
+
+
+async def vector_search(
+    db: AsyncSession,
+    embedding: Sequence[float],
+    limit: int = 20,
+    threshold: float = 0.0,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    query: Optional[Select] = None
+) -> List[Tuple[Product, float]]:
+    """Active products nearest to `embedding`, as (product, cosine similarity), best first
+
+    `query` can carry further filters; only matches at or above `threshold`
+    similarity are returned.
+    """
+    if query is None:
+        query = select(Product).where(Product.status == "ACTIVE")
+    query = apply_price_filter(query, price_min, price_max)
+    await configure_vector_scan(db)
+    rows = (await db.execute(apply_vector_search(query, embedding).limit(limit))).all()
+    # Iterative scans in relaxed order can return neighbours slightly out of order
+    results = sorted(((row[0], 1.0 - float(row[1])) for row in rows), key=lambda r: -r[1])
+    return [(product, similarity) for product, similarity in results if similarity >= threshold]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Fuse ranked id lists (best first) into one, as (id, score) best first"""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    # Ties (e.g. rank 1 in one list only vs rank 1 in the other) keep list order
+    return sorted(scores.items(), key=lambda item: -item[1])
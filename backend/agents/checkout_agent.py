@@ -3,7 +3,8 @@ Checkout Agent - Handles order processing
 """
 
 from typing import Dict, Any, List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from decimal import Decimal
 
 from .base_agent import BaseAgent
@@ -21,7 +22,7 @@ class CheckoutAgent(BaseAgent):
             Always be clear about pricing, shipping costs, and delivery timelines."""
         )
     
-    async def process(self, message: str, context: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    async def process(self, message: str, context: Dict[str, Any], db: AsyncSession) -> Dict[str, Any]:
         """Process checkout-related request"""
         message_lower = message.lower()
         
@@ -37,7 +38,7 @@ class CheckoutAgent(BaseAgent):
         else:
             return await self._handle_general_checkout(message, context, db)
     
-    async def _handle_checkout(self, message: str, context: Dict, db: Session) -> Dict[str, Any]:
+    async def _handle_checkout(self, message: str, context: Dict, db: AsyncSession) -> Dict[str, Any]:
         """Handle checkout process"""
         cart_items = context.get("cart_items", [])
         customer_id = context.get("customer_id")
@@ -84,8 +85,8 @@ class CheckoutAgent(BaseAgent):
                 payment_method="Credit Card" # Default for agent
             )
             db.add(db_order)
-            db.commit()
-            db.refresh(db_order)
+            await db.commit()
+            await db.refresh(db_order)
             
             for item in cart_items:
                 line_item = OrderLineItem(
@@ -96,7 +97,7 @@ class CheckoutAgent(BaseAgent):
                     line_total=item.get("price", 0) * item.get("quantity", 1)
                 )
                 db.add(line_item)
-            db.commit()
+            await db.commit()
             
             return {
                 "response": f"Order placed successfully! Your order number is {order_number}. You can view it in your Orders page.",
@@ -128,7 +129,7 @@ You have {len(cart_items)} item(s) in your cart. Ready to place the order?"""
             }
         }
     
-    async def _handle_shipping_question(self, message: str, context: Dict, db: Session) -> Dict[str, Any]:
+    async def _handle_shipping_question(self, message: str, context: Dict, db: AsyncSession) -> Dict[str, Any]:
         """Handle shipping questions"""
         response = """We offer the following shipping options:
 
@@ -144,7 +145,7 @@ All orders are processed within 1-2 business days. You'll receive a tracking num
             "confidence": 1.0
         }
     
-    async def _handle_payment_question(self, message: str, context: Dict, db: Session) -> Dict[str, Any]:
+    async def _handle_payment_question(self, message: str, context: Dict, db: AsyncSession) -> Dict[str, Any]:
         """Handle payment questions"""
         response = """We accept the following payment methods:
 
@@ -161,13 +162,13 @@ All payments are processed securely. We never store your full payment informatio
             "confidence": 1.0
         }
     
-    async def _handle_order_status(self, message: str, context: Dict, db: Session) -> Dict[str, Any]:
+    async def _handle_order_status(self, message: str, context: Dict, db: AsyncSession) -> Dict[str, Any]:
         """Handle order status inquiries"""
         order_id = context.get("order_id")
         customer_id = context.get("customer_id")
         
         if order_id:
-            order = db.query(Order).filter(Order.order_id == order_id).first()
+            order = await db.get(Order, order_id)
             if order:
                 response = f"""Order Status: {order.order_status}
 
@@ -179,9 +180,9 @@ Your order is currently {order.order_status.lower()}."""
             else:
                 response = "I couldn't find that order. Please check your order number."
         elif customer_id:
-            orders = db.query(Order).filter(
+            orders = (await db.execute(select(Order).where(
                 Order.customer_id == customer_id
-            ).order_by(Order.order_date.desc()).limit(5).all()
+            ).order_by(Order.order_date.desc()).limit(5))).scalars().all()
             
             if orders:
                 response = f"You have {len(orders)} recent order(s). Your latest order is {orders[0].order_status.lower()}."
@@ -196,7 +197,7 @@ Your order is currently {order.order_status.lower()}."""
             "confidence": 0.9
         }
     
-    async def _handle_general_checkout(self, message: str, context: Dict, db: Session) -> Dict[str, Any]:
+    async def _handle_general_checkout(self, message: str, context: Dict, db: AsyncSession) -> Dict[str, Any]:
         """Handle general checkout questions"""
         response = await self.call_llm([{
             "role": "user",
@@ -0,0 +1,284 @@
+"""
+Conversation Store - Bounded, session-keyed chat history
+
+Replaces the orchestrator's unbounded per-customer dict. Histories are keyed
+by session id, encoded compactly and held either in process (with a global
+byte cap and LRU eviction of whole sessions) or in a SQLite file that every
+uvicorn worker on the host can share. The API is async: SQLite calls run
+on the store's own thread, never on the event loop.
+"""
+
+import asyncio
+import json
+import sqlite3
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import Config
+
+
+# Single-character role codes keep the encoded payload small
+_ROLE_CODES = {"user": "u", "assistant": "a", "system": "s"}
+_CODE_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+
+# Payloads at least this large are zlib-compressed
+_COMPRESS_THRESHOLD = 512
+_RAW = b"j"
+_ZLIB = b"z"
+
+
+def encode_messages(messages: List[Dict[str, str]]) -> bytes:
+    """Encode a message list as compact JSON, compressed when large"""
+    rows = [[_ROLE_CODES.get(m["role"], m["role"]), m.get("content", "")] for m in messages]
+    raw = json.dumps(rows, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) >= _COMPRESS_THRESHOLD:
+        compressed = zlib.compress(raw, 6)
+        if len(compressed) < len(raw):
+            return _ZLIB + compressed
+    return _RAW + raw
+
+
+def decode_messages(payload: bytes) -> List[Dict[str, str]]:
+    """Inverse of encode_messages"""
+    marker, body = payload[:1], payload[1:]
+    if marker == _ZLIB:
+        body = zlib.decompress(body)
+    return [{"role": _CODE_ROLES.get(role, role), "content": content}
+            for role, content in json.loads(body.decode("utf-8"))]
+
+
+def session_key(session_id: Optional[str], customer_id: Optional[int]) -> Optional[str]:
+    """History key for a request; None means the request keeps no history"""
+    if session_id:
+        return f"session:{session_id}"
+    if customer_id:
+        return f"customer:{customer_id}"
+    return None
+
+
+class BaseConversationStore(ABC):
+    """Base class for conversation history backends"""
+
+    def __init__(self, max_messages: int = 10):
+        self.max_messages = max_messages
+
+    @abstractmethod
+    async def get(self, key: str) -> List[Dict[str, str]]:
+        """Get the history for a session (empty if unknown)"""
+        pass
+
+    @abstractmethod
+    async def save(self, key: str, messages: List[Dict[str, str]]) -> None:
+        """Replace the history for a session, keeping the last max_messages"""
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Forget a session"""
+        pass
+
+    @abstractmethod
+    async def get_stats(self) -> Dict[str, Any]:
+        """Backend counters, including memory per session"""
+        pass
+
+    async def append(self, key: str, *messages: Dict[str, str]) -> List[Dict[str, str]]:
+        """Append messages to a session and return the trimmed history"""
+        history = await self.get(key) + list(messages)
+        history = history[-self.max_messages:]
+        await self.save(key, history)
+        return history
+
+
+class InMemoryConversationStore(BaseConversationStore):
+    """Per-process store with a global byte cap and LRU session eviction"""
+
+    def __init__(self, max_messages: int = 10, max_bytes: int = 32 * 1024 * 1024,
+                 max_session_bytes: int = 64 * 1024):
+        super().__init__(max_messages)
+        self.max_bytes = max_bytes
+        self.max_session_bytes = max_session_bytes
+        self._sessions: "OrderedDict[str, bytes]" = OrderedDict()
+        self._total_bytes = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> List[Dict[str, str]]:
+        payload = self._sessions.get(key)
+        if payload is None:
+            return []
+        self._sessions.move_to_end(key)
+        return decode_messages(payload)
+
+    async def save(self, key: str, messages: List[Dict[str, str]]) -> None:
+        messages = messages[-self.max_messages:]
+        payload = encode_messages(messages)
+        # Drop the oldest messages until the session fits its own budget
+        while len(payload) > self.max_session_bytes and len(messages) > 1:
+            messages = messages[1:]
+            payload = encode_messages(messages)
+
+        self._discard(key)
+        self._sessions[key] = payload
+        self._total_bytes += len(payload)
+
+        while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            _, evicted = self._sessions.popitem(last=False)
+            self._total_bytes -= len(evicted)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        self._discard(key)
+
+    def _discard(self, key: str) -> None:
+        payload = self._sessions.pop(key, None)
+        if payload is not None:
+            self._total_bytes -= len(payload)
+
+    def session_bytes(self, key: str) -> int:
+        """Encoded size of one session's history"""
+        return len(self._sessions.get(key, b""))
+
+    async def get_stats(self) -> Dict[str, Any]:
+        sessions = len(self._sessions)
+        return {
+            "backend": "memory",
+            "sessions": sessions,
+            "total_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "avg_session_bytes": self._total_bytes // sessions if sessions else 0,
+            "max_session_bytes": self.max_session_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteConversationStore(BaseConversationStore):
+    """Store backed by a local SQLite file, shared by all workers on a host"""
+
+    def __init__(self, path: str, max_messages: int = 10, ttl_seconds: float = 86400.0,
+                 max_sessions: int = 100_000):
+        super().__init__(max_messages)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._writes = 0
+        # The only thread that touches _conn, so no lock is needed, and a
+        # session's read-modify-write cannot interleave with another's
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-store")
+        # Pruning scans the table, so it gets its own thread and connection
+        self._prune_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-prune")
+        self._pruning: Optional[Future] = None
+        self._conn = self._connect()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation ("
+            " session_key TEXT PRIMARY KEY,"
+            " payload BLOB NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_conversation_updated ON conversation(updated_at)"
+        )
+        self._prune_conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def get(self, key: str) -> List[Dict[str, str]]:
+        return await self._run(self._read, key)
+
+    async def save(self, key: str, messages: List[Dict[str, str]]) -> None:
+        await self._run(self._write, key, messages)
+
+    async def append(self, key: str, *messages: Dict[str, str]) -> List[Dict[str, str]]:
+        return await self._run(self._append, key, list(messages))
+
+    async def delete(self, key: str) -> None:
+        await self._run(self._conn.execute, "DELETE FROM conversation WHERE session_key = ?", (key,))
+
+    def _read(self, key: str) -> List[Dict[str, str]]:
+        row = self._conn.execute(
+            "SELECT payload, updated_at FROM conversation WHERE session_key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl_seconds:
+            return []
+        return decode_messages(row[0])
+
+    def _write(self, key: str, messages: List[Dict[str, str]]) -> None:
+        payload = encode_messages(messages[-self.max_messages:])
+        self._conn.execute(
+            "INSERT INTO conversation (session_key, payload, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_key) DO UPDATE SET payload = excluded.payload, "
+            "updated_at = excluded.updated_at",
+            (key, payload, time.time())
+        )
+        self._writes += 1
+        if self._writes % 1000 == 0 and (self._pruning is None or self._pruning.done()):
+            self._pruning = self._prune_executor.submit(self._prune)
+
+    def _append(self, key: str, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        history = (self._read(key) + messages)[-self.max_messages:]
+        self._write(key, history)
+        return history
+
+    def _prune(self) -> None:
+        """Drop expired sessions and the oldest beyond max_sessions"""
+        try:
+            self._prune_conn.execute(
+                "DELETE FROM conversation WHERE updated_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._prune_conn.execute(
+                "DELETE FROM conversation WHERE session_key IN ("
+                " SELECT session_key FROM conversation ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Conversation store prune failed: {e}")
+
+    async def get_stats(self) -> Dict[str, Any]:
+        sessions, total_bytes = await self._run(lambda: self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM conversation"
+        ).fetchone())
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": sessions,
+            "total_bytes": total_bytes,
+            "avg_session_bytes": total_bytes // sessions if sessions else 0,
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def create_conversation_store(backend: Optional[str] = None) -> BaseConversationStore:
+    """Create the conversation store selected by CONVERSATION_STORE (memory/sqlite)"""
+    backend = (backend or Config.CONVERSATION_STORE).lower()
+
+    if backend == "memory":
+        return InMemoryConversationStore(
+            max_messages=Config.CONVERSATION_MAX_MESSAGES,
+            max_bytes=Config.CONVERSATION_STORE_MAX_BYTES,
+            max_session_bytes=Config.CONVERSATION_MAX_SESSION_BYTES
+        )
+    elif backend == "sqlite":
+        return SQLiteConversationStore(
+            path=Config.CONVERSATION_SQLITE_PATH,
+            max_messages=Config.CONVERSATION_MAX_MESSAGES,
+            ttl_seconds=Config.CONVERSATION_TTL_SECONDS
+        )
+    else:
+        raise ValueError(
+            f"Unknown conversation store: {backend}. Supported stores: ['memory', 'sqlite']"
+        )
@@ -0,0 +1,371 @@
+"""
+Facet Index - In-memory filter counts over the active catalog
+
+Search results come with counts per brand, gender, price bucket, category,
+color and size. Counting these in Postgres takes one grouped query per
+facet over the whole match set joined to variants and SKUs; here they are
+counted in memory from the matched product ids, at a cost bounded by the
+catalog size rather than by how broad the query is.
+
+Each active product has a slot (product ids sorted, so ids map to slots by
+binary search):
+
+- brand, gender and hierarchy node are one code per slot, counted with
+  np.bincount over the matched slots
+- price bucket (of its active SKUs), color and size are multi-valued and
+  kept as one bitmap (64-bit words) per value; a count is the popcount of
+  the value's bitmap ANDed with the bitmap of matched slots
+
+Category counts roll leaf hierarchy nodes up to their ancestors through
+the hierarchy tree (agents/hierarchy.py). Variants carry no size in this
+catalog; sizes are read from the last segment of the SKU code
+(BRA-0001-0001-GRE-XS) unless a variant has one.
+
+The index is rebuilt in a worker thread at startup and whenever products,
+variants or SKUs change (their write counters in pg_stat_user_tables are
+polled every FACET_INDEX_REFRESH_SECONDS).
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import sys
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import text
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import Config
+
+
+_PRODUCTS_SQL = text("""
+    SELECT product_id, brand_name, gender, hierarchy_id
+    FROM retail.product
+    WHERE status = 'ACTIVE'
+    ORDER BY product_id
+""")
+
+_COLORS_SQL = text("""
+    SELECT DISTINCT v.product_id, v.color
+    FROM retail.product_variant v
+    WHERE v.color IS NOT NULL
+""")
+
+# A SKU's size: its variant's, else the SKU code's last segment (v = variant, s = sku)
+SKU_SIZE_SQL = "coalesce(v.size, substring(s.sku_code FROM '[^-]+$'))"
+
+_SIZES_SQL = text(f"""
+    SELECT DISTINCT v.product_id, {SKU_SIZE_SQL} AS size
+    FROM retail.product_variant v
+    JOIN retail.sku s ON s.variant_id = v.variant_id
+    WHERE s.status = 'ACTIVE'
+""")
+
+# width_bucket: 0 below the first bound, i for bounds[i-1] <= price < bounds[i]
+_PRICE_BUCKETS_SQL = text("""
+    SELECT DISTINCT v.product_id, width_bucket(s.price, CAST(:bounds AS NUMERIC[])) AS bucket
+    FROM retail.product_variant v
+    JOIN retail.sku s ON s.variant_id = v.variant_id
+    WHERE s.status = 'ACTIVE'
+""")
+
+# Write counters of the source tables: any insert, update or delete
+# changes the sum (no scan of the tables themselves)
+_VERSION_SQL = text("""
+    SELECT sum(n_tup_ins + n_tup_upd + n_tup_del)
+    FROM pg_stat_user_tables
+    WHERE schemaname = 'retail' AND relname IN ('product', 'product_variant', 'sku')
+""")
+
+
+def pack(bits: np.ndarray) -> np.ndarray:
+    """Bool array -> bitmap of 64-bit words"""
+    packed = np.packbits(bits)
+    packed = np.concatenate([packed, np.zeros(-len(packed) % 8, dtype=np.uint8)])
+    return packed.view(np.uint64)
+
+
+def popcount(words: np.ndarray) -> int:
+    """Set bits in a bitmap (SWAR bit counting; numpy < 2 has no bitwise_count)"""
+    w = words - ((words >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    w = (w & np.uint64(0x3333333333333333)) + ((w >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    w = (w + (w >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return int(((w * np.uint64(0x0101010101010101)) >> np.uint64(56)).sum(dtype=np.uint64))
+
+
+def price_bucket_labels(bounds: Sequence[float]) -> List[Dict[str, Any]]:
+    """Bucket i covers [bounds[i-1], bounds[i]); the first and last are open-ended"""
+    edges = [None, *bounds, None]
+    buckets = []
+    for low, high in zip(edges, edges[1:]):
+        if low is None:
+            label = f"Under ${high:g}"
+        elif high is None:
+            label = f"${low:g}+"
+        else:
+            label = f"${low:g}-${high:g}"
+        buckets.append({"value": label, "min": low, "max": high})
+    return buckets
+
+
+class FacetSnapshot:
+    """Immutable facet data for one build of the catalog"""
+
+    SINGLE = ("brand", "gender")
+    MULTI = ("color", "size")
+
+    def __init__(self, product_ids: np.ndarray, codes: Dict[str, np.ndarray], labels: Dict[str, List[str]],
+                 hierarchy_ids: np.ndarray, bitmaps: Dict[str, List[np.ndarray]],
+                 price_buckets: List[Dict[str, Any]]):
+        self.product_ids = product_ids
+        self.codes = codes
+        self.labels = labels
+        self.hierarchy_ids = hierarchy_ids
+        self.bitmaps = bitmaps
+        self.price_buckets = price_buckets
+
+    @classmethod
+    def build(cls, products: Sequence[Tuple], colors: Sequence[Tuple], sizes: Sequence[Tuple],
+              prices: Sequence[Tuple], bounds: Sequence[float]) -> "FacetSnapshot":
+        """From (product_id, brand, gender, hierarchy_id) rows sorted by id, and (product_id, value) pairs"""
+        product_ids = np.fromiter((row[0] for row in products), dtype=np.int64, count=len(products))
+        codes: Dict[str, np.ndarray] = {}
+        labels: Dict[str, List[str]] = {}
+        for column, facet in enumerate(cls.SINGLE, 1):
+            codes[facet], labels[facet] = _factorize([row[column] for row in products])
+        hierarchy_ids = np.fromiter(
+            (row[3] if row[3] is not None else -1 for row in products), dtype=np.int32, count=len(products)
+        )
+
+        bitmaps: Dict[str, List[np.ndarray]] = {}
+        for facet, pairs in (("color", colors), ("size", sizes)):
+            bitmaps[facet], labels[facet] = _bitmaps(product_ids, pairs)
+        price_buckets = price_bucket_labels(bounds)
+        bucket_bitmaps, bucket_values = _bitmaps(product_ids, prices)
+        by_bucket = dict(zip(bucket_values, bucket_bitmaps))
+        empty = pack(np.zeros(len(product_ids), dtype=bool))
+        bitmaps["price"] = [by_bucket.get(i, empty) for i in range(len(price_buckets))]
+        return cls(product_ids, codes, labels, hierarchy_ids, bitmaps, price_buckets)
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def slots(self, product_ids: Sequence[int]) -> np.ndarray:
+        """Slots of the given products; ids not in the index are dropped"""
+        return _slots_of(self.product_ids, np.asarray(product_ids, dtype=np.int64))
+
+    def count(self, product_ids: Sequence[int], hierarchy_tree: Any = None,
+              max_values: int = 20) -> Dict[str, Any]:
+        """Facet counts over the given products"""
+        matched = np.zeros(len(self.product_ids), dtype=bool)
+        matched[self.slots(product_ids)] = True
+        slots = np.flatnonzero(matched)
+        facets: Dict[str, Any] = {}
+
+        for facet in self.SINGLE:
+            counts = np.bincount(self.codes[facet][slots] + 1, minlength=len(self.labels[facet]) + 1)[1:]
+            facets[facet] = _top(self.labels[facet], counts, max_values)
+
+        matched = pack(matched)
+        facets["price"] = [
+            {**bucket, "count": popcount(bitmap & matched)}
+            for bucket, bitmap in zip(self.price_buckets, self.bitmaps["price"])
+        ]
+        for facet in self.MULTI:
+            counts = np.array([popcount(bitmap & matched) for bitmap in self.bitmaps[facet]], dtype=np.int64)
+            facets[facet] = _top(self.labels[facet], counts, max_values)
+
+        facets["category"] = self._category_counts(slots, hierarchy_tree)
+        return facets
+
+    def _category_counts(self, slots: np.ndarray, tree: Any) -> List[Dict[str, Any]]:
+        hierarchy_ids = self.hierarchy_ids[slots]
+        hierarchy_ids = hierarchy_ids[hierarchy_ids >= 0]
+        leaf_counts = np.bincount(hierarchy_ids) if len(hierarchy_ids) else np.zeros(0, dtype=np.int64)
+        counts: Dict[int, int] = {}
+        for hierarchy_id in np.flatnonzero(leaf_counts):
+            count = int(leaf_counts[hierarchy_id])
+            node_id: Optional[int] = int(hierarchy_id)
+            path = set()
+            # Each product counts towards its node and every ancestor
+            while node_id is not None and node_id not in path:
+                path.add(node_id)
+                counts[node_id] = counts.get(node_id, 0) + count
+                node = tree.nodes.get(node_id) if tree is not None else None
+                node_id = node.parent_id if node is not None else None
+        results = []
+        for hierarchy_id, count in counts.items():
+            node = tree.nodes.get(hierarchy_id) if tree is not None else None
+            results.append({
+                "hierarchy_id": hierarchy_id,
+                "value": node.name if node else None,
+                "path": node.path if node else None,
+                "level": node.level if node else None,
+                "count": count,
+            })
+        return sorted(results, key=lambda r: (r["path"] or "", r["hierarchy_id"]))
+
+
+def _slots_of(product_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Positions of `ids` in the sorted `product_ids`, skipping absent ids"""
+    if not len(product_ids) or not len(ids):
+        return np.zeros(0, dtype=np.int64)
+    slots = np.minimum(np.searchsorted(product_ids, ids), len(product_ids) - 1)
+    return slots[product_ids[slots] == ids]
+
+
+def _factorize(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, List[str]]:
+    """Integer codes (-1 for None) and the distinct values"""
+    index: Dict[str, int] = {}
+    codes = np.fromiter(
+        (index.setdefault(v, len(index)) if v is not None else -1 for v in values),
+        dtype=np.int32, count=len(values)
+    )
+    return codes, list(index)
+
+
+def _bitmaps(product_ids: np.ndarray, pairs: Sequence[Tuple]) -> Tuple[List[np.ndarray], List[Any]]:
+    """One packed slot bitmap per distinct value of (product_id, value) pairs"""
+    pairs = [(pid, value) for pid, value in pairs if value is not None]
+    codes, labels = _factorize([value for _, value in pairs])
+    pids = np.fromiter((pid for pid, _ in pairs), dtype=np.int64, count=len(pairs))
+    # Products that are not active have no slot
+    if len(product_ids):
+        slots = np.minimum(np.searchsorted(product_ids, pids), len(product_ids) - 1)
+        known = product_ids[slots] == pids
+        slots, codes = slots[known], codes[known]
+    else:
+        slots, codes = np.zeros(0, dtype=np.int64), codes[:0]
+    order = np.argsort(codes, kind="stable")
+    slots, codes = slots[order], codes[order]
+    bounds = np.searchsorted(codes, np.arange(len(labels) + 1))
+    bitmaps = []
+    for i in range(len(labels)):
+        bits = np.zeros(len(product_ids), dtype=bool)
+        bits[slots[bounds[i]:bounds[i + 1]]] = True
+        bitmaps.append(pack(bits))
+    return bitmaps, labels
+
+
+def _top(labels: List[str], counts: np.ndarray, max_values: int) -> List[Dict[str, Any]]:
+    """Values with a non-zero count, most frequent first"""
+    order = np.argsort(-counts, kind="stable")
+    return [{"value": labels[i], "count": int(counts[i])} for i in order[:max_values] if counts[i] > 0]
+
+
+class FacetIndex:
+    """Shared facet snapshot of the active catalog, rebuilt when it changes"""
+
+    def __init__(self, enabled: bool = True, refresh_seconds: float = 60.0,
+                 price_bounds: Sequence[float] = (25, 50, 100, 200), max_matches: int = 10_000):
+        self.enabled = enabled
+        self.refresh_seconds = refresh_seconds
+        self.price_bounds = list(price_bounds)
+        self.max_matches = max_matches
+        self.snapshot: Optional[FacetSnapshot] = None
+        self.build_seconds: Optional[float] = None
+        self.builds = 0
+        self.counts = 0
+        self._count_ms_total = 0.0
+        self._version: Any = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    def start(self) -> None:
+        """Build in the background, then poll for catalog changes"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Rebuild if products, variants or SKUs changed; returns whether it did"""
+        from database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            version = await db.scalar(_VERSION_SQL)
+            if not force and self.snapshot is not None and version == self._version:
+                return False
+            start = time.perf_counter()
+            products = (await db.execute(_PRODUCTS_SQL)).all()
+            colors = (await db.execute(_COLORS_SQL)).all()
+            sizes = (await db.execute(_SIZES_SQL)).all()
+            prices = (await db.execute(_PRICE_BUCKETS_SQL, {"bounds": self.price_bounds})).all()
+        self.snapshot = await asyncio.to_thread(
+            FacetSnapshot.build, products, colors, sizes, prices, self.price_bounds
+        )
+        self._version = version
+        self.build_seconds = time.perf_counter() - start
+        self.builds += 1
+        return True
+
+    def count(self, product_ids: Sequence[int], truncated: bool = False) -> Optional[Dict[str, Any]]:
+        """Facet counts for a match set, or None before the first build
+
+        `truncated` marks a match set cut at max_matches, whose counts are
+        then lower bounds.
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        from .hierarchy import get_hierarchy_index
+
+        start = time.perf_counter()
+        facets = snapshot.count(product_ids, get_hierarchy_index().tree, Config.FACET_MAX_VALUES)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        self.counts += 1
+        self._count_ms_total += elapsed_ms
+        return {
+            "matched": len(product_ids),
+            "approximate": truncated,
+            "facets": facets,
+            "took_ms": round(elapsed_ms, 2),
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "products": len(self.snapshot) if self.snapshot is not None else 0,
+            "builds": self.builds,
+            "build_seconds": round(self.build_seconds, 3) if self.build_seconds is not None else None,
+            "counts": self.counts,
+            "avg_count_ms": round(self._count_ms_total / self.counts, 3) if self.counts else 0.0,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Facet index refresh failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+
+# Shared instance (lazy initialization)
+_facet_index_instance: Optional[FacetIndex] = None
+
+
+def get_facet_index() -> FacetIndex:
+    """Get or create the facet index shared by the API and agents"""
+    global _facet_index_instance
+    if _facet_index_instance is None:
+        _facet_index_instance = FacetIndex(
+            enabled=Config.FACET_INDEX_ENABLED,
+            refresh_seconds=Config.FACET_INDEX_REFRESH_SECONDS,
+            price_bounds=Config.FACET_PRICE_BUCKETS,
+            max_matches=Config.FACET_MAX_MATCHES
+        )
+    return _facet_index_instance
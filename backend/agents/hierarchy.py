@@ -0,0 +1,256 @@
+"""
+Product Hierarchy - In-memory category tree for category filters
+
+Products are filed under leaf nodes (Women/Dresses/Casual), so matching
+the requested category against the product's own hierarchy row misses
+everything filed under a child of it. HierarchyIndex keeps
+retail.product_hierarchy (or data/hierarchy.json) as a tree in which every
+node holds the ids of itself and all its descendants, plus an index of
+node names. A category filter then resolves to a set of ids in memory and
+becomes `product.hierarchy_id = ANY(:ids)` on the indexed column, with no
+join and no pattern scan.
+
+Category names match as words, ignoring case and plurals ("dress" finds
+Dresses under both genders); when no name matches whole, names containing
+the words are used. "Women/Dresses" style paths pick a single node.
+
+The tree is loaded at startup and reloaded when the hierarchy changes
+(a checksum of the table, or the file's mtime, polled every
+HIERARCHY_REFRESH_SECONDS).
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+import sys
+from pathlib import Path
+
+from sqlalchemy import Integer, Select, any_, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import Config
+from models import Product, ProductHierarchy
+from .catalog_index import tokenize
+
+# Cheap change detector: one row, whatever the table size
+_CHECKSUM_SQL = select(
+    func.count(),
+    func.md5(func.string_agg(
+        func.concat_ws("/", ProductHierarchy.hierarchy_id, ProductHierarchy.parent_hierarchy_id,
+                       ProductHierarchy.hierarchy_name, ProductHierarchy.hierarchy_path),
+        aggregate_order_by(literal(","), ProductHierarchy.hierarchy_id)
+    ))
+)
+
+
+def _name_key(name: Optional[str]) -> str:
+    return " ".join(tokenize(name))
+
+
+class HierarchyNode:
+    """One hierarchy row; descendant_ids includes the node itself"""
+
+    __slots__ = ("hierarchy_id", "name", "level", "parent_id", "path", "children", "descendant_ids")
+
+    def __init__(self, hierarchy_id: int, name: str, level: Optional[str],
+                 parent_id: Optional[int], path: Optional[str]):
+        self.hierarchy_id = hierarchy_id
+        self.name = name
+        self.level = level
+        self.parent_id = parent_id
+        self.path = path
+        self.children: List["HierarchyNode"] = []
+        self.descendant_ids: FrozenSet[int] = frozenset((hierarchy_id,))
+
+
+class HierarchyTree:
+    """Nodes with precomputed descendant sets and a name index"""
+
+    def __init__(self, nodes: Dict[int, HierarchyNode]):
+        self.nodes = nodes
+        self.roots = [node for node in nodes.values() if node.parent_id not in nodes]
+        self._by_name: Dict[str, List[HierarchyNode]] = {}
+        self._by_path: Dict[str, HierarchyNode] = {}
+        for node in nodes.values():
+            self._by_name.setdefault(_name_key(node.name), []).append(node)
+            if node.path:
+                self._by_path[node.path.strip("/").lower()] = node
+        self._resolved: Dict[str, FrozenSet[int]] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]]) -> "HierarchyTree":
+        nodes = {
+            int(row["hierarchy_id"]): HierarchyNode(
+                int(row["hierarchy_id"]), row["hierarchy_name"], row.get("hierarchy_level"),
+                int(row["parent_hierarchy_id"]) if row.get("parent_hierarchy_id") is not None else None,
+                row.get("hierarchy_path")
+            )
+            for row in rows
+        }
+        for node in nodes.values():
+            if node.parent_id in nodes:
+                nodes[node.parent_id].children.append(node)
+
+        # Children before parents, so each set is its children's sets plus itself
+        order: List[HierarchyNode] = []
+        seen = set()
+        stack = [node for node in nodes.values() if node.parent_id not in nodes]
+        while stack:
+            node = stack.pop()
+            if node.hierarchy_id in seen:
+                continue  # a cycle in parent_hierarchy_id
+            seen.add(node.hierarchy_id)
+            order.append(node)
+            stack.extend(node.children)
+        for node in reversed(order):
+            node.descendant_ids = frozenset(node.descendant_ids.union(
+                *(child.descendant_ids for child in node.children)
+            ))
+        return cls(nodes)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def find(self, category: str) -> List[HierarchyNode]:
+        """Nodes a category name (or path) refers to"""
+        if "/" in category:
+            node = self._by_path.get(category.strip().strip("/").lower())
+            return [node] if node else []
+        key = _name_key(category)
+        if not key:
+            return []
+        if key in self._by_name:
+            return self._by_name[key]
+        return [node for name, nodes in self._by_name.items() if key in name for node in nodes]
+
+    def resolve(self, category: str) -> FrozenSet[int]:
+        """Ids of the matching nodes and everything below them"""
+        ids = self._resolved.get(category)
+        if ids is None:
+            ids = frozenset().union(*(node.descendant_ids for node in self.find(category)))
+            if len(self._resolved) < 4096:
+                self._resolved[category] = ids
+        return ids
+
+    def get_stats(self) -> Dict[str, Any]:
+        depth, level = 0, self.roots
+        while level:
+            depth += 1
+            level = [child for node in level for child in node.children]
+        return {"nodes": len(self.nodes), "roots": len(self.roots), "depth": depth}
+
+
+class HierarchyIndex:
+    """Shared hierarchy tree, loaded from the database or hierarchy.json and kept current"""
+
+    def __init__(self, source: str = "db", refresh_seconds: float = 60.0,
+                 data_dir: Optional[str] = None):
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.data_dir = Path(data_dir) if data_dir else Path(__file__).parent.parent.parent / "data"
+        self.tree: Optional[HierarchyTree] = None
+        self.loads = 0
+        self.lookups = 0
+        self._version: Any = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.tree is not None
+
+    def start(self) -> None:
+        """Load in the background, then poll for hierarchy changes"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Reload the tree if the hierarchy changed; returns whether it did"""
+        async with self._lock:
+            version = await self._read_version()
+            if not force and self.tree is not None and version == self._version:
+                return False
+            if self.source == "json":
+                rows = await asyncio.to_thread(self._read_json)
+            else:
+                rows = await self._read_db()
+            self.tree = HierarchyTree.build(rows)
+            self._version = version
+            self.loads += 1
+            return True
+
+    async def category_ids(self, category: str) -> FrozenSet[int]:
+        """Hierarchy ids a category filter covers (loads the tree on first use)"""
+        if self.tree is None:
+            await self.refresh()
+        self.lookups += 1
+        return self.tree.resolve(category)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {"source": self.source, "ready": self.ready, "loads": self.loads, "lookups": self.lookups}
+        if self.tree is not None:
+            stats.update(self.tree.get_stats())
+        return stats
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Product hierarchy refresh failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def _read_version(self) -> Any:
+        if self.source == "json":
+            return (self.data_dir / "hierarchy.json").stat().st_mtime_ns
+        from database import AsyncSessionLocal
+        async with AsyncSessionLocal() as db:
+            return tuple((await db.execute(_CHECKSUM_SQL)).one())
+
+    async def _read_db(self) -> List[Dict[str, Any]]:
+        from database import AsyncSessionLocal
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(
+                ProductHierarchy.hierarchy_id, ProductHierarchy.hierarchy_level, ProductHierarchy.hierarchy_name,
+                ProductHierarchy.parent_hierarchy_id, ProductHierarchy.hierarchy_path
+            ))).mappings().all()
+        return [dict(row) for row in rows]
+
+    def _read_json(self) -> List[Dict[str, Any]]:
+        with open(self.data_dir / "hierarchy.json") as f:
+            return json.load(f)
+
+
+# Shared instance (lazy initialization)
+_hierarchy_index_instance: Optional[HierarchyIndex] = None
+
+
+def get_hierarchy_index() -> HierarchyIndex:
+    """Get or create the hierarchy tree shared by the API and agents"""
+    global _hierarchy_index_instance
+    if _hierarchy_index_instance is None:
+        _hierarchy_index_instance = HierarchyIndex(
+            source=Config.HIERARCHY_SOURCE,
+            refresh_seconds=Config.HIERARCHY_REFRESH_SECONDS
+        )
+    return _hierarchy_index_instance
+
+
+async def apply_category_filter(query: Select, category: Optional[str]) -> Select:
+    """Keep products filed under `category` or any of its subcategories"""
+    if not category:
+        return query
+    ids = await get_hierarchy_index().category_ids(category)
+    # One array parameter, so every category shares a single statement
+    return query.where(Product.hierarchy_id == any_(literal(sorted(ids), ARRAY(Integer))))
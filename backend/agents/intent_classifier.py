@@ -0,0 +1,228 @@
+"""
+Intent Classifier - Local routing model for the orchestrator
+
+Routes a message to an agent without a network call. A keyword/gazetteer
+rule layer handles unambiguous phrasing; a multinomial naive Bayes model
+trained on labeled example utterances handles the rest. Callers fall back to
+the LLM router when the returned confidence is below their threshold.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# Phrases that identify an agent on their own, matched on word boundaries
+# against the lowercased message. A message hitting several agents is left to
+# the model.
+INTENT_GAZETTEER: Dict[str, List[str]] = {
+    "returns": [
+        "return", "returns", "returning", "refund", "refunds", "exchange",
+        "send back", "send it back", "return policy", "money back",
+    ],
+    "checkout": [
+        "checkout", "check out", "place order", "place my order", "my cart",
+        "shipping", "delivery", "payment", "pay with", "billing", "order status",
+        "track my order", "where is my order", "credit card", "paypal",
+    ],
+    "lookbook": [
+        "lookbook", "look book", "outfits for", "styled collection",
+        "capsule wardrobe", "outfit combinations", "mood board",
+    ],
+    "recommender": [
+        "recommend", "recommendations", "based on my purchases",
+        "based on what i bought", "similar to", "what else", "you might like",
+        "goes with my", "trending", "popular",
+    ],
+    "stylist": [
+        "what should i wear", "how do i style", "how to style", "style advice",
+        "fashion advice", "does this go with", "what goes with", "dress code",
+        "body type", "stylist",
+    ],
+    "search": [
+        "find", "search", "show me", "looking for", "do you have", "in stock",
+        "cheaper than", "less than",
+    ],
+}
+
+# Labeled utterances used to train the naive Bayes model. Keep these close to
+# real traffic; scripts/evaluate_routing.py holds a separate held-out set.
+TRAINING_EXAMPLES: List[Tuple[str, str]] = [
+    # stylist
+    ("what should i wear to a summer wedding", "stylist"),
+    ("how do i style a leather jacket", "stylist"),
+    ("give me fashion advice for a job interview", "stylist"),
+    ("what colors suit my skin tone", "stylist"),
+    ("does navy go with brown shoes", "stylist"),
+    ("help me dress for a first date", "stylist"),
+    ("what is in style this fall", "stylist"),
+    ("i need style tips for a business casual office", "stylist"),
+    ("how can i look taller with my outfit", "stylist"),
+    ("what shoes work with a midi skirt", "stylist"),
+    ("suggest an outfit for a cocktail party", "stylist"),
+    ("what to wear for a beach vacation", "stylist"),
+    ("how should i layer for cold weather", "stylist"),
+    ("is it ok to wear black to a wedding", "stylist"),
+    # search
+    ("show me black dresses under 50", "search"),
+    ("find mens running sneakers", "search"),
+    ("do you have linen shirts in size m", "search"),
+    ("search for womens jeans", "search"),
+    ("looking for a red cocktail dress", "search"),
+    ("i want leather boots", "search"),
+    ("show me jackets from urbanwear", "search"),
+    ("find cheap t-shirts", "search"),
+    ("any wool coats for women", "search"),
+    ("i need a white blouse", "search"),
+    ("shoes under 100 dollars", "search"),
+    ("show me stylco hoodies", "search"),
+    ("find a navy blazer for men", "search"),
+    ("do you sell sandals", "search"),
+    # lookbook
+    ("create a lookbook for a beach vacation", "lookbook"),
+    ("put together 5 outfits for work", "lookbook"),
+    ("build me a casual weekend lookbook", "lookbook"),
+    ("make a party lookbook in black", "lookbook"),
+    ("compose a capsule wardrobe for travel", "lookbook"),
+    ("create outfit combinations for a wedding", "lookbook"),
+    ("design a styled collection for fall", "lookbook"),
+    ("give me 3 complete outfits for the office", "lookbook"),
+    ("curate a formal lookbook", "lookbook"),
+    ("assemble a resort look book", "lookbook"),
+    # checkout
+    ("i want to checkout", "checkout"),
+    ("place my order", "checkout"),
+    ("how much is shipping", "checkout"),
+    ("what payment methods do you accept", "checkout"),
+    ("can i pay with paypal", "checkout"),
+    ("what is my order status", "checkout"),
+    ("when will my order be delivered", "checkout"),
+    ("buy the items in my cart", "checkout"),
+    ("confirm my purchase", "checkout"),
+    ("do you offer express delivery", "checkout"),
+    ("update my billing address", "checkout"),
+    ("track my order", "checkout"),
+    # returns
+    ("i want to return my order", "returns"),
+    ("how do i get a refund", "returns"),
+    ("what is your return policy", "returns"),
+    ("can i exchange this for a different size", "returns"),
+    ("the jacket does not fit i want to send it back", "returns"),
+    ("track my return", "returns"),
+    ("where is my refund", "returns"),
+    ("the item arrived damaged", "returns"),
+    ("i received the wrong item", "returns"),
+    ("how long do returns take", "returns"),
+    ("cancel my return request", "returns"),
+    ("status of my return", "returns"),
+    # recommender
+    ("recommend something based on my purchases", "recommender"),
+    ("what else would go with my new jeans", "recommender"),
+    ("show me products similar to this one", "recommender"),
+    ("what is trending right now", "recommender"),
+    ("suggest items i might like", "recommender"),
+    ("what are your most popular products", "recommender"),
+    ("recommend accessories for what i bought", "recommender"),
+    ("what do other customers buy with this", "recommender"),
+    ("personalized recommendations please", "recommender"),
+    ("anything new for me", "recommender"),
+    ("complete the look for my last order", "recommender"),
+]
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens plus adjacent-word bigrams"""
+    words = _TOKEN_PATTERN.findall(text.lower())
+    bigrams = [f"{a}_{b}" for a, b in zip(words, words[1:])]
+    return words + bigrams
+
+
+class NaiveBayesIntentModel:
+    """Multinomial naive Bayes over unigram/bigram counts"""
+
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.labels: List[str] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.class_log_prior: Optional[np.ndarray] = None
+        self.feature_log_prob: Optional[np.ndarray] = None
+
+    def fit(self, examples: List[Tuple[str, str]]) -> "NaiveBayesIntentModel":
+        """Train on (utterance, label) pairs"""
+        self.labels = sorted({label for _, label in examples})
+        label_index = {label: i for i, label in enumerate(self.labels)}
+
+        tokenized = [tokenize(text) for text, _ in examples]
+        for tokens in tokenized:
+            for token in tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        counts = np.zeros((len(self.labels), len(self.vocabulary)), dtype=np.float64)
+        class_counts = np.zeros(len(self.labels), dtype=np.float64)
+        for tokens, (_, label) in zip(tokenized, examples):
+            row = label_index[label]
+            class_counts[row] += 1
+            for token in tokens:
+                counts[row, self.vocabulary[token]] += 1
+
+        smoothed = counts + self.alpha
+        self.feature_log_prob = np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+        self.class_log_prior = np.log(class_counts / class_counts.sum())
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """Posterior probability for every label"""
+        features = np.zeros(len(self.vocabulary), dtype=np.float64)
+        for token in tokenize(text):
+            index = self.vocabulary.get(token)
+            if index is not None:
+                features[index] += 1
+
+        joint = self.class_log_prior + self.feature_log_prob @ features
+        joint -= joint.max()
+        probs = np.exp(joint)
+        probs /= probs.sum()
+        return {label: float(p) for label, p in zip(self.labels, probs)}
+
+
+class IntentClassifier:
+    """Rule layer plus naive Bayes model for agent routing"""
+
+    # Confidence reported when exactly one agent's gazetteer matches
+    RULE_CONFIDENCE = 0.95
+
+    def __init__(
+        self,
+        examples: Optional[List[Tuple[str, str]]] = None,
+        gazetteer: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.gazetteer = gazetteer or INTENT_GAZETTEER
+        self.model = NaiveBayesIntentModel().fit(examples or TRAINING_EXAMPLES)
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        """Return (agent_name, confidence) for a message"""
+        rule_matches = self._match_rules(message)
+        if len(rule_matches) == 1:
+            return rule_matches[0], self.RULE_CONFIDENCE
+
+        probs = self.model.predict_proba(message)
+        if rule_matches:
+            # Several gazetteers matched; let the model pick among them only
+            probs = {name: probs.get(name, 0.0) for name in rule_matches}
+            total = sum(probs.values()) or 1.0
+            probs = {name: p / total for name, p in probs.items()}
+
+        agent_name = max(probs, key=probs.get)
+        return agent_name, probs[agent_name]
+
+    def _match_rules(self, message: str) -> List[str]:
+        """Agents whose gazetteer phrases occur in the message"""
+        normalized = " " + " ".join(_TOKEN_PATTERN.findall(message.lower())) + " "
+        matches = []
+        for agent_name, phrases in self.gazetteer.items():
+            if any(f" {phrase} " in normalized for phrase in phrases):
+                matches.append(agent_name)
+        return matches
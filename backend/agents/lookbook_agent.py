@@ -4,8 +4,8 @@ Lookbook Composer Agent - Creates styled product collections
 
 from typing import Dict, Any, List
 import random
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 
 from .base_agent import BaseAgent
 from models import Product, ProductVariant, SKU, StyleProfile
@@ -14,6 +14,10 @@ from models import Product, ProductVariant, SKU, StyleProfile
 class LookbookComposerAgent(BaseAgent):
     """Agent specialized in creating styled lookbooks and outfit combinations"""
     
+    # The description prompt depends only on theme and outfit count
+    llm_cache_ttl = 24 * 3600
+    llm_cache_nondeterministic = True
+    
     def __init__(self):
         super().__init__(
             name="lookbook",
@@ -23,13 +27,13 @@ class LookbookComposerAgent(BaseAgent):
             appropriateness. Create inspiring collections that tell a fashion story."""
         )
     
-    async def process(self, message: str, context: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    async def process(self, message: str, context: Dict[str, Any], db: AsyncSession) -> Dict[str, Any]:
         """Process lookbook creation request"""
         # Extract lookbook parameters
         params = self._parse_lookbook_request(message)
         
         # Get products for lookbook
-        products = self._get_lookbook_products(db, params)
+        products = await self._get_lookbook_products(db, params)
         
         # Create styled combinations
         lookbook_items = self._create_combinations(products, params)
@@ -93,9 +97,9 @@ class LookbookComposerAgent(BaseAgent):
         
         return params
     
-    def _get_lookbook_products(self, db: Session, params: Dict[str, Any]) -> List[Dict]:
+    async def _get_lookbook_products(self, db: AsyncSession, params: Dict[str, Any]) -> List[Dict]:
         """Get products suitable for lookbook"""
-        query = db.query(Product).filter(Product.status == "ACTIVE")
+        query = select(Product).where(Product.status == "ACTIVE")
         
         if params.get("theme"):
             # Filter by metadata or product type based on theme
@@ -107,9 +111,9 @@ class LookbookComposerAgent(BaseAgent):
                 "wedding": ["Dresses", "Formal", "Accessories"]
             }
             if params["theme"] in theme_filters:
-                query = query.filter(Product.product_type.in_(theme_filters[params["theme"]]))
+                query = query.where(Product.product_type.in_(theme_filters[params["theme"]]))
         
-        products = query.limit(50).all()
+        products = (await db.execute(query.limit(50))).scalars().all()
         
         return [
             {
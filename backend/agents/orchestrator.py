@@ -2,22 +2,32 @@
 Conversation Orchestrator - Routes requests to specialized agents
 """
 
-from typing import Dict, Any, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Any, Optional, AsyncIterator
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import sys
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
-from llm_provider import get_llm_provider, LLMProviderFactory
+from llm_provider import get_llm_provider, LLMProviderFactory, current_agent
+from llm_cache import get_llm_cache
+from llm_scheduler import LLMOverloadedError
+from config import Config
 
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, token_sink
 from .stylist_agent import StylistAgent
 from .search_agent import CatalogSearchAgent
 from .lookbook_agent import LookbookComposerAgent
 from .checkout_agent import CheckoutAgent
 from .returns_agent import ReturnsAgent
 from .recommender_agent import PostPurchaseRecommenderAgent
+from .intent_classifier import IntentClassifier
+from .routing_cache import RoutingCache
+from .conversation_store import create_conversation_store, session_key
+
+# Agent for messages no route could be found for
+DEFAULT_AGENT = "search"
 
 
 class AgentOrchestrator:
@@ -32,33 +42,90 @@ class AgentOrchestrator:
             "returns": ReturnsAgent(),
             "recommender": PostPurchaseRecommenderAgent()
         }
-        self.conversation_history: Dict[int, list] = {}
+        self.conversation_store = create_conversation_store()
+        self.intent_classifier = IntentClassifier()
+        self.routing_threshold = Config.ROUTING_CONFIDENCE_THRESHOLD
+        self.routing_cache = RoutingCache(
+            max_size=Config.ROUTING_CACHE_SIZE,
+            ttl_seconds=Config.ROUTING_CACHE_TTL_SECONDS
+        )
     
     async def process_message(
         self,
         message: str,
         customer_id: Optional[int] = None,
         context: Dict[str, Any] = None,
-        db: Session = None
+        db: AsyncSession = None,
+        session_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """Process user message and route to appropriate agent"""
         context = context or {}
+        history_key = session_key(session_id, customer_id)
         
         # Determine which agent to use
         agent_name = await self._route_message(message, context)
-        agent = self.agents[agent_name]
+        return await self._run_agent(agent_name, message, context, db, history_key)
+    
+    async def stream_message(
+        self,
+        message: str,
+        customer_id: Optional[int] = None,
+        context: Dict[str, Any] = None,
+        db: AsyncSession = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Process user message, yielding the chosen agent, text chunks and the final result"""
+        context = context or {}
+        history_key = session_key(session_id, customer_id)
         
-        # Get conversation history
-        history = self.conversation_history.get(customer_id or 0, [])
-        history.append({"role": "user", "content": message})
+        agent_name = await self._route_message(message, context)
+        yield {"event": "agent", "data": {"agent_name": agent_name}}
+        
+        chunks: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        
+        async def run_agent() -> Dict[str, Any]:
+            # The task runs in a copy of the current context, so the sink only
+            # applies to LLM calls made on behalf of this request
+            token_sink.set(chunks.put_nowait)
+            try:
+                return await self._run_agent(agent_name, message, context, db, history_key)
+            finally:
+                chunks.put_nowait(finished)
+        
+        task = asyncio.create_task(run_agent())
+        try:
+            while (chunk := await chunks.get()) is not finished:
+                yield {"event": "token", "data": {"text": chunk}}
+            result = await task
+        finally:
+            if not task.done():
+                task.cancel()
+        
+        yield {"event": "done", "data": result}
+    
+    async def _run_agent(
+        self,
+        agent_name: str,
+        message: str,
+        context: Dict[str, Any],
+        db: AsyncSession,
+        history_key: Optional[str]
+    ) -> Dict[str, Any]:
+        """Run the selected agent and record the exchange in conversation history"""
+        agent = self.agents[agent_name]
         
         # Process with selected agent
         try:
             response = await agent.process(message, context, db)
             
-            # Update history
-            history.append({"role": "assistant", "content": response.get("response", "")})
-            self.conversation_history[customer_id or 0] = history[-10:]  # Keep last 10 messages
+            # Update history (anonymous requests without a session keep none)
+            if history_key:
+                await self.conversation_store.append(
+                    history_key,
+                    {"role": "user", "content": message},
+                    {"role": "assistant", "content": response.get("response", "")}
+                )
             
             return {
                 "agent_name": agent_name,
@@ -68,17 +135,47 @@ class AgentOrchestrator:
                 "reasoning": response.get("reasoning"),
                 "data": response.get("data")
             }
+        except LLMOverloadedError:
+            # Surfaced to the client as 503 + Retry-After
+            raise
         except Exception as e:
-            return {
-                "agent_name": agent_name,
-                "response": f"I apologize, but I encountered an error: {str(e)}",
-                "actions_taken": [],
-                "confidence": 0.0,
-                "error": str(e)
-            }
+            return self.error_response(agent_name, e)
+    
+    @staticmethod
+    def error_response(agent_name: Optional[str], error: Exception) -> Dict[str, Any]:
+        """Apology payload returned in place of an agent reply that failed"""
+        return {
+            "agent_name": agent_name,
+            "response": f"I apologize, but I encountered an error: {str(error)}",
+            "actions_taken": [],
+            "confidence": 0.0,
+            "error": str(error)
+        }
     
     async def _route_message(self, message: str, context: Dict[str, Any]) -> str:
+        """Route message from cache, locally when confident, otherwise via the LLM"""
+        self.routing_cache.sync_agents(self.agents.keys())
+        cache_key = self.routing_cache.make_key(message, context)
+        cached = self.routing_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        agent_name, confidence = self.intent_classifier.classify(message)
+        if confidence < self.routing_threshold or agent_name not in self.agents:
+            agent_name = await self._llm_route(message, context)
+            if agent_name is None:
+                # Not cached: one unusable LLM reply must not pin the message
+                return DEFAULT_AGENT
+        
+        self.routing_cache.put(cache_key, agent_name)
+        return agent_name
+    
+    async def _route_with_llm(self, message: str, context: Dict[str, Any]) -> str:
         """Route message to appropriate agent using LLM"""
+        return await self._llm_route(message, context) or DEFAULT_AGENT
+    
+    async def _llm_route(self, message: str, context: Dict[str, Any]) -> Optional[str]:
+        """Agent name chosen by the LLM, or None when the reply is not an agent"""
         routing_prompt = f"""Analyze the following user message and determine which specialized agent should handle it.
 
 Available agents:
@@ -96,26 +193,50 @@ Respond with ONLY the agent name (stylist, search, lookbook, checkout, returns,
 
         llm_provider = get_llm_provider()
         default_model = LLMProviderFactory.get_default_model()
+        messages = [
+            {"role": "system", "content": "You are a routing agent. Respond with only the agent name."},
+            {"role": "user", "content": routing_prompt}
+        ]
+        temperature = 0.3
         
-        response = await llm_provider.chat_completion(
-            messages=[
-                {"role": "system", "content": "You are a routing agent. Respond with only the agent name."},
-                {"role": "user", "content": routing_prompt}
-            ],
-            model=default_model,
-            temperature=0.3
-        )
+        def complete():
+            return llm_provider.chat_completion(
+                messages=messages,
+                model=default_model,
+                temperature=temperature
+            )
+        
+        agent_token = current_agent.set("router")
+        try:
+            cache = get_llm_cache()
+            if cache is not None and cache.is_deterministic(temperature):
+                cache_key = cache.make_key(default_model, messages, temperature)
+                response = await cache.get_or_call(
+                    cache_key, "router", Config.ROUTING_CACHE_TTL_SECONDS, complete,
+                    cacheable=lambda text: text.strip().lower() in self.agents
+                )
+            else:
+                response = await complete()
+        finally:
+            current_agent.reset(agent_token)
         
         agent_name = response.strip().lower()
         
         # Validate agent name
         if agent_name not in self.agents:
-            # Default to search if routing fails
-            return "search"
+            return None
         
         return agent_name
     
     def get_agent_status(self) -> Dict[str, str]:
         """Get status of all agents"""
         return {name: "active" for name in self.agents.keys()}
+    
+    async def get_conversation_stats(self) -> Dict[str, Any]:
+        """Get conversation store size and eviction counters"""
+        return await self.conversation_store.get_stats()
+    
+    def get_routing_stats(self) -> Dict[str, Any]:
+        """Get routing cache counters"""
+        return self.routing_cache.get_stats()
 
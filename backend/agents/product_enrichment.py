@@ -0,0 +1,191 @@
+"""
+Product Enrichment - Batched price, rating and stock lookups for product lists
+
+Agents that list products used to run one min(price) (and one avg(rating))
+query per row. ProductEnricher fetches the same figures for a whole list of
+product ids in one query and keeps them in a short-TTL in-process cache, so
+a page of 20 results costs at most one round-trip. With
+PRODUCT_SUMMARY_ENABLED the query is a primary-key lookup on
+retail.product_summary; otherwise it aggregates SKUs and reviews.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+import sys
+from pathlib import Path
+
+from sqlalchemy import func, select, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+from config import Config
+from models import Product, ProductSummary, ProductVariant, Review, SKU
+
+
+def _empty_enrichment() -> Dict[str, Any]:
+    return {"price_min": None, "price_max": None, "rating": None,
+            "review_count": 0, "in_stock": False}
+
+
+class ProductEnricher:
+    """Batched enrichment lookup with an optional LRU + TTL cache per product id"""
+
+    def __init__(self, ttl_seconds: float = 30.0, max_size: int = 10_000, use_summary: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.use_summary = use_summary
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+
+    async def enrich(self, db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Map each product id to price_min, price_max, rating, review_count and in_stock"""
+        product_ids = list(dict.fromkeys(product_ids))
+        result: Dict[int, Dict[str, Any]] = {}
+        missing: List[int] = []
+        now = time.monotonic()
+
+        for product_id in product_ids:
+            entry = self._entries.get(product_id) if self.ttl_seconds > 0 else None
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(product_id)
+                result[product_id] = entry[0]
+                self.hits += 1
+            else:
+                missing.append(product_id)
+        self.misses += len(missing)
+
+        if missing:
+            fetch = self._fetch_summary if self.use_summary else self._fetch
+            fetched = await fetch(db, missing)
+            for product_id in missing:
+                data = fetched.get(product_id, _empty_enrichment())
+                result[product_id] = data
+                self._put(product_id, data, now)
+        return result
+
+    async def enrich_products(self, db: AsyncSession, products: List[Any]) -> List[Dict[str, Any]]:
+        """Format Product rows as dicts with their enrichment merged in"""
+        enrichment = await self.enrich(db, [p.product_id for p in products])
+        results = []
+        for product in products:
+            data = enrichment[product.product_id]
+            results.append({
+                "product_id": product.product_id,
+                "product_name": product.product_name,
+                "brand_name": product.brand_name,
+                "product_type": product.product_type,
+                "price_from": data["price_min"],
+                "price_to": data["price_max"],
+                "rating": data["rating"],
+                "review_count": data["review_count"],
+                "in_stock": data["in_stock"],
+            })
+        return results
+
+    def invalidate(self, product_ids: Optional[Iterable[int]] = None) -> None:
+        """Drop cached entries for the given products (or everything)"""
+        if product_ids is None:
+            self._entries.clear()
+            return
+        for product_id in product_ids:
+            self._entries.pop(product_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "queries": self.queries,
+            "source": "product_summary" if self.use_summary else "aggregate",
+        }
+
+    async def _fetch_summary(self, db: AsyncSession, product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Primary-key lookups on the trigger-maintained summary table"""
+        rows = (await db.execute(
+            select(ProductSummary).where(ProductSummary.product_id.in_(product_ids))
+        )).scalars().all()
+        self.queries += 1
+
+        return {
+            row.product_id: {
+                "price_min": float(row.price_min) if row.price_min is not None else None,
+                "price_max": float(row.price_max) if row.price_max is not None else None,
+                "rating": round(row.rating_avg, 1) if row.rating_avg is not None else None,
+                "review_count": row.rating_count,
+                "in_stock": row.in_stock,
+            }
+            for row in rows
+        }
+
+    async def _fetch(self, db: AsyncSession, product_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """One statement: active SKU prices and review stats grouped per product"""
+        prices = select(
+            ProductVariant.product_id.label("product_id"),
+            func.min(SKU.price).label("price_min"),
+            func.max(SKU.price).label("price_max"),
+            func.max(case((SKU.inventory_quantity > 0, 1), else_=0)).label("in_stock")
+        ).join(SKU, SKU.variant_id == ProductVariant.variant_id).where(
+            ProductVariant.product_id.in_(product_ids),
+            SKU.status == "ACTIVE"
+        ).group_by(ProductVariant.product_id).subquery()
+
+        ratings = select(
+            Review.product_id.label("product_id"),
+            func.avg(Review.rating).label("rating"),
+            func.count(Review.review_id).label("review_count")
+        ).where(Review.product_id.in_(product_ids)).group_by(Review.product_id).subquery()
+
+        rows = (await db.execute(
+            select(
+                Product.product_id,
+                prices.c.price_min, prices.c.price_max, prices.c.in_stock,
+                ratings.c.rating, ratings.c.review_count
+            ).select_from(Product)
+            .outerjoin(prices, prices.c.product_id == Product.product_id)
+            .outerjoin(ratings, ratings.c.product_id == Product.product_id)
+            .where(Product.product_id.in_(product_ids))
+        )).all()
+        self.queries += 1
+
+        return {
+            row.product_id: {
+                "price_min": float(row.price_min) if row.price_min is not None else None,
+                "price_max": float(row.price_max) if row.price_max is not None else None,
+                "rating": round(float(row.rating), 1) if row.rating is not None else None,
+                "review_count": int(row.review_count or 0),
+                "in_stock": bool(row.in_stock),
+            }
+            for row in rows
+        }
+
+    def _put(self, product_id: int, data: Dict[str, Any], now: float) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[product_id] = (data, now + self.ttl_seconds)
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+# Shared instance (lazy initialization)
+_enricher_instance: Optional[ProductEnricher] = None
+
+
+def get_product_enricher() -> ProductEnricher:
+    """Get or create the enricher shared by all agents"""
+    global _enricher_instance
+    if _enricher_instance is None:
+        _enricher_instance = ProductEnricher(
+            ttl_seconds=Config.PRODUCT_ENRICHMENT_CACHE_TTL_SECONDS,
+            max_size=Config.PRODUCT_ENRICHMENT_CACHE_SIZE,
+            use_summary=Config.PRODUCT_SUMMARY_ENABLED
+        )
+    return _enricher_instance
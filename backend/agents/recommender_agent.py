@@ -3,11 +3,13 @@ Post-Purchase Recommender Agent - Suggests related products
 """
 
 from typing import Dict, Any, List
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, or_, select
 
 from .base_agent import BaseAgent
-from models import Product, Order, OrderLineItem, SKU, ProductVariant, Review, Customer
+from .product_enrichment import get_product_enricher
+from config import Config
+from models import Product, Order, OrderLineItem, SKU, ProductVariant, ProductSummary, Customer
 
 
 class PostPurchaseRecommenderAgent(BaseAgent):
@@ -22,20 +24,20 @@ class PostPurchaseRecommenderAgent(BaseAgent):
             recommendations based on their taste."""
         )
     
-    async def process(self, message: str, context: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    async def process(self, message: str, context: Dict[str, Any], db: AsyncSession) -> Dict[str, Any]:
         """Process recommendation request"""
         customer_id = context.get("customer_id")
         product_id = context.get("product_id")
         
         if product_id:
             # Product-based recommendations
-            recommendations = self._get_product_recommendations(db, product_id)
+            recommendations = await self._get_product_recommendations(db, product_id)
         elif customer_id:
             # Customer-based recommendations
-            recommendations = self._get_customer_recommendations(db, customer_id)
+            recommendations = await self._get_customer_recommendations(db, customer_id)
         else:
             # General recommendations
-            recommendations = self._get_trending_recommendations(db)
+            recommendations = await self._get_trending_recommendations(db)
         
         # Generate natural language response
         response = self._format_recommendations(recommendations, message)
@@ -54,88 +56,93 @@ class PostPurchaseRecommenderAgent(BaseAgent):
             }
         }
     
-    def _get_product_recommendations(self, db: Session, product_id: int, limit: int = 5) -> List[Dict]:
+    async def _get_product_recommendations(self, db: AsyncSession, product_id: int, limit: int = 5) -> List[Dict]:
         """Get recommendations based on a specific product"""
         # Get the product
-        product = db.query(Product).filter(Product.product_id == product_id).first()
+        product = await db.get(Product, product_id)
         if not product:
             return []
         
         # Find similar products (same category, brand, or style)
-        query = db.query(Product).filter(
+        query = select(Product).where(
             Product.product_id != product_id,
             Product.status == "ACTIVE"
         )
         
         # Same category/brand
-        similar = query.filter(
+        similar = list((await db.execute(query.where(
             (Product.hierarchy_id == product.hierarchy_id) |
             (Product.brand_name == product.brand_name)
-        ).limit(limit).all()
+        ).limit(limit))).scalars().all())
         
         # If not enough, add by gender
         if len(similar) < limit:
-            additional = query.filter(
+            additional = (await db.execute(query.where(
                 Product.gender == product.gender
-            ).limit(limit - len(similar)).all()
+            ).limit(limit - len(similar)))).scalars().all()
             similar.extend(additional)
         
-        return self._format_product_list(similar, db)
+        return await self._format_product_list(similar, db)
     
-    def _get_customer_recommendations(self, db: Session, customer_id: int, limit: int = 10) -> List[Dict]:
+    async def _get_customer_recommendations(self, db: AsyncSession, customer_id: int, limit: int = 10) -> List[Dict]:
         """Get recommendations based on customer purchase history"""
-        # Get customer's past orders
-        orders = db.query(Order).filter(
+        recommendations = await self._select_customer_candidates(db, customer_id, limit)
+        
+        # No history (or nothing similar to it): fall back to what's popular
+        if not recommendations:
+            return await self._get_trending_recommendations(db, limit)
+        return await self._format_product_list(recommendations, db)
+    
+    async def _select_customer_candidates(self, db: AsyncSession, customer_id: int, limit: int = 10) -> List[Product]:
+        """Unpurchased active products sharing a category or brand with recent purchases
+        
+        One round-trip: the customer's last 10 completed orders are walked
+        through line items, SKUs and variants to the purchased products, and
+        the candidates are selected against that set.
+        """
+        recent_orders = select(Order.order_id).where(
             Order.customer_id == customer_id,
             Order.order_status == "COMPLETED"
-        ).order_by(desc(Order.order_date)).limit(10).all()
-        
-        if not orders:
-            return self._get_trending_recommendations(db, limit)
-        
-        # Get products from orders
-        product_ids = set()
-        for order in orders:
-            line_items = db.query(OrderLineItem).filter(
-                OrderLineItem.order_id == order.order_id
-            ).all()
-            
-            for item in line_items:
-                sku = db.query(SKU).filter(SKU.sku_id == item.sku_id).first()
-                if sku:
-                    variant = db.query(ProductVariant).filter(
-                        ProductVariant.variant_id == sku.variant_id
-                    ).first()
-                    if variant:
-                        product_ids.add(variant.product_id)
-        
-        # Get similar products
-        if product_ids:
-            # Get categories/brands from purchased products
-            purchased_products = db.query(Product).filter(
-                Product.product_id.in_(list(product_ids))
-            ).all()
-            
-            categories = [p.hierarchy_id for p in purchased_products]
-            brands = [p.brand_name for p in purchased_products]
-            
-            # Recommend similar items
-            recommendations = db.query(Product).filter(
-                Product.product_id.notin_(list(product_ids)),
-                Product.status == "ACTIVE",
-                (
-                    (Product.hierarchy_id.in_(categories)) |
-                    (Product.brand_name.in_(brands))
-                )
-            ).limit(limit).all()
-            return self._format_product_list(recommendations, db)
-        else:
-            return self._get_trending_recommendations(db, limit)
+        ).order_by(desc(Order.order_date)).limit(10).cte("recent_orders")
+        
+        purchased = select(
+            Product.product_id, Product.hierarchy_id, Product.brand_name
+        ).select_from(recent_orders).join(
+            OrderLineItem, OrderLineItem.order_id == recent_orders.c.order_id
+        ).join(
+            SKU, SKU.sku_id == OrderLineItem.sku_id
+        ).join(
+            ProductVariant, ProductVariant.variant_id == SKU.variant_id
+        ).join(
+            Product, Product.product_id == ProductVariant.product_id
+        ).distinct().cte("purchased")
+        
+        return list((await db.execute(select(Product).where(
+            Product.product_id.notin_(select(purchased.c.product_id)),
+            Product.status == "ACTIVE",
+            or_(
+                Product.hierarchy_id.in_(select(purchased.c.hierarchy_id)),
+                Product.brand_name.in_(select(purchased.c.brand_name))
+            )
+        ).limit(limit))).scalars().all())
     
-    def _get_trending_recommendations(self, db: Session, limit: int = 10) -> List[Dict]:
+    async def _get_trending_recommendations(self, db: AsyncSession, limit: int = 10) -> List[Dict]:
         """Get trending/popular products"""
+        if Config.PRODUCT_SUMMARY_ENABLED:
+            # Best sellers of the last 30 days, read off the summary's trending index
+            products = (await db.execute(select(Product).join(
+                ProductSummary, ProductSummary.product_id == Product.product_id
+            ).where(
+                Product.status == "ACTIVE",
+                ProductSummary.units_sold_total > 0
+            ).order_by(
+                ProductSummary.units_sold_30d.desc(),
+                ProductSummary.units_sold_total.desc()
+            ).limit(limit))).scalars().all()
+            return await self._format_product_list(products, db)
+
         # Products with most orders
-        trending = db.query(
+        trending = (await db.execute(select(
             Product,
             func.count(OrderLineItem.line_item_id).label('order_count')
         ).join(
@@ -144,46 +151,20 @@ class PostPurchaseRecommenderAgent(BaseAgent):
             SKU
         ).join(
             OrderLineItem
-        ).filter(
+        ).where(
             Product.status == "ACTIVE"
         ).group_by(
             Product.product_id
         ).order_by(
             desc('order_count')
-        ).limit(limit).all()
+        ).limit(limit))).all()
         
         products = [p[0] for p in trending]
-        return self._format_product_list(products, db)
+        return await self._format_product_list(products, db)
     
-    def _format_product_list(self, products: List, db: Session = None) -> List[Dict]:
-        """Format products for response"""
-        results = []
-        for product in products:
-            # Get price range (need db session)
-            lowest_price = None
-            avg_rating = None
-            if db:
-                lowest_price = db.query(func.min(SKU.price)).join(
-                    ProductVariant
-                ).filter(
-                    ProductVariant.product_id == product.product_id,
-                    SKU.status == "ACTIVE"
-                ).scalar()
-                
-                avg_rating = db.query(func.avg(Review.rating)).filter(
-                    Review.product_id == product.product_id
-                ).scalar()
-            
-            results.append({
-                "product_id": product.product_id,
-                "product_name": product.product_name,
-                "brand_name": product.brand_name,
-                "product_type": product.product_type,
-                "price_from": float(lowest_price) if lowest_price else None,
-                "rating": round(float(avg_rating), 1) if avg_rating else None
-            })
-        
-        return results
+    async def _format_product_list(self, products: List, db: AsyncSession) -> List[Dict]:
+        """Format products for response, enriched in one batched query"""
+        return await get_product_enricher().enrich_products(db, products)
     
     def _format_recommendations(self, recommendations: List[Dict], query: str) -> str:
         """Format recommendations as natural language"""
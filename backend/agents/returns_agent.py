@@ -3,7 +3,8 @@ Returns Agent - Manages return requests
 """
 
 from typing import Dict, Any
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 
 from .base_agent import BaseAgent
@@ -21,7 +22,7 @@ class ReturnsAgent(BaseAgent):
             issues. Always be empathetic and solution-oriented."""
         )
     
-    async def process(self, message: str, context: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    async def process(self, message: str, context: Dict[str, Any], db: AsyncSession) -> Dict[str, Any]:
         """Process return request"""
         message_lower = message.lower()
         customer_id = context.get("customer_id")
@@ -37,7 +38,7 @@ class ReturnsAgent(BaseAgent):
         else:
             return await self._handle_general_return_question(message, context, db)
     
-    async def _initiate_return(self, message: str, context: Dict, db: Session) -> Dict[str, Any]:
+    async def _initiate_return(self, message: str, context: Dict, db: AsyncSession) -> Dict[str, Any]:
         """Initiate a return request"""
         order_id = context.get("order_id")
         customer_id = context.get("customer_id")
@@ -51,12 +52,12 @@ class ReturnsAgent(BaseAgent):
         
         # Get order
         if order_id:
-            order = db.query(Order).filter(Order.order_id == order_id).first()
+            order = await db.get(Order, order_id)
         elif customer_id:
             # Get most recent order
-            order = db.query(Order).filter(
+            order = await db.scalar(select(Order).where(
                 Order.customer_id == customer_id
-            ).order_by(Order.order_date.desc()).first()
+            ).order_by(Order.order_date.desc()).limit(1))
         else:
             order = None
         
@@ -105,8 +106,8 @@ class ReturnsAgent(BaseAgent):
                 notes=f"Created by agent. Reason: {reason}"
             )
             db.add(db_return)
-            db.commit()
-            db.refresh(db_return)
+            await db.commit()
+            await db.refresh(db_return)
             
             return {
                 "response": f"I've submitted your return request for order {order.order_number}. Your return ID is {db_return.return_id}. You'll receive a confirmation email shortly.",
@@ -139,7 +140,7 @@ Would you like me to process this return? You'll receive a refund to your origin
             }
         }
     
-    async def _explain_return_policy(self, message: str, context: Dict, db: Session) -> Dict[str, Any]:
+    async def _explain_return_policy(self, message: str, context: Dict, db: AsyncSession) -> Dict[str, Any]:
         """Explain return policy"""
         response = """Our Return Policy:
 
@@ -158,15 +159,13 @@ To start a return, just let me know your order number or sign in to your account
             "confidence": 1.0
         }
     
-    async def _check_return_status(self, message: str, context: Dict, db: Session) -> Dict[str, Any]:
+    async def _check_return_status(self, message: str, context: Dict, db: AsyncSession) -> Dict[str, Any]:
         """Check return request status"""
         return_id = context.get("return_id")
         customer_id = context.get("customer_id")
         
         if return_id:
-            return_request = db.query(ReturnRequest).filter(
-                ReturnRequest.return_id == return_id
-            ).first()
+            return_request = await db.get(ReturnRequest, return_id)
             
             if return_request:
                 response = f"""Return Status: {return_request.return_status}
@@ -179,9 +178,9 @@ Your return is currently {return_request.return_status.lower()}."""
             else:
                 response = "I couldn't find that return request. Please check your return ID."
         elif customer_id:
-            returns = db.query(ReturnRequest).join(Order).filter(
+            returns = (await db.execute(select(ReturnRequest).join(Order).where(
                 Order.customer_id == customer_id
-            ).order_by(ReturnRequest.requested_date.desc()).limit(5).all()
+            ).order_by(ReturnRequest.requested_date.desc()).limit(5))).scalars().all()
             
             if returns:
                 response = f"You have {len(returns)} return request(s). Your latest return is {returns[0].return_status.lower()}."
@@ -196,7 +195,7 @@ Your return is currently {return_request.return_status.lower()}."""
             "confidence": 0.9
         }
     
-    async def _handle_general_return_question(self, message: str, context: Dict, db: Session) -> Dict[str, Any]:
+    async def _handle_general_return_question(self, message: str, context: Dict, db: AsyncSession) -> Dict[str, Any]:
         """Handle general return questions"""
         response = await self.call_llm([{
             "role": "user",
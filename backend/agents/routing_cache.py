@@ -0,0 +1,102 @@
+"""
+Routing Cache - Memoizes orchestrator routing decisions
+
+Chat traffic repeats heavily ("track my return", "show me dresses under 50"),
+so routing decisions are cached on the normalized message plus the context
+keys that change which agent should answer. Entries expire after a TTL, the
+cache is LRU-bounded, and it is cleared whenever the available agent set
+changes.
+"""
+
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+# Context keys whose presence can change the routing decision
+ROUTING_CONTEXT_KEYS = ("order_id", "return_id", "product_id", "cart_items")
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, strip punctuation and collapse numbers and whitespace"""
+    text = _PUNCTUATION.sub(" ", message.lower())
+    text = _NUMBER.sub("#", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class RoutingCache:
+    """LRU + TTL cache of message -> agent name"""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple[str, float]]" = OrderedDict()
+        self._agent_set: Optional[frozenset] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def make_key(self, message: str, context: Dict[str, Any]) -> Hashable:
+        """Cache key from the normalized message and routing-relevant context"""
+        present = tuple(key for key in ROUTING_CONTEXT_KEYS if context.get(key))
+        return normalize_message(message), present
+
+    def sync_agents(self, agent_names: Iterable[str]) -> None:
+        """Clear the cache if the set of available agents has changed"""
+        agent_set = frozenset(agent_names)
+        if agent_set != self._agent_set:
+            if self._agent_set is not None:
+                self.invalidations += 1
+            self._entries.clear()
+            self._agent_set = agent_set
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """Cached agent name, or None on miss or expiry"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        agent_name, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return agent_name
+
+    def put(self, key: Hashable, agent_name: str) -> None:
+        """Store a routing decision, evicting the least recently used entry"""
+        self._entries[key] = (agent_name, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all cached decisions"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters for the status endpoint"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -2,12 +2,29 @@
 Catalog Search Agent - Product search and filtering
 """
 
-from typing import Dict, Any, List
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
+import asyncio
+import re
+import time
+from typing import Dict, Any, List, Optional, Tuple
 
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Select, select
+
+from .attribute_index import ATTRIBUTES, apply_attribute_filter, get_attribute_index
 from .base_agent import BaseAgent
-from models import Product, SKU, ProductVariant, ProductHierarchy
+from .catalog_index import get_catalog_index
+from .hierarchy import apply_category_filter
+from .catalog_search import (
+    apply_keyword_search, apply_price_filter, match_ids, reciprocal_rank_fusion, search_with_fallback,
+    vector_search
+)
+from .facet_index import get_facet_index
+from .product_enrichment import get_product_enricher
+from config import Config
+from database import AsyncSessionLocal
+from embeddings import get_query_embedding_cache
+from models import Product
 
 
 class CatalogSearchAgent(BaseAgent):
@@ -22,75 +39,116 @@ class CatalogSearchAgent(BaseAgent):
             details and help narrow down options when there are many results."""
         )
     
-    async def process(self, message: str, context: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    async def process(self, message: str, context: Dict[str, Any], db: AsyncSession) -> Dict[str, Any]:
         """Process search request"""
         # Extract search parameters from message
         search_params = self._parse_search_query(message)
         
         # Build database query
-        query = db.query(Product).filter(Product.status == "ACTIVE")
-        
-        # Apply filters
-        if search_params.get("keywords"):
-            keywords = search_params["keywords"]
-            query = query.filter(
-                or_(
-                    Product.product_name.ilike(f"%{keywords}%"),
-                    Product.product_description.ilike(f"%{keywords}%"),
-                    Product.brand_name.ilike(f"%{keywords}%")
-                )
-            )
-        
-        if search_params.get("category"):
-            query = query.join(ProductHierarchy).filter(
-                ProductHierarchy.hierarchy_name.ilike(f"%{search_params['category']}%")
-            )
+        query = select(Product).where(Product.status == "ACTIVE")
+        
+        # Apply filters (a category covers its subcategories)
+        query = await apply_category_filter(query, search_params.get("category"))
         
         if search_params.get("gender"):
-            query = query.filter(Product.gender == search_params["gender"])
+            query = query.where(Product.gender == search_params["gender"])
         
         if search_params.get("brand"):
-            query = query.filter(Product.brand_name.ilike(f"%{search_params['brand']}%"))
+            query = query.where(Product.brand_name.ilike(f"%{search_params['brand']}%"))
         
-        if search_params.get("price_min"):
-            query = query.join(ProductVariant).join(SKU).filter(
-                SKU.price >= search_params["price_min"]
-            )
+        query = apply_price_filter(query, search_params.get("price_min"), search_params.get("price_max"))
         
-        if search_params.get("price_max"):
-            query = query.join(ProductVariant).join(SKU).filter(
-                SKU.price <= search_params["price_max"]
-            )
+        # Color/size/material/pattern/stock: product ids from the SKU bitmaps
+        attribute_filters = {a: [search_params[a]] for a in ATTRIBUTES if search_params.get(a)}
+        attribute_ids = None
+        if attribute_filters or search_params.get("in_stock"):
+            attribute_ids = get_attribute_index().match(attribute_filters, search_params.get("in_stock", False))
+            query = apply_attribute_filter(query, attribute_filters, search_params.get("in_stock", False),
+                                           product_ids=attribute_ids)
         
         # Execute query
-        products = query.distinct().limit(20).all()
+        match_mode = None
+        hybrid_stats = None
+        search_mode = (context or {}).get("search_mode") or Config.CATALOG_SEARCH_MODE
+        if search_params.get("keywords") and search_mode == "hybrid":
+            # Keyword and vector rankings, both under the filters, fused
+            products, hybrid_stats = await self._hybrid_search(query, search_params["keywords"])
+            if products:
+                match_mode = "hybrid"
+        
+        if search_params.get("keywords") and search_mode == "semantic":
+            # Nearest products by embedding, filters applied in the index scan;
+            # keyword search below covers catalogs not embedded yet
+            embedding = await get_query_embedding_cache().get(search_params["keywords"])
+            neighbours = await vector_search(db, embedding, limit=20, query=query)
+            if neighbours:
+                products = [product for product, _ in neighbours]
+                match_mode = "semantic"
+        
+        index = get_catalog_index()
+        if match_mode is None and search_params.get("keywords") and index.ready:
+            # Candidates come from the in-memory BM25 index; only those rows
+            # are read, through the same filters, in index order
+            filtered = any(search_params.get(f) for f in ("category", "gender", "brand", "price_min", "price_max",
+                                                           "in_stock", *ATTRIBUTES))
+            hits = index.search(search_params["keywords"], k=Config.CATALOG_INDEX_CANDIDATES if filtered else 20)
+            if hits and attribute_ids is not None:
+                # Drop hits without a matching SKU before reading any rows
+                keep = np.isin([product_id for product_id, _ in hits], attribute_ids)
+                hits = [hit for hit, kept in zip(hits, keep) if kept]
+            if hits:
+                position = {product_id: i for i, (product_id, _) in enumerate(hits)}
+                rows = (await db.execute(query.where(Product.product_id.in_(position)))).scalars().all()
+                products = sorted(rows, key=lambda p: position[p.product_id])[:20]
+                if products:
+                    match_mode = "bm25"
+        
+        if match_mode is None and search_params.get("keywords"):
+            # Full-text match, ranked by relevance, with a typo-tolerant
+            # fallback on name and brand when nothing matches exactly
+            rows = (await db.execute(
+                search_with_fallback(query, search_params["keywords"], limit=20)
+            )).all()
+            products = [row[0] for row in rows]
+            match_mode = "fuzzy" if any(row[1] for row in rows) else "exact"
+        elif match_mode is None:
+            products = (await db.execute(query.limit(20))).scalars().all()
+            match_mode = "exact"
+        fuzzy = match_mode == "fuzzy"
+        # Opt-in: counting reads the ids of up to FACET_MAX_MATCHES matches
+        facets = None
+        if (context or {}).get("facets"):
+            facets = await self._count_facets(db, query, search_params.get("keywords"), products, fuzzy)
         
-        # Format results
+        # Format results (prices, ratings and stock in one batched query)
+        enrichment = await get_product_enricher().enrich(db, [p.product_id for p in products])
         results = []
         for product in products:
-            # Get lowest price SKU
-            lowest_price = db.query(func.min(SKU.price)).join(ProductVariant).filter(
-                ProductVariant.product_id == product.product_id,
-                SKU.status == "ACTIVE"
-            ).scalar()
-            
+            data = enrichment[product.product_id]
             results.append({
                 "product_id": product.product_id,
                 "product_name": product.product_name,
                 "brand_name": product.brand_name,
                 "product_type": product.product_type,
-                "price_from": float(lowest_price) if lowest_price else None,
+                "price_from": data["price_min"],
+                "price_to": data["price_max"],
+                "rating": data["rating"],
+                "review_count": data["review_count"],
+                "in_stock": data["in_stock"],
                 "description": product.product_description[:100] + "..." if product.product_description else None
             })
         
         # Generate natural language response
-        response_text = self._format_search_results(message, results, search_params)
+        response_text = self._format_search_results(message, results, search_params, fuzzy)
         
         return {
             "response": response_text,
             "actions_taken": [
                 {"action": "parsed_search_query", "params": search_params},
-                {"action": "executed_database_search"},
+                *([{"action": "hybrid_retrieval", **hybrid_stats}] if hybrid_stats else []),
+                {"action": "executed_database_search", "match_mode": match_mode},
+                *([{"action": "counted_facets", "matched": facets["matched"], "took_ms": facets["took_ms"]}]
+                  if facets else []),
                 {"action": "formatted_results", "count": len(results)}
             ],
             "confidence": 0.9,
@@ -98,18 +156,98 @@ class CatalogSearchAgent(BaseAgent):
             "data": {
                 "products": results,
                 "search_params": search_params,
-                "total_results": len(results)
+                "match_mode": match_mode,
+                "total_results": len(results),
+                "facets": facets
             }
         }
     
+    async def _hybrid_search(self, query: Select, keywords: str) -> Tuple[List[Product], Dict[str, Any]]:
+        """Top 20 of the keyword and vector rankings of `query`, fused by reciprocal rank
+
+        The two rankings run concurrently, each on its own session (a
+        session cannot run two statements at once). Returns the products
+        and per-stage timings and candidate counts.
+        """
+        candidates = Config.CATALOG_HYBRID_CANDIDATES
+        timings: Dict[str, float] = {}
+
+        def elapsed_ms(start: float) -> float:
+            return round((time.perf_counter() - start) * 1000.0, 2)
+
+        async def keyword_ranking() -> List[Product]:
+            start = time.perf_counter()
+            index = get_catalog_index()
+            async with AsyncSessionLocal() as session:
+                if index.ready:
+                    # BM25 hits, then the filters in one read of those rows
+                    hits = index.search(keywords, k=max(candidates, Config.CATALOG_INDEX_CANDIDATES))
+                    position = {product_id: i for i, (product_id, _) in enumerate(hits)}
+                    rows = (await session.execute(query.where(Product.product_id.in_(position)))).scalars().all() \
+                        if hits else []
+                    ranked = sorted(rows, key=lambda p: position[p.product_id])[:candidates]
+                else:
+                    ranked = (await session.execute(
+                        apply_keyword_search(query, keywords).limit(candidates)
+                    )).scalars().all()
+            timings["keyword_ms"] = elapsed_ms(start)
+            return list(ranked)
+
+        async def vector_ranking() -> List[Product]:
+            start = time.perf_counter()
+            embedding = await get_query_embedding_cache().get(keywords)
+            timings["embed_ms"] = elapsed_ms(start)
+            async with AsyncSessionLocal() as session:
+                neighbours = await vector_search(session, embedding, limit=candidates, query=query)
+            timings["vector_ms"] = elapsed_ms(start)
+            return [product for product, _ in neighbours]
+
+        start = time.perf_counter()
+        keyword_hits, vector_hits = await asyncio.gather(keyword_ranking(), vector_ranking())
+        timings["retrieval_ms"] = elapsed_ms(start)
+
+        fuse_start = time.perf_counter()
+        by_id = {product.product_id: product for product in vector_hits + keyword_hits}
+        fused = reciprocal_rank_fusion(
+            [[p.product_id for p in keyword_hits], [p.product_id for p in vector_hits]],
+            k=Config.CATALOG_HYBRID_RRF_K
+        )
+        products = [by_id[product_id] for product_id, _ in fused[:20]]
+        timings["fusion_ms"] = elapsed_ms(fuse_start)
+        timings["total_ms"] = elapsed_ms(start)
+
+        return products, {
+            "stages_ms": timings,
+            "candidates": {"keyword": len(keyword_hits), "vector": len(vector_hits), "fused": len(fused)},
+        }
+    
+    async def _count_facets(self, db: AsyncSession, query: Select, keywords: Optional[str],
+                            products: List[Product], fuzzy: bool) -> Optional[Dict[str, Any]]:
+        """Facet counts over the full-text matches of the filtered query (up to FACET_MAX_MATCHES)
+
+        Counts the products shown instead when the keywords match nothing
+        in full text (fuzzy or purely semantic results).
+        """
+        facet_index = get_facet_index()
+        if not facet_index.ready:
+            return None
+        ids, truncated = ([], False) if fuzzy else await match_ids(db, query, keywords, facet_index.max_matches)
+        if not ids:
+            ids = [p.product_id for p in products]
+        return facet_index.count(ids, truncated)
+    
     def _parse_search_query(self, message: str) -> Dict[str, Any]:
         """Parse search query to extract parameters"""
         message_lower = message.lower()
-        params = {}
+        params, message = self._parse_attributes(message)
         
-        # Extract keywords (remove common words)
-        stop_words = {"find", "show", "me", "looking", "for", "want", "need", "search", "get", "i", "am", "a", "an", "the", "please", "can", "you", "help"}
-        words = [w for w in message.split() if w.lower() not in stop_words]
+        # Extract keywords (remove common words, and price and gender phrases,
+        # which become filters below)
+        stop_words = {"find", "show", "me", "looking", "for", "want", "need", "search", "get", "i", "am", "a", "an", "the", "please", "can", "you", "help",
+                      "under", "less", "than", "below", "in",
+                      "women", "womens", "women's", "female", "ladies", "men", "mens", "men's", "male", "guys"}
+        words = [w for w in message.split()
+                 if w.lower() not in stop_words and not re.fullmatch(r'\$?\d+(\.\d+)?', w)]
         
         # Filter out category names from keywords if they exist in message to avoid redundancy
         # But for now just better stop words should help.
@@ -126,7 +264,6 @@ class CatalogSearchAgent(BaseAgent):
         # Extract price range
         if "under" in message_lower or "less than" in message_lower:
             # Try to extract number
-            import re
             numbers = re.findall(r'\$?(\d+)', message)
             if numbers:
                 params["price_max"] = float(numbers[0])
@@ -140,12 +277,41 @@ class CatalogSearchAgent(BaseAgent):
         
         return params
     
-    def _format_search_results(self, query: str, results: List[Dict], params: Dict) -> str:
+    def _parse_attributes(self, message: str) -> Tuple[Dict[str, Any], str]:
+        """Color, size, material, pattern and "in stock" filters, and the message without them
+
+        Colors, materials and patterns are the catalog's own values (from
+        the attribute index) named as whole words; sizes need "size M".
+        """
+        params: Dict[str, Any] = {}
+        index = get_attribute_index()
+        for attribute in ("color", "material", "pattern"):
+            # Longest first, so "Polka Dot" wins over a shorter overlapping value
+            for value in sorted(index.vocabulary(attribute), key=len, reverse=True):
+                pattern = re.compile(rf"\b{re.escape(value)}\b", re.IGNORECASE)
+                if pattern.search(message):
+                    params[attribute] = value
+                    message = pattern.sub(" ", message)
+                    break
+        size = re.search(r"\bsize\s+([a-z0-9.]+)\b", message, re.IGNORECASE)
+        if size:
+            params["size"] = size.group(1).upper()
+            message = message[:size.start()] + " " + message[size.end():]
+        stock = re.search(r"\b(?:in stock|available)\b", message, re.IGNORECASE)
+        if stock:
+            params["in_stock"] = True
+            message = message[:stock.start()] + " " + message[stock.end():]
+        return params, message
+    
+    def _format_search_results(self, query: str, results: List[Dict], params: Dict, fuzzy: bool = False) -> str:
         """Format search results as natural language"""
         if not results:
             return f"I couldn't find any products matching '{query}'. Try adjusting your search terms or filters."
         
-        response = f"I found {len(results)} products matching your search:\n\n"
+        if fuzzy:
+            response = f"I couldn't find an exact match, but here are {len(results)} close matches:\n\n"
+        else:
+            response = f"I found {len(results)} products matching your search:\n\n"
         
         for i, product in enumerate(results[:5], 1):  # Show top 5
             price_str = f"from ${product['price_from']:.2f}" if product['price_from'] else "Price varies"
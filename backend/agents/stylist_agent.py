@@ -3,9 +3,10 @@ Stylist Agent - Provides fashion/style recommendations
 """
 
 from typing import Dict, Any, List
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 
+from .attribute_index import apply_attribute_filter
 from .base_agent import BaseAgent
 from models import Product, StyleProfile, Customer, ProductHierarchy
 
@@ -22,16 +23,16 @@ class StylistAgent(BaseAgent):
             and provide specific product recommendations when relevant."""
         )
     
-    async def process(self, message: str, context: Dict[str, Any], db: Session) -> Dict[str, Any]:
+    async def process(self, message: str, context: Dict[str, Any], db: AsyncSession) -> Dict[str, Any]:
         """Process styling request"""
         customer_id = context.get("customer_id")
         style_profile = None
         
         # Get customer style profile if available
         if customer_id:
-            style_profile = db.query(StyleProfile).filter(
+            style_profile = await db.scalar(select(StyleProfile).where(
                 StyleProfile.customer_id == customer_id
-            ).first()
+            ))
         
         # Build context for LLM
         style_context = ""
@@ -46,7 +47,7 @@ Customer Style Profile:
 """
         
         # Get relevant products for context
-        products = self._get_styling_products(db, style_profile)
+        products = await self._get_styling_products(db, style_profile)
         
         prompt = f"""User request: {message}
 
@@ -81,14 +82,22 @@ Available products context: {len(products)} products available in catalog."""
             }
         }
     
-    def _get_styling_products(self, db: Session, style_profile: Any = None) -> List[Dict]:
+    async def _get_styling_products(self, db: AsyncSession, style_profile: Any = None) -> List[Dict]:
         """Get products relevant for styling"""
-        query = db.query(Product).filter(Product.status == "ACTIVE")
+        query = select(Product).where(Product.status == "ACTIVE")
         
         if style_profile and style_profile.brand_preferences:
-            query = query.filter(Product.brand_name.in_(style_profile.brand_preferences))
+            query = query.where(Product.brand_name.in_(style_profile.brand_preferences))
         
-        products = query.limit(50).all()
+        # In-stock products in the customer's colors and sizes, if there are any
+        products = []
+        filters = self._attribute_filters(style_profile)
+        if filters:
+            products = (await db.execute(
+                apply_attribute_filter(query, filters, in_stock=True).limit(50)
+            )).scalars().all()
+        if not products:
+            products = (await db.execute(query.limit(50))).scalars().all()
         
         return [
             {
@@ -101,6 +110,20 @@ Available products context: {len(products)} products available in catalog."""
             for p in products
         ]
     
+    def _attribute_filters(self, style_profile: Any) -> Dict[str, List[str]]:
+        """Color and size filters from a style profile (sizes as {"tops": "M"} or a list)"""
+        if not style_profile:
+            return {}
+        filters = {}
+        if style_profile.favorite_colors:
+            filters["color"] = list(style_profile.favorite_colors)
+        sizes = style_profile.size_preferences
+        sizes = sizes.values() if isinstance(sizes, dict) else sizes or []
+        sizes = [str(size) for size in sizes if isinstance(size, (str, int, float))]
+        if sizes:
+            filters["size"] = sizes
+        return filters
+    
     def _extract_product_recommendations(self, response: str, products: List[Dict]) -> List[Dict]:
         """Extract product recommendations from LLM response"""
         # Simple keyword matching - in production, use more sophisticated extraction
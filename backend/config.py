@@ -3,7 +3,7 @@ Configuration management for the shopping assistant
 """
 
 import os
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 
 
@@ -11,6 +11,7 @@ class LLMProvider(str, Enum):
     """Supported LLM providers"""
     OPENAI = "openai"
     GROQ = "groq"
+    MOCK = "mock"
 
 
 class Config:
@@ -29,6 +30,106 @@ class Config:
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     GROQ_API_KEY: Optional[str] = os.getenv("GROQ_API_KEY")
     
+    # Agent routing: the local intent classifier answers at or above this
+    # confidence; anything lower falls back to the LLM router
+    ROUTING_CONFIDENCE_THRESHOLD: float = float(
+        os.getenv("ROUTING_CONFIDENCE_THRESHOLD", "0.75")
+    )
+    ROUTING_CACHE_SIZE: int = int(os.getenv("ROUTING_CACHE_SIZE", "1024"))
+    ROUTING_CACHE_TTL_SECONDS: float = float(
+        os.getenv("ROUTING_CACHE_TTL_SECONDS", "3600")
+    )
+    
+    # LLM response cache: in-memory LRU backed by a SQLite file (empty path =
+    # memory only); calls at or below the deterministic temperature are cached
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "/tmp/shopping_assistant_llm_cache.db")
+    LLM_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "100000"))
+    LLM_CACHE_DETERMINISTIC_TEMPERATURE: float = float(os.getenv("LLM_CACHE_DETERMINISTIC_TEMPERATURE", "0.3"))
+    
+    # Product list enrichment (price range, rating, stock): per-product TTL
+    # cache shared by all agents; 0 disables caching
+    PRODUCT_ENRICHMENT_CACHE_TTL_SECONDS: float = float(
+        os.getenv("PRODUCT_ENRICHMENT_CACHE_TTL_SECONDS", "30")
+    )
+    PRODUCT_ENRICHMENT_CACHE_SIZE: int = int(os.getenv("PRODUCT_ENRICHMENT_CACHE_SIZE", "10000"))
+    # Read list figures and trending from retail.product_summary (maintained
+    # by Postgres triggers) instead of aggregating the base tables per request
+    PRODUCT_SUMMARY_ENABLED: bool = os.getenv("PRODUCT_SUMMARY_ENABLED", "true").lower() == "true"
+    
+    # Catalog full-text search: 0 ranks every match; a cap ranks only the
+    # newest matches up to it (approximate for broad queries)
+    SEARCH_RANK_CANDIDATES: int = int(os.getenv("SEARCH_RANK_CANDIDATES", "0"))
+    # Trigram fallback when full text finds nothing: minimum word similarity
+    # of the query to a product name or brand (0-1)
+    SEARCH_FUZZY_THRESHOLD: float = float(os.getenv("SEARCH_FUZZY_THRESHOLD", "0.6"))
+    # In-process BM25 index for agent keyword search: "db", "parquet"
+    # (data/products.parquet) or "off"; polled for product changes
+    CATALOG_INDEX_SOURCE: str = os.getenv("CATALOG_INDEX_SOURCE", "db").lower()
+    CATALOG_INDEX_REFRESH_SECONDS: float = float(os.getenv("CATALOG_INDEX_REFRESH_SECONDS", "30"))
+    # Index hits hydrated per agent search when other filters also apply
+    CATALOG_INDEX_CANDIDATES: int = int(os.getenv("CATALOG_INDEX_CANDIDATES", "200"))
+    # Facet counts (brand, gender, price, category, color, size) for search
+    # results, from an in-memory index rebuilt when the catalog changes.
+    # At most FACET_MAX_MATCHES matches are read and counted per search
+    FACET_INDEX_ENABLED: bool = os.getenv("FACET_INDEX_ENABLED", "true").lower() == "true"
+    FACET_INDEX_REFRESH_SECONDS: float = float(os.getenv("FACET_INDEX_REFRESH_SECONDS", "60"))
+    FACET_PRICE_BUCKETS: List[float] = [
+        float(bound) for bound in os.getenv("FACET_PRICE_BUCKETS", "25,50,100,200").split(",") if bound.strip()
+    ]
+    FACET_MAX_MATCHES: int = int(os.getenv("FACET_MAX_MATCHES", "10000"))
+    FACET_MAX_VALUES: int = int(os.getenv("FACET_MAX_VALUES", "20"))
+    # SKU color/size/material/pattern/in-stock bitmaps for attribute filters,
+    # updated from changed SKUs every ATTRIBUTE_INDEX_REFRESH_SECONDS
+    ATTRIBUTE_INDEX_ENABLED: bool = os.getenv("ATTRIBUTE_INDEX_ENABLED", "true").lower() == "true"
+    ATTRIBUTE_INDEX_REFRESH_SECONDS: float = float(os.getenv("ATTRIBUTE_INDEX_REFRESH_SECONDS", "15"))
+    # Category tree for category filters: "db" (retail.product_hierarchy) or
+    # "json" (data/hierarchy.json), reloaded when it changes
+    HIERARCHY_SOURCE: str = os.getenv("HIERARCHY_SOURCE", "db").lower()
+    HIERARCHY_REFRESH_SECONDS: float = float(os.getenv("HIERARCHY_REFRESH_SECONDS", "60"))
+    # Agent search mode when the request context does not pick one:
+    # "keyword", "semantic" (embedding similarity) or "hybrid" (both, fused)
+    CATALOG_SEARCH_MODE: str = os.getenv("CATALOG_SEARCH_MODE", "keyword").lower()
+    # Hybrid mode: candidates taken from each ranking, and the reciprocal
+    # rank fusion constant (higher = flatter weighting of top ranks)
+    CATALOG_HYBRID_CANDIDATES: int = int(os.getenv("CATALOG_HYBRID_CANDIDATES", "50"))
+    CATALOG_HYBRID_RRF_K: int = int(os.getenv("CATALOG_HYBRID_RRF_K", "60"))
+    
+    # Embeddings: "hashing" (local, deterministic) or "openai"; stored and
+    # query embeddings must come from the same one
+    EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "hashing").lower()
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    EMBEDDING_QUERY_CACHE_SIZE: int = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "1024"))
+    # Approximate nearest-neighbour scans: ivfflat lists probed and HNSW
+    # candidate list size per query (higher = better recall, slower)
+    VECTOR_SEARCH_PROBES: int = int(os.getenv("VECTOR_SEARCH_PROBES", "10"))
+    VECTOR_SEARCH_EF_SEARCH: int = int(os.getenv("VECTOR_SEARCH_EF_SEARCH", "40"))
+    # pgvector >= 0.8 keeps scanning the index until enough rows pass the
+    # filters: "relaxed_order", "strict_order" (HNSW only) or "off"
+    VECTOR_SEARCH_ITERATIVE_SCAN: str = os.getenv("VECTOR_SEARCH_ITERATIVE_SCAN", "relaxed_order").lower()
+    # ANN indexes on the embedding columns (vector_index.py): "hnsw" or
+    # "ivfflat"; lists 0 = sized from the row count at build time
+    VECTOR_INDEX_TYPE: str = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+    VECTOR_INDEX_HNSW_M: int = int(os.getenv("VECTOR_INDEX_HNSW_M", "16"))
+    VECTOR_INDEX_HNSW_EF_CONSTRUCTION: int = int(os.getenv("VECTOR_INDEX_HNSW_EF_CONSTRUCTION", "64"))
+    VECTOR_INDEX_IVFFLAT_LISTS: int = int(os.getenv("VECTOR_INDEX_IVFFLAT_LISTS", "0"))
+    VECTOR_INDEX_MAINTENANCE_WORK_MEM: str = os.getenv("VECTOR_INDEX_MAINTENANCE_WORK_MEM", "1GB")
+    
+    # Conversation history: "memory" (per worker) or "sqlite" (shared file)
+    CONVERSATION_STORE: str = os.getenv("CONVERSATION_STORE", "memory").lower()
+    CONVERSATION_MAX_MESSAGES: int = int(os.getenv("CONVERSATION_MAX_MESSAGES", "10"))
+    CONVERSATION_STORE_MAX_BYTES: int = int(
+        os.getenv("CONVERSATION_STORE_MAX_BYTES", str(32 * 1024 * 1024))
+    )
+    CONVERSATION_MAX_SESSION_BYTES: int = int(
+        os.getenv("CONVERSATION_MAX_SESSION_BYTES", str(64 * 1024))
+    )
+    CONVERSATION_SQLITE_PATH: str = os.getenv(
+        "CONVERSATION_SQLITE_PATH", "/tmp/shopping_assistant_conversations.db"
+    )
+    CONVERSATION_TTL_SECONDS: float = float(os.getenv("CONVERSATION_TTL_SECONDS", "86400"))
+    
     # Environment
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     
@@ -0,0 +1,167 @@
+"""
+Text Embeddings
+Embedders for the Vector(1536) columns (OpenAI, or a deterministic local
+hashing embedder that needs no API) and an LRU cache of query embeddings
+"""
+
+import hashlib
+import os
+import re
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from config import Config
+
+# Width of the embedding columns (OpenAI ada-002 / text-embedding-3-small)
+EMBEDDING_DIMENSIONS = 1536
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_hash(feature: str) -> int:
+    """Stable 64-bit hash (the built-in hash() is salted per process)"""
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+
+
+class BaseEmbedder(ABC):
+    """Maps texts to EMBEDDING_DIMENSIONS-wide, unit-length vectors
+
+    Local embedders compute on the CPU with no I/O; they also provide a
+    synchronous embed_batch() and can be run in worker processes.
+    """
+
+    name: str = "base"
+    local: bool = False
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts"""
+        pass
+
+
+class OpenAIEmbedder(BaseEmbedder):
+    """OpenAI embeddings API, over the shared LLM HTTP pool"""
+
+    def __init__(self, model: str = "text-embedding-ada-002", api_key: Optional[str] = None):
+        from openai import AsyncOpenAI
+        from llm_provider import get_http_client
+        self.client = AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL"),
+            http_client=get_http_client(),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2"))
+        )
+        self.model = model
+        self.name = f"openai:{model}"
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        response = await self.client.embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+class HashingEmbedder(BaseEmbedder):
+    """Feature-hashed bag of words and character trigrams
+
+    Deterministic across processes and machines, and free to run, so
+    catalogs can be embedded and searched without an embeddings API. Texts
+    sharing words (or, more weakly, word fragments) end up close.
+    """
+
+    name = "hashing"
+    local = True
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, trigram_weight: float = 0.3):
+        self.dimensions = dimensions
+        self.trigram_weight = trigram_weight
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_batch(texts)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text) for text in texts]
+
+    def embed_one(self, text: str) -> List[float]:
+        slots: List[int] = []
+        weights: List[float] = []
+        for word in _TOKEN_RE.findall((text or "").lower()):
+            self._add(slots, weights, "w:" + word, 1.0)
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                self._add(slots, weights, "t:" + padded[i:i + 3], self.trigram_weight)
+        vector = np.bincount(slots, weights=weights, minlength=self.dimensions) if slots \
+            else np.zeros(self.dimensions)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def _add(self, slots: List[int], weights: List[float], feature: str, weight: float) -> None:
+        digest = _feature_hash(feature)
+        slots.append(digest % self.dimensions)
+        weights.append(weight if digest >> 63 else -weight)
+
+
+def create_embedder(provider: Optional[str] = None) -> BaseEmbedder:
+    """Embedder for EMBEDDING_PROVIDER ("openai" or "hashing")"""
+    provider = (provider or Config.EMBEDDING_PROVIDER).lower()
+    if provider == "openai":
+        return OpenAIEmbedder(model=Config.EMBEDDING_MODEL)
+    if provider == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Invalid EMBEDDING_PROVIDER: {provider}. Must be one of: ['openai', 'hashing']")
+
+
+class QueryEmbeddingCache:
+    """LRU of query text -> embedding, so repeated searches skip the embedder"""
+
+    def __init__(self, embedder: BaseEmbedder, max_entries: int = 1024):
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, text: str) -> List[float]:
+        key = " ".join(text.lower().split())
+        embedding = self._entries.get(key)
+        if embedding is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+        self.misses += 1
+        embedding = (await self.embedder.embed([key]))[0]
+        if self.max_entries > 0:
+            self._entries[key] = embedding
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "embedder": self.embedder.name,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Global cache instance (lazy initialization)
+_query_cache_instance: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Get or create the query embedding cache shared by the API and agents"""
+    global _query_cache_instance
+    if _query_cache_instance is None:
+        _query_cache_instance = QueryEmbeddingCache(
+            create_embedder(), max_entries=Config.EMBEDDING_QUERY_CACHE_SIZE
+        )
+    return _query_cache_instance
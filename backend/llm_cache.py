@@ -0,0 +1,233 @@
+"""
+LLM Response Cache
+Two-tier (in-memory LRU + SQLite file) cache for chat completions with
+per-agent opt-in, TTLs, size limits and collapsing of concurrent identical calls
+
+SQLite runs on one worker thread, off the event loop: memory misses await
+the disk read there, and disk writes are queued behind it (write-behind).
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+
+
+class LLMResponseCache:
+    """Cache of completion text keyed by a hash of model, messages, temperature and tools"""
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        disk_path: Optional[str] = None,
+        disk_max_entries: int = 100_000,
+        deterministic_temperature: float = 0.3
+    ):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.deterministic_temperature = deterministic_temperature
+        # key -> (text, expires_at, latency_seconds)
+        self._memory: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "coalesced": 0, "saved_seconds": 0.0}
+        )
+        self._disk: Optional[sqlite3.Connection] = None
+        # The only thread that touches the connection, so no lock is needed
+        self._disk_executor: Optional[ThreadPoolExecutor] = None
+        self._disk_writes = 0
+        if disk_path:
+            self._disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache-disk")
+            self._disk = sqlite3.connect(disk_path, timeout=5.0, check_same_thread=False,
+                                         isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("PRAGMA synchronous=NORMAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " cache_key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " latency REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._disk.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)"
+            )
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        tools: Optional[List] = None
+    ) -> str:
+        """Stable hash of everything that determines a completion"""
+        payload = json.dumps(
+            {"model": model, "messages": messages, "temperature": round(temperature, 3),
+             "tools": tools},
+            sort_keys=True, separators=(",", ":"), default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def is_deterministic(self, temperature: float, tools: Optional[List] = None) -> bool:
+        """Whether a call is close enough to deterministic to cache safely"""
+        return temperature <= self.deterministic_temperature and not tools
+
+    async def lookup(self, key: str, agent: str) -> Optional[str]:
+        """Cached text for key, recording a hit or miss for the agent"""
+        entry = await self._get_entry(key)
+        stats = self._stats[agent]
+        if entry is None:
+            stats["misses"] += 1
+            return None
+        stats["hits"] += 1
+        stats["saved_seconds"] += entry[2]
+        return entry[0]
+
+    def store(self, key: str, text: str, ttl: float, latency: float) -> None:
+        """Store a completion in memory now and on disk in the background"""
+        expires_at = time.time() + ttl
+        self._put_memory(key, (text, expires_at, latency))
+        if self._disk_executor is not None:
+            self._disk_executor.submit(self._write_disk, key, text, latency, expires_at)
+
+    async def get_or_call(
+        self,
+        key: str,
+        agent: str,
+        ttl: float,
+        call: Callable[[], Awaitable[str]],
+        cacheable: Optional[Callable[[str], bool]] = None
+    ) -> str:
+        """Return the cached completion or make the call, collapsing concurrent misses
+
+        `cacheable` can refuse to store a reply (e.g. one the caller cannot use).
+        """
+        cached = await self.lookup(key, agent)
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            # Reclassify the miss: this call shares an in-flight request
+            self._stats[agent]["misses"] -= 1
+            self._stats[agent]["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            start = time.perf_counter()
+            text = await call()
+            if text and (cacheable is None or cacheable(text)):
+                self.store(key, text, ttl, time.perf_counter() - start)
+            future.set_result(text)
+            return text
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rates and saved latency per agent"""
+        agents = {}
+        for agent, stats in self._stats.items():
+            served = stats["hits"] + stats["coalesced"]
+            lookups = served + stats["misses"]
+            agents[agent] = {
+                "hits": int(stats["hits"]),
+                "misses": int(stats["misses"]),
+                "coalesced": int(stats["coalesced"]),
+                "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+                "saved_seconds": round(stats["saved_seconds"], 3)
+            }
+        return {
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "disk": self._disk is not None,
+            "agents": agents
+        }
+
+    async def _get_entry(self, key: str) -> Optional[Tuple[str, float, float]]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._memory.move_to_end(key)
+                return entry
+            del self._memory[key]
+
+        if self._disk_executor is None:
+            return None
+        row = await asyncio.get_running_loop().run_in_executor(self._disk_executor, self._read_disk, key, now)
+        if row is None:
+            return None
+        entry = (row[0], row[1], row[2])
+        self._put_memory(key, entry)
+        return entry
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[str, float, float]]:
+        return self._disk.execute(
+            "SELECT response, expires_at, latency FROM llm_cache "
+            "WHERE cache_key = ? AND expires_at > ?",
+            (key, now)
+        ).fetchone()
+
+    def _write_disk(self, key: str, text: str, latency: float, expires_at: float) -> None:
+        try:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(cache_key, response, latency, expires_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, text, latency, expires_at, time.time())
+            )
+            self._disk_writes += 1
+            if self._disk_writes % 500 == 0:
+                self._prune_disk()
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache disk write failed: {e}")
+
+    def _put_memory(self, key: str, entry: Tuple[str, float, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune_disk(self) -> None:
+        """Drop expired rows and the oldest rows beyond disk_max_entries"""
+        self._disk.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        self._disk.execute(
+            "DELETE FROM llm_cache WHERE cache_key IN ("
+            " SELECT cache_key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,)
+        )
+
+
+# Global cache instance (lazy initialization)
+_cache_instance: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Get or create the global LLM response cache (None when LLM_CACHE_ENABLED=false)"""
+    global _cache_instance
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+    if _cache_instance is None:
+        _cache_instance = LLMResponseCache(
+            max_entries=Config.LLM_CACHE_MAX_ENTRIES,
+            disk_path=Config.LLM_CACHE_PATH or None,
+            disk_max_entries=Config.LLM_CACHE_DISK_MAX_ENTRIES,
+            deterministic_temperature=Config.LLM_CACHE_DETERMINISTIC_TEMPERATURE
+        )
+    return _cache_instance
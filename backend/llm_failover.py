@@ -0,0 +1,362 @@
+"""
+LLM Failover
+Composite provider that chains several providers behind per-provider circuit
+breakers and can hedge slow calls by firing the next provider after a
+p95-derived delay
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from llm_provider import BaseLLMProvider
+from llm_scheduler import LLMScheduler, estimate_tokens
+
+
+class LLMUnavailableError(Exception):
+    """Raised when every provider in the chain is failing or has an open circuit"""
+    pass
+
+
+class CircuitBreaker:
+    """Error-rate and latency driven circuit breaker
+
+    Closed: calls flow; the last `window` outcomes are tracked, and a call
+    slower than `slow_call_seconds` counts as a failure. Once at least
+    `min_calls` outcomes are recorded and the failure rate reaches
+    `error_rate`, the breaker opens for `open_seconds`, then lets one probe
+    through (half-open) which closes or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        window: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30.0
+    ):
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._outcomes: deque = deque(maxlen=window)
+        self._latencies: deque = deque(maxlen=200)
+        self.failures = 0
+        self.successes = 0
+        self.trips = 0
+
+    def is_available(self) -> bool:
+        """Whether allow_request() would let a call through, without claiming the probe"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.open_seconds
+        return not self._probe_in_flight
+
+    def allow_request(self) -> bool:
+        """Let a call through; in half-open state this claims the single probe"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release_probe(self) -> None:
+        """Give back a claimed probe that ended without an outcome (cancelled or unused)"""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record_success(self, latency: float) -> None:
+        self.successes += 1
+        self._latencies.append(latency)
+        slow = latency >= self.slow_call_seconds
+        if self.state == self.HALF_OPEN:
+            if slow:
+                self._trip()
+            else:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            return
+        self._record(not slow)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self._trip()
+            return
+        self._record(False)
+
+    def p95_latency(self) -> Optional[float]:
+        """95th percentile of recent successful call latencies"""
+        if len(self._latencies) < 5:
+            return None
+        return float(np.percentile(np.array(self._latencies), 95))
+
+    def _record(self, ok: bool) -> None:
+        self._outcomes.append(ok)
+        if len(self._outcomes) >= self.min_calls:
+            failure_rate = self._outcomes.count(False) / len(self._outcomes)
+            if failure_rate >= self.error_rate:
+                self._trip()
+
+    def _trip(self) -> None:
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self._outcomes.clear()
+        self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        p95 = self.p95_latency()
+        return {
+            "state": self.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "trips": self.trips,
+            "p95_latency_ms": round(p95 * 1000.0, 1) if p95 is not None else None
+        }
+
+
+class FailoverLLMProvider(BaseLLMProvider):
+    """Primary/secondary provider chain with circuit breaking and optional hedging
+
+    When the chain sits behind an LLMScheduler, `scheduler` is set to it so a
+    hedge, which is an extra upstream call, is charged to the same rate
+    budgets; a hedge the budgets cannot cover right away is skipped.
+    """
+
+    def __init__(
+        self,
+        providers: List[Tuple[str, BaseLLMProvider]],
+        hedge: bool = False,
+        hedge_min_delay: float = 0.2,
+        hedge_max_delay: float = 5.0,
+        breaker_factory=CircuitBreaker
+    ):
+        self.providers = providers
+        self.breakers = {name: breaker_factory() for name, _ in providers}
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.scheduler: Optional[LLMScheduler] = None
+        self.hedges_fired = 0
+        self.hedges_skipped = 0
+        self.hedges_won = 0
+        self.failovers = 0
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        tools: Optional[List] = None
+    ) -> str:
+        """Try providers in order, skipping open circuits; hedge when enabled"""
+        candidates = self._available()
+        if self.hedge and len(candidates) > 1:
+            return await self._hedged(candidates, messages, model, temperature, tools)
+
+        last_error: Optional[Exception] = None
+        for position, (index, name, provider) in enumerate(candidates):
+            if position > 0:
+                self.failovers += 1
+            try:
+                return await self._call(index, name, provider, messages, model, temperature, tools)
+            except Exception as e:
+                last_error = e
+        raise LLMUnavailableError(f"All LLM providers failed: {last_error}")
+
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        tools: Optional[List] = None
+    ) -> AsyncIterator[str]:
+        """Fail over until a provider produces its first chunk, then stay on it"""
+        last_error: Optional[Exception] = None
+        for position, (index, name, provider) in enumerate(self._available()):
+            if position > 0:
+                self.failovers += 1
+            breaker = self.breakers[name]
+            if not breaker.allow_request():
+                continue  # another request took the half-open probe meanwhile
+            probe = breaker.state == breaker.HALF_OPEN
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in provider.chat_completion_stream(
+                    messages=messages,
+                    model=self._model_for(index, model),
+                    temperature=temperature,
+                    tools=tools
+                ):
+                    if not started:
+                        # Time to first token drives the breaker for streams
+                        breaker.record_success(time.monotonic() - start)
+                        started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started:
+                    raise
+                breaker.record_failure()
+                last_error = e
+            finally:
+                if probe and not started:
+                    # Cancelled, closed or empty before any outcome was recorded
+                    breaker.release_probe()
+        raise LLMUnavailableError(f"All LLM providers failed: {last_error}")
+
+    def get_failover_stats(self) -> Dict[str, Any]:
+        return {
+            "chain": [name for name, _ in self.providers],
+            "hedging": self.hedge,
+            "hedges_fired": self.hedges_fired,
+            "hedges_skipped": self.hedges_skipped,
+            "hedges_won": self.hedges_won,
+            "failovers": self.failovers,
+            "breakers": {name: breaker.get_stats() for name, breaker in self.breakers.items()}
+        }
+
+    def _available(self) -> List[Tuple[int, str, BaseLLMProvider]]:
+        """Providers whose breaker would let a call through
+
+        Only checks; a half-open probe is claimed when the call is
+        dispatched, so providers never reached keep theirs free.
+        """
+        candidates = [(index, name, provider)
+                      for index, (name, provider) in enumerate(self.providers)
+                      if self.breakers[name].is_available()]
+        if not candidates:
+            raise LLMUnavailableError("All LLM provider circuits are open")
+        return candidates
+
+    def _model_for(self, index: int, model: Optional[str]) -> Optional[str]:
+        # Agents pass the primary provider's model name; the others use their own default
+        return model if index == 0 else None
+
+    async def _call(
+        self,
+        index: int,
+        name: str,
+        provider: BaseLLMProvider,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        temperature: float,
+        tools: Optional[List]
+    ) -> str:
+        breaker = self.breakers[name]
+        if not breaker.allow_request():
+            raise LLMUnavailableError(f"{name} circuit is open")
+        probe = breaker.state == breaker.HALF_OPEN
+        start = time.monotonic()
+        try:
+            response = await provider.chat_completion(
+                messages=messages,
+                model=self._model_for(index, model),
+                temperature=temperature,
+                tools=tools
+            )
+        except asyncio.CancelledError:
+            # A losing hedge: no outcome, but the probe must not stay claimed
+            if probe:
+                breaker.release_probe()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success(time.monotonic() - start)
+        return response
+
+    def _hedge_delay(self, name: str) -> float:
+        p95 = self.breakers[name].p95_latency()
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, p95))
+
+    async def _hedged(
+        self,
+        candidates: List[Tuple[int, str, BaseLLMProvider]],
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        temperature: float,
+        tools: Optional[List]
+    ) -> str:
+        """Start the primary; after its p95 delay (or on failure) start the next"""
+        pending: Dict[asyncio.Task, str] = {}
+        remaining = list(candidates)
+        last_error: Optional[Exception] = None
+        hedging = True
+
+        def launch(admitted: bool = False) -> None:
+            index, name, provider = remaining.pop(0)
+            task = asyncio.create_task(
+                self._call(index, name, provider, messages, model, temperature, tools)
+            )
+            if admitted:
+                # Done callbacks also run for a hedge cancelled before it started
+                start = time.monotonic()
+                task.add_done_callback(lambda _: self.scheduler.release(time.monotonic() - start))
+            pending[task] = name
+
+        launch()
+        primary = candidates[0][1]
+        try:
+            while pending:
+                timeout = self._hedge_delay(primary) if remaining and hedging else None
+                done, _ = await asyncio.wait(
+                    pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Primary is slower than its p95: fire a hedge request if
+                    # the scheduler admits it without queueing
+                    admitted = self.scheduler is not None
+                    if admitted and not self.scheduler.try_acquire(estimate_tokens(messages)):
+                        self.hedges_skipped += 1
+                        hedging = False
+                        continue
+                    self.hedges_fired += 1
+                    launch(admitted)
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        if name != primary:
+                            self.hedges_won += 1
+                        return task.result()
+                    last_error = task.exception()
+                if not pending and remaining:
+                    self.failovers += 1
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise LLMUnavailableError(f"All LLM providers failed: {last_error}")
+
+
+def breaker_from_env() -> CircuitBreaker:
+    """Circuit breaker configured from LLM_BREAKER_* environment variables"""
+    return CircuitBreaker(
+        error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+        slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "10")),
+        window=int(os.getenv("LLM_BREAKER_WINDOW", "20")),
+        min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "5")),
+        open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+    )
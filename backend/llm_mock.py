@@ -0,0 +1,202 @@
+"""
+Mock LLM Provider
+Offline provider for load testing: canned/templated responses per agent,
+configurable latency distribution, token streaming rate and error/timeout
+injection. Select it with LLM_PROVIDER=mock; no API key or network is used.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from llm_provider import BaseLLMProvider, current_agent
+
+
+class MockLLMError(Exception):
+    """Injected provider failure"""
+    pass
+
+
+# Templates may use {message} (last user message, truncated) and {agent}.
+# Unless a "router" template is supplied, routing prompts are answered by the
+# local intent classifier so traffic still fans out across agents.
+DEFAULT_RESPONSES: Dict[str, str] = {
+    "stylist": (
+        "For \"{message}\", I'd pair a tailored navy blazer with slim chinos and white "
+        "leather sneakers. Keep accessories minimal and add a neutral knit for cooler evenings."
+    ),
+    "lookbook": (
+        "This lookbook layers relaxed neutrals with one statement piece per outfit, moving "
+        "from a casual daytime look to a polished evening ensemble."
+    ),
+    "checkout": (
+        "You can complete checkout from your cart. Standard shipping takes 3-5 business days "
+        "and we accept all major cards."
+    ),
+    "returns": (
+        "Items can be returned within 30 days of delivery in their original condition. "
+        "Refunds are issued to the original payment method within 5-7 business days."
+    ),
+    "default": "Here is a helpful answer about \"{message}\"."
+}
+
+_TOKEN_PATTERN = re.compile(r"\S+\s*")
+_ROUTED_MESSAGE = re.compile(r'User message: "(.*)"', re.DOTALL)
+
+
+class MockLLMProvider(BaseLLMProvider):
+    """Deterministic stand-in for a remote LLM
+
+    Latency is the time to first token, drawn from `latency_distribution`
+    ("fixed", "uniform", "normal", "lognormal" or "exponential") around
+    `latency_median` seconds with spread `latency_sigma`. The rest of the
+    response is emitted at `tokens_per_second`. All randomness comes from one
+    generator seeded with `seed`, so a run with the same call order replays
+    the same latencies and failures.
+    """
+
+    def __init__(
+        self,
+        latency_distribution: str = "lognormal",
+        latency_median: float = 0.3,
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 50.0,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 60.0,
+        responses: Optional[Dict[str, str]] = None,
+        seed: int = 42
+    ):
+        self.latency_distribution = latency_distribution
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.responses = dict(DEFAULT_RESPONSES, **(responses or {}))
+        self.default_model = "mock-model"
+        self._rng = random.Random(seed)
+        self._classifier = None
+        self.calls = 0
+        self.injected_errors = 0
+        self.injected_timeouts = 0
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        tools: Optional[List] = None
+    ) -> str:
+        """Sleep for the sampled latency plus generation time, then answer"""
+        text = self._respond(messages)
+        await self._first_token()
+        await asyncio.sleep(len(_TOKEN_PATTERN.findall(text)) * self._token_interval())
+        return text
+
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        tools: Optional[List] = None
+    ) -> AsyncIterator[str]:
+        """Yield the response token by token at tokens_per_second"""
+        text = self._respond(messages)
+        await self._first_token()
+        interval = self._token_interval()
+        for index, token in enumerate(_TOKEN_PATTERN.findall(text)):
+            if index and interval:
+                await asyncio.sleep(interval)
+            yield token
+
+    def get_mock_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "injected_errors": self.injected_errors,
+            "injected_timeouts": self.injected_timeouts
+        }
+
+    def sample_latency(self) -> float:
+        """Draw one time-to-first-token value in seconds"""
+        median, sigma = self.latency_median, self.latency_sigma
+        distribution = self.latency_distribution
+        if distribution == "fixed":
+            value = median
+        elif distribution == "uniform":
+            value = self._rng.uniform(median * (1 - sigma), median * (1 + sigma))
+        elif distribution == "normal":
+            value = self._rng.gauss(median, median * sigma)
+        elif distribution == "lognormal":
+            value = self._rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        elif distribution == "exponential":
+            value = self._rng.expovariate(math.log(2) / median) if median > 0 else 0.0
+        else:
+            raise ValueError(f"Unknown mock latency distribution: {distribution}")
+        return max(0.0, value)
+
+    async def _first_token(self) -> None:
+        """Wait out the sampled latency, or fail the call if one is injected"""
+        self.calls += 1
+        latency = self.sample_latency()
+        roll = self._rng.random()
+        if roll < self.timeout_rate:
+            self.injected_timeouts += 1
+            await asyncio.sleep(self.timeout_seconds)
+            raise TimeoutError(f"Mock LLM request timed out after {self.timeout_seconds}s")
+        if roll < self.timeout_rate + self.error_rate:
+            self.injected_errors += 1
+            raise MockLLMError("Injected mock LLM failure")
+        await asyncio.sleep(latency)
+
+    def _token_interval(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _respond(self, messages: List[Dict[str, str]]) -> str:
+        agent = current_agent.get() or "default"
+        message = next((m.get("content") or "" for m in reversed(messages)
+                        if m.get("role") == "user"), "")
+
+        if agent == "router" and "router" not in self.responses:
+            match = _ROUTED_MESSAGE.search(message)
+            return self._route(match.group(1) if match else message)
+
+        template = self.responses.get(agent, self.responses["default"])
+        return template.format(message=message[:80], agent=agent)
+
+    def _route(self, message: str) -> str:
+        if self._classifier is None:
+            from agents.intent_classifier import IntentClassifier
+            self._classifier = IntentClassifier()
+        agent, _ = self._classifier.classify(message)
+        return agent
+
+
+def create_mock_provider_from_env() -> MockLLMProvider:
+    """Build the mock provider from LLM_MOCK_* environment variables
+
+    LLM_MOCK_RESPONSES_PATH may point to a JSON object mapping agent names
+    (and optionally "router" and "default") to response templates.
+    """
+    responses = None
+    responses_path = os.getenv("LLM_MOCK_RESPONSES_PATH")
+    if responses_path:
+        with open(responses_path) as f:
+            responses = json.load(f)
+    return MockLLMProvider(
+        latency_distribution=os.getenv("LLM_MOCK_LATENCY_DISTRIBUTION", "lognormal").lower(),
+        latency_median=float(os.getenv("LLM_MOCK_LATENCY_MEDIAN_MS", "300")) / 1000.0,
+        latency_sigma=float(os.getenv("LLM_MOCK_LATENCY_SIGMA", "0.5")),
+        tokens_per_second=float(os.getenv("LLM_MOCK_TOKENS_PER_SECOND", "50")),
+        error_rate=float(os.getenv("LLM_MOCK_ERROR_RATE", "0")),
+        timeout_rate=float(os.getenv("LLM_MOCK_TIMEOUT_RATE", "0")),
+        timeout_seconds=float(os.getenv("LLM_MOCK_TIMEOUT_SECONDS",
+                                        os.getenv("LLM_REQUEST_TIMEOUT", "60"))),
+        responses=responses,
+        seed=int(os.getenv("LLM_MOCK_SEED", "42"))
+    )
@@ -1,11 +1,15 @@
 """
 Configurable LLM Provider System
-Supports OpenAI and Groq (Llama3) with easy switching via environment variables
+Supports OpenAI and Groq (Llama3) with easy switching via environment variables,
+plus an offline mock provider for load testing
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Any
+from contextvars import ContextVar
+from typing import List, Dict, Optional, Any, AsyncIterator
 import os
+
+import httpx
 from enum import Enum
 
 
@@ -13,6 +17,12 @@ class LLMProvider(str, Enum):
     """Supported LLM providers"""
     OPENAI = "openai"
     GROQ = "groq"
+    MOCK = "mock"
+
+
+# Name of the agent (or "router") making the current LLM call; used by the
+# provider layer for priority and per-agent accounting
+current_agent: ContextVar[Optional[str]] = ContextVar("current_agent", default=None)
 
 
 class BaseLLMProvider(ABC):
@@ -29,15 +39,74 @@ class BaseLLMProvider(ABC):
     ) -> str:
         """Generate chat completion"""
         pass
+    
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        tools: Optional[List] = None
+    ) -> AsyncIterator[str]:
+        """Generate chat completion as an async iterator of text chunks
+        
+        Providers without native streaming yield the whole completion at once.
+        """
+        yield await self.chat_completion(
+            messages=messages,
+            model=model,
+            temperature=temperature,
+            tools=tools
+        )
+
+
+# Shared HTTP connection pool for all provider clients (lazy initialization)
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the pooled keep-alive HTTP client used by LLM providers
+    
+    Pool size and timeouts are tunable through LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE, LLM_HTTP_KEEPALIVE_EXPIRY, LLM_CONNECT_TIMEOUT and
+    LLM_REQUEST_TIMEOUT.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+                keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30"))
+            ),
+            timeout=httpx.Timeout(
+                float(os.getenv("LLM_REQUEST_TIMEOUT", "60")),
+                connect=float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+            )
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared HTTP client (call on application shutdown)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
 
 class OpenAIProvider(BaseLLMProvider):
     """OpenAI GPT provider"""
     
-    def __init__(self, api_key: Optional[str] = None):
-        from openai import OpenAI
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=base_url or os.getenv("OPENAI_BASE_URL"),
+            http_client=get_http_client(),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2"))
+        )
         self.default_model = "gpt-4o-mini"
+        self.request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
     
     async def chat_completion(
         self,
@@ -47,16 +116,36 @@ class OpenAIProvider(BaseLLMProvider):
         tools: Optional[List] = None
     ) -> str:
         """Generate chat completion using OpenAI"""
-        # OpenAI client is synchronous, run in executor to avoid blocking
-        import asyncio
-        response = await asyncio.to_thread(
-            self.client.chat.completions.create,
+        kwargs = {"tools": tools} if tools else {}
+        response = await self.client.chat.completions.create(
             model=model or self.default_model,
             messages=messages,
-            tools=tools,
-            temperature=temperature
+            temperature=temperature,
+            timeout=self.request_timeout,
+            **kwargs
         )
         return response.choices[0].message.content or ""
+    
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        tools: Optional[List] = None
+    ) -> AsyncIterator[str]:
+        """Stream chat completion tokens from OpenAI"""
+        kwargs = {"tools": tools} if tools else {}
+        stream = await self.client.chat.completions.create(
+            model=model or self.default_model,
+            messages=messages,
+            temperature=temperature,
+            timeout=self.request_timeout,
+            stream=True,
+            **kwargs
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 
 class GroqProvider(BaseLLMProvider):
@@ -64,10 +153,15 @@ class GroqProvider(BaseLLMProvider):
     
     def __init__(self, api_key: Optional[str] = None):
         try:
-            from groq import Groq
-            self.client = Groq(api_key=api_key or os.getenv("GROQ_API_KEY"))
+            from groq import AsyncGroq
+            self.client = AsyncGroq(
+                api_key=api_key or os.getenv("GROQ_API_KEY"),
+                http_client=get_http_client(),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "2"))
+            )
             # Allow override; default to a currently supported Groq model
             self.default_model = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+            self.request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
         except ImportError:
             raise ImportError(
                 "Groq package not installed. Install it with: pip install groq"
@@ -82,15 +176,32 @@ class GroqProvider(BaseLLMProvider):
     ) -> str:
         """Generate chat completion using Groq"""
         # Groq doesn't support tools parameter, so we ignore it
-        # Groq client is synchronous, run in executor to avoid blocking
-        import asyncio
-        response = await asyncio.to_thread(
-            self.client.chat.completions.create,
+        response = await self.client.chat.completions.create(
             model=model or self.default_model,
             messages=messages,
-            temperature=temperature
+            temperature=temperature,
+            timeout=self.request_timeout
         )
         return response.choices[0].message.content or ""
+    
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        tools: Optional[List] = None
+    ) -> AsyncIterator[str]:
+        """Stream chat completion tokens from Groq"""
+        stream = await self.client.chat.completions.create(
+            model=model or self.default_model,
+            messages=messages,
+            temperature=temperature,
+            timeout=self.request_timeout,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 
 class LLMProviderFactory:
@@ -102,15 +213,40 @@ class LLMProviderFactory:
         Create LLM provider based on configuration
         
         Args:
-            provider_name: Provider name from env var LLM_PROVIDER (openai/groq)
+            provider_name: Provider name from env var LLM_PROVIDER (openai/groq/mock)
                           Defaults to 'groq' if not set
+        
+        When LLM_FALLBACK_PROVIDERS lists further providers (e.g. "openai"), the
+        result is a FailoverLLMProvider chaining them behind circuit breakers.
         """
         provider_name = provider_name or os.getenv("LLM_PROVIDER", "groq").lower()
+        fallbacks = [name.strip().lower()
+                     for name in os.getenv("LLM_FALLBACK_PROVIDERS", "").split(",")
+                     if name.strip() and name.strip().lower() != provider_name]
         
+        if fallbacks:
+            from llm_failover import FailoverLLMProvider, breaker_from_env
+            chain = [(name, LLMProviderFactory.create_single_provider(name))
+                     for name in [provider_name] + fallbacks]
+            return FailoverLLMProvider(
+                chain,
+                hedge=os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true",
+                hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.2")),
+                hedge_max_delay=float(os.getenv("LLM_HEDGE_MAX_DELAY", "5")),
+                breaker_factory=breaker_from_env
+            )
+        return LLMProviderFactory.create_single_provider(provider_name)
+    
+    @staticmethod
+    def create_single_provider(provider_name: str) -> BaseLLMProvider:
+        """Create one concrete provider by name"""
         if provider_name == LLMProvider.GROQ:
             return GroqProvider()
         elif provider_name == LLMProvider.OPENAI:
             return OpenAIProvider()
+        elif provider_name == LLMProvider.MOCK:
+            from llm_mock import create_mock_provider_from_env
+            return create_mock_provider_from_env()
         else:
             raise ValueError(
                 f"Unknown LLM provider: {provider_name}. "
@@ -126,24 +262,45 @@ class LLMProviderFactory:
             return os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
         elif provider_name == LLMProvider.OPENAI:
             return "gpt-4o-mini"
+        elif provider_name == LLMProvider.MOCK:
+            return "mock-model"
         else:
             return os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")  # Default fallback (Groq)
 
 
 # Global provider instance (lazy initialization)
 _provider_instance: Optional[BaseLLMProvider] = None
+_scheduler_instance = None
 
 
 def get_llm_provider() -> BaseLLMProvider:
-    """Get or create the global LLM provider instance"""
-    global _provider_instance
+    """Get or create the global LLM provider instance
+    
+    Unless LLM_SCHEDULER_ENABLED=false, the provider is wrapped in the
+    admission-control scheduler (see llm_scheduler.py).
+    """
+    global _provider_instance, _scheduler_instance
     if _provider_instance is None:
-        _provider_instance = LLMProviderFactory.create_provider()
+        provider = LLMProviderFactory.create_provider()
+        if os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true":
+            from llm_scheduler import ScheduledLLMProvider, create_scheduler_from_env
+            _scheduler_instance = create_scheduler_from_env()
+            from llm_failover import FailoverLLMProvider
+            if isinstance(provider, FailoverLLMProvider):
+                # Hedges are extra upstream calls: admit them through the same budgets
+                provider.scheduler = _scheduler_instance
+            provider = ScheduledLLMProvider(provider, _scheduler_instance)
+        _provider_instance = provider
     return _provider_instance
 
 
+def get_llm_scheduler():
+    """Get the admission-control scheduler, if one is active"""
+    return _scheduler_instance
+
+
 def reset_provider():
     """Reset the global provider instance (useful for testing or config changes)"""
-    global _provider_instance
+    global _provider_instance, _scheduler_instance
     _provider_instance = None
-
+    _scheduler_instance = None
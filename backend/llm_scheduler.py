@@ -0,0 +1,328 @@
+"""
+LLM Admission Control
+Token-bucket rate limiting, a max in-flight cap and priority queueing in front
+of the LLM provider, so traffic spikes queue briefly or are rejected with a
+Retry-After instead of tripping the upstream rate limits for every chat
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from llm_provider import BaseLLMProvider, current_agent
+
+
+class LLMOverloadedError(Exception):
+    """Raised when an LLM call cannot be admitted before its deadline"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"LLM capacity exceeded ({reason}); retry in {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket; a non-positive rate means unlimited"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+def estimate_tokens(messages: List[Dict[str, str]], completion_tokens: int = 256) -> int:
+    """Rough prompt + completion token count (about four characters per token)"""
+    prompt_chars = sum(len(m.get("content") or "") for m in messages)
+    return prompt_chars // 4 + completion_tokens
+
+
+def parse_priority_classes(spec: str) -> Dict[str, int]:
+    """Parse "checkout:0,returns:0,stylist:2" into a name -> priority map"""
+    classes = {}
+    for item in spec.split(","):
+        if ":" in item:
+            name, priority = item.split(":", 1)
+            classes[name.strip()] = int(priority)
+    return classes
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "future", "enqueued_at")
+
+    def __init__(self, priority: int, tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Priority admission queue gated by rate budgets and a concurrency cap
+
+    Lower priority numbers are admitted first. A request is rejected up front
+    when the queue is full or its estimated wait exceeds its deadline, and
+    while waiting once the deadline passes.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 20.0,
+        tokens_per_minute: float = 0.0,
+        max_in_flight: int = 32,
+        max_queue: int = 256,
+        queue_timeout: float = 10.0,
+        priority_classes: Optional[Dict[str, int]] = None,
+        default_priority: int = 1
+    ):
+        self.request_bucket = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60.0, max(1.0, tokens_per_minute))
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.priority_classes = priority_classes or {}
+        self.default_priority = default_priority
+
+        self.in_flight = 0
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        # Exponential moving average of call duration, used to estimate waits;
+        # seeded with the first observed call
+        self._service_time = 1.0
+        self._service_observed = False
+
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "deadline": 0}
+        self._waits: deque = deque(maxlen=1000)
+
+    def priority_for(self, agent: Optional[str]) -> int:
+        return self.priority_classes.get(agent or "", self.default_priority)
+
+    @asynccontextmanager
+    async def slot(self, priority: int, tokens: int) -> AsyncIterator[None]:
+        """Hold an admission slot for the duration of one LLM call"""
+        await self.acquire(priority, tokens)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    async def acquire(self, priority: int, tokens: int, timeout: Optional[float] = None) -> None:
+        """Wait for admission or raise LLMOverloadedError"""
+        timeout = self.queue_timeout if timeout is None else timeout
+
+        if not self._queue and self._admission_wait(tokens) == 0:
+            self._admit(tokens, 0.0)
+            return
+
+        if self._queued_count() >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise LLMOverloadedError("queue_full", self._estimate_wait(priority, tokens))
+
+        estimated = self._estimate_wait(priority, tokens)
+        if estimated > timeout:
+            self.rejected["deadline"] += 1
+            raise LLMOverloadedError("deadline", estimated)
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(priority, tokens, future)
+        heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.rejected["deadline"] += 1
+            raise LLMOverloadedError("deadline", self._estimate_wait(priority, tokens))
+        except asyncio.CancelledError:
+            # Admitted just as the caller went away: give the slot back
+            if future.done() and not future.cancelled():
+                self.release(0.0)
+            raise
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Admit right away or not at all; pair a True result with release()
+
+        For optional extra calls (hedges) that should neither queue nor
+        overtake requests already waiting.
+        """
+        if self._queued_count() or self._admission_wait(tokens) > 0:
+            return False
+        self._admit(tokens, 0.0)
+        return True
+
+    def release(self, duration: float) -> None:
+        """Return a slot and admit whoever is next"""
+        self.in_flight -= 1
+        if duration > 0:
+            if self._service_observed:
+                self._service_time = 0.9 * self._service_time + 0.1 * duration
+            else:
+                self._service_time = duration
+                self._service_observed = True
+        self._dispatch()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, wait times and rejection counters"""
+        by_priority: Dict[int, int] = {}
+        for priority, _, waiter in self._queue:
+            if not waiter.future.done():
+                by_priority[priority] = by_priority.get(priority, 0) + 1
+        waits = sorted(self._waits)
+
+        def pct(q: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000.0, 2)
+
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": sum(by_priority.values()),
+            "queue_depth_by_priority": by_priority,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_ms": {"p50": pct(0.50), "p99": pct(0.99), "max": pct(1.0)},
+            "avg_call_seconds": round(self._service_time, 3),
+            "requests_per_second": self.request_bucket.rate,
+            "tokens_per_minute": self.token_bucket.rate * 60.0
+        }
+
+    def _queued_count(self) -> int:
+        return sum(1 for _, _, waiter in self._queue if not waiter.future.done())
+
+    def _admission_wait(self, tokens: int) -> float:
+        """0 if a request could start now, otherwise a lower bound on the wait"""
+        if self.in_flight >= self.max_in_flight:
+            return self._service_time
+        return max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(tokens))
+
+    def _admit(self, tokens: int, waited: float) -> None:
+        self.in_flight += 1
+        self.admitted += 1
+        self.request_bucket.consume(1)
+        self.token_bucket.consume(tokens)
+        self._waits.append(waited)
+
+    def _estimate_wait(self, priority: int, tokens: int) -> float:
+        """Expected queueing delay for a new request at this priority"""
+        ahead = sum(1 for p, _, waiter in self._queue
+                    if p <= priority and not waiter.future.done()) + 1
+        slot_wait = 0.0
+        busy = self.in_flight + ahead - self.max_in_flight
+        if busy > 0:
+            slot_wait = math.ceil(busy / self.max_in_flight) * self._service_time
+        rate_wait = 0.0
+        if self.request_bucket.rate > 0:
+            rate_wait = max(0.0, ahead - self.request_bucket.tokens) / self.request_bucket.rate
+        token_wait = self.token_bucket.wait_time(tokens * ahead)
+        return max(slot_wait, rate_wait, token_wait)
+
+    def _dispatch(self) -> None:
+        """Admit queued requests in priority order while capacity allows"""
+        while self._queue:
+            _, _, waiter = self._queue[0]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                continue
+            if self.in_flight >= self.max_in_flight:
+                return
+            wait = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(waiter.tokens))
+            if wait > 0:
+                if self._wakeup is None:
+                    self._wakeup = asyncio.get_running_loop().call_later(wait, self._on_wakeup)
+                return
+            heapq.heappop(self._queue)
+            self._admit(waiter.tokens, time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def _on_wakeup(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+
+class ScheduledLLMProvider(BaseLLMProvider):
+    """Provider wrapper that admits every call through an LLMScheduler"""
+
+    def __init__(self, provider: BaseLLMProvider, scheduler: LLMScheduler):
+        self.provider = provider
+        self.scheduler = scheduler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.provider, name)
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        tools: Optional[List] = None
+    ) -> str:
+        priority = self.scheduler.priority_for(current_agent.get())
+        async with self.scheduler.slot(priority, estimate_tokens(messages)):
+            return await self.provider.chat_completion(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                tools=tools
+            )
+
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        tools: Optional[List] = None
+    ) -> AsyncIterator[str]:
+        priority = self.scheduler.priority_for(current_agent.get())
+        async with self.scheduler.slot(priority, estimate_tokens(messages)):
+            async for chunk in self.provider.chat_completion_stream(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                tools=tools
+            ):
+                yield chunk
+
+
+def create_scheduler_from_env() -> LLMScheduler:
+    """Build the scheduler from LLM_* environment variables"""
+    return LLMScheduler(
+        requests_per_second=float(os.getenv("LLM_MAX_REQUESTS_PER_SECOND", "20")),
+        tokens_per_minute=float(os.getenv("LLM_MAX_TOKENS_PER_MINUTE", "0")),
+        max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "32")),
+        max_queue=int(os.getenv("LLM_MAX_QUEUE", "256")),
+        queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10")),
+        priority_classes=parse_priority_classes(os.getenv(
+            "LLM_PRIORITY_CLASSES",
+            "checkout:0,returns:0,router:1,search:1,recommender:1,stylist:2,lookbook:2"
+        ))
+    )
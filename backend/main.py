@@ -6,23 +6,29 @@ Multi-agent shopping assistant backend
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks, status, Query
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
-from typing import List, Optional
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, text
+from typing import List, Optional, Union
+import json
+import math
 import os
 
-from database import get_db
+from database import get_async_db
 from models import (
     Product, ProductVariant, SKU, Customer, Order, OrderLineItem,
-    Review, ReturnRequest, StyleProfile, ProductHierarchy
+    Review, ReturnRequest, StyleProfile
 )
 from schemas import (
-    ProductResponse, ProductSearchRequest, CustomerResponse, CustomerCreate,
+    ProductResponse, ProductSearchRequest, ProductSearchResponse, CustomerResponse, CustomerCreate,
     OrderCreate, OrderResponse, ReviewCreate, ReviewResponse,
     ReturnRequestCreate, ReturnRequestResponse, SKUResponse,
-    AgentRequest, AgentResponse, Token, LoginRequest
+    VectorSearchRequest, VectorSearchResult, AgentRequest, AgentResponse, Token, LoginRequest
 )
+from agents import catalog_search
+from pagination import ORDER_KEYSET, PRODUCT_KEYSET, RETURN_KEYSET, REVIEW_KEYSET, fetch_page
 from agents.orchestrator import AgentOrchestrator
+from llm_scheduler import LLMOverloadedError
 from auth import get_password_hash, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
 from datetime import timedelta
 from models import Customer, Order, OrderLineItem, ReturnRequest, Product
@@ -47,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Search-Mode", "X-Next-Cursor"],
 )
 
 # Initialize agent orchestrator
@@ -56,18 +63,44 @@ orchestrator = AgentOrchestrator()
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
-    from database import engine
+    from database import async_engine
+    from migrate import apply_migrations
+    from agents.catalog_index import get_catalog_index
+    from agents.hierarchy import get_hierarchy_index
+    from agents.facet_index import get_facet_index
+    from agents.attribute_index import get_attribute_index
     from models import Base
-    from sqlalchemy import text
     
-    # Create schema if not exists
-    with engine.connect() as conn:
-        conn.execute(text("CREATE SCHEMA IF NOT EXISTS retail"))
-        conn.commit()
-    
-    # Create tables
-    Base.metadata.create_all(bind=engine)
-
+    async with async_engine.begin() as conn:
+        # Create schema if not exists
+        await conn.execute(text("CREATE SCHEMA IF NOT EXISTS retail"))
+        # Create tables
+        await conn.run_sync(Base.metadata.create_all)
+    # Triggers, functions and indexes the ORM does not manage
+    async with async_engine.begin() as conn:
+        await apply_migrations(conn)
+    # Builds in the background; agents use Postgres search until it is ready
+    get_catalog_index().start()
+    get_hierarchy_index().start()
+    get_facet_index().start()
+    get_attribute_index().start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled LLM and database connections"""
+    from database import async_engine
+    from llm_provider import close_http_client
+    from agents.catalog_index import get_catalog_index
+    from agents.hierarchy import get_hierarchy_index
+    from agents.facet_index import get_facet_index
+    from agents.attribute_index import get_attribute_index
+    await get_catalog_index().stop()
+    await get_hierarchy_index().stop()
+    await get_facet_index().stop()
+    await get_attribute_index().stop()
+    await close_http_client()
+    await async_engine.dispose()
 
 
 @app.get("/")
@@ -86,97 +119,152 @@ async def root():
 
 
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
-    """Health check endpoint"""
+async def health_check(db: AsyncSession = Depends(get_async_db)):
+    """Health check endpoint, including connection pool metrics"""
+    from database import get_pool_stats
     try:
-        db.execute("SELECT 1")
-        return {"status": "healthy", "database": "connected"}
+        await db.execute(text("SELECT 1"))
+        return {"status": "healthy", "database": "connected", "database_pool": get_pool_stats()}
     except Exception as e:
-        return {"status": "unhealthy", "error": str(e)}
+        return {"status": "unhealthy", "error": str(e), "database_pool": get_pool_stats()}
 
 
 # Product Endpoints
 @app.get("/api/products", response_model=List[ProductResponse])
 async def get_products(
-    skip: int = 0,
-    limit: int = 20,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     category: Optional[str] = None,
     gender: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get products with optional filtering"""
-    query = db.query(Product).filter(Product.status == "ACTIVE")
+    """Get products with optional filtering (category includes its subcategories)
+
+    Ordered by product id; pass the X-Next-Cursor header back as `cursor`
+    for the next page.
+    """
+    from agents.hierarchy import apply_category_filter
     
-    if category:
-        query = query.join(ProductHierarchy).filter(
-            ProductHierarchy.hierarchy_name.ilike(f"%{category}%")
-        )
+    query = await apply_category_filter(select(Product).where(Product.status == "ACTIVE"), category)
     
     if gender:
-        query = query.filter(Product.gender == gender)
+        query = query.where(Product.gender == gender)
     
-    products = query.offset(skip).limit(limit).all()
-    return products
+    return await fetch_page(db, query, PRODUCT_KEYSET, response, limit=limit, cursor=cursor, skip=skip)
+
+
+@app.get("/api/products/search", response_model=Union[List[ProductResponse], ProductSearchResponse])
+async def search_products(
+    response: Response,
+    q: str = Query(..., description="Search query (web-search syntax: \"phrase\", or, -exclude)"),
+    limit: int = Query(20, ge=1, le=100),
+    facets: bool = Query(False, description="Return {products, facets} with counts over the matches"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Full-text search over name, brand, category, style and description, best matches first
+
+    Falls back to typo-tolerant name/brand matching when nothing matches;
+    X-Search-Mode tells which one answered.
+    """
+    from agents.facet_index import get_facet_index
+    
+    products, fuzzy = await catalog_search.search_products(db, q, limit)
+    response.headers["X-Search-Mode"] = "fuzzy" if fuzzy else "exact"
+    if not facets:
+        return products
+    
+    facet_index = get_facet_index()
+    if not facet_index.ready:
+        # Disabled or not built yet: no counts, and no match ids to read
+        return {"products": products, "facets": None}
+    if fuzzy:
+        # Only the returned near-matches match at all
+        ids, truncated = [p.product_id for p in products], False
+    else:
+        ids, truncated = await catalog_search.match_ids(
+            db, select(Product).where(Product.status == "ACTIVE"), q, facet_index.max_matches
+        )
+    return {"products": products, "facets": facet_index.count(ids, truncated)}
+
+
+@app.post("/api/products/vector-search", response_model=List[VectorSearchResult])
+async def vector_search_products(
+    request: VectorSearchRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Active products closest to a query text or embedding by cosine similarity
+
+    Text queries are embedded with EMBEDDING_PROVIDER (repeats are cached).
+    """
+    from embeddings import EMBEDDING_DIMENSIONS, get_query_embedding_cache
+    
+    if request.query_embedding is not None:
+        embedding = request.query_embedding
+    elif request.query and request.query.strip():
+        embedding = await get_query_embedding_cache().get(request.query)
+    else:
+        raise HTTPException(status_code=400, detail="Provide query or query_embedding")
+    if len(embedding) != EMBEDDING_DIMENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"query_embedding must have {EMBEDDING_DIMENSIONS} dimensions, got {len(embedding)}"
+        )
+    
+    results = await catalog_search.vector_search(
+        db, embedding,
+        limit=request.limit,
+        threshold=request.threshold,
+        price_min=request.price_min,
+        price_max=request.price_max
+    )
+    return [
+        {**ProductResponse.model_validate(product).model_dump(), "similarity": round(similarity, 4)}
+        for product, similarity in results
+    ]
 
 
 @app.get("/api/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get product by ID"""
-    product = db.query(Product).filter(Product.product_id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
 
-@app.get("/api/products/search")
-async def search_products(
-    q: str = Query(..., description="Search query"),
-    limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
-):
-    """Search products by name, description, or brand"""
-    search_term = f"%{q}%"
-    products = db.query(Product).filter(
-        or_(
-            Product.product_name.ilike(search_term),
-            Product.product_description.ilike(search_term),
-            Product.brand_name.ilike(search_term)
-        ),
-        Product.status == "ACTIVE"
-    ).limit(limit).all()
-    
-    return products
-
-
 @app.get("/api/products/{product_id}/skus", response_model=List[SKUResponse])
-async def get_product_skus(product_id: int, db: Session = Depends(get_db)):
+async def get_product_skus(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get all SKUs for a product"""
-    skus = db.query(SKU).join(ProductVariant).filter(
+    skus = (await db.execute(select(SKU).join(ProductVariant).where(
         ProductVariant.product_id == product_id,
         SKU.status == "ACTIVE"
-    ).all()
+    ))).scalars().all()
     return skus
 
 
 @app.get("/api/products/{product_id}/reviews", response_model=List[ReviewResponse])
 async def get_product_reviews(
     product_id: int,
-    skip: int = 0,
-    limit: int = 20,
-    db: Session = Depends(get_db)
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get reviews for a product"""
-    reviews = db.query(Review).filter(
-        Review.product_id == product_id
-    ).order_by(Review.created_at.desc()).offset(skip).limit(limit).all()
-    return reviews
+    """Get reviews for a product, newest first (cursor-paginated like /api/products)"""
+    return await fetch_page(
+        db, select(Review).where(Review.product_id == product_id), REVIEW_KEYSET, response,
+        limit=limit, cursor=cursor, skip=skip
+    )
 
 
 # Auth Endpoints
 @app.post("/api/auth/register", response_model=CustomerResponse)
-async def register(customer: CustomerCreate, db: Session = Depends(get_db)):
+async def register(customer: CustomerCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new customer"""
-    db_user = db.query(Customer).filter(Customer.email == customer.email).first()
+    db_user = await db.scalar(select(Customer).where(Customer.email == customer.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -197,15 +285,15 @@ async def register(customer: CustomerCreate, db: Session = Depends(get_db)):
         country=customer.country
     )
     db.add(db_customer)
-    db.commit()
-    db.refresh(db_customer)
+    await db.commit()
+    await db.refresh(db_customer)
     return db_customer
 
 
 @app.post("/api/auth/login", response_model=Token)
-async def login(login_req: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_req: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """Login and get access token"""
-    user = db.query(Customer).filter(Customer.email == login_req.email).first()
+    user = await db.scalar(select(Customer).where(Customer.email == login_req.email))
     if not user or not user.password_hash or not verify_password(login_req.password, user.password_hash):
         raise HTTPException(
             status_code=401,
@@ -223,15 +311,15 @@ async def login(login_req: LoginRequest, db: Session = Depends(get_db)):
 
 # Customer Endpoints
 @app.post("/api/customers", response_model=CustomerResponse)
-async def create_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
+async def create_customer(customer: CustomerCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new customer (also supports registration logic)"""
     return await register(customer, db)
 
 
 @app.get("/api/customers/{customer_id}", response_model=CustomerResponse)
-async def get_customer(customer_id: int, db: Session = Depends(get_db)):
+async def get_customer(customer_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get customer by ID"""
-    customer = db.query(Customer).filter(Customer.customer_id == customer_id).first()
+    customer = await db.get(Customer, customer_id)
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     return customer
@@ -242,7 +330,7 @@ from auth import decode_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     payload = decode_access_token(token)
     if not payload:
         raise HTTPException(
@@ -254,7 +342,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     if not email:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = db.query(Customer).filter(Customer.email == email).first()
+    user = await db.scalar(select(Customer).where(Customer.email == email))
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
@@ -264,7 +352,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
 async def create_order(
     order: OrderCreate, 
     current_user: Customer = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new order"""
     # Calculate totals
@@ -289,8 +377,8 @@ async def create_order(
         payment_method=order.payment_method
     )
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    await db.commit()
+    await db.refresh(db_order)
     
     # Create line items
     for item in order.line_items:
@@ -303,26 +391,35 @@ async def create_order(
         )
         db.add(line_item)
     
-    db.commit()
-    db.refresh(db_order)
+    await db.commit()
+    await db.refresh(db_order)
     return db_order
 
 
 @app.get("/api/orders", response_model=List[OrderResponse])
-async def get_orders(customer_id: int, db: Session = Depends(get_db)):
-    """Get orders for a customer"""
-    return db.query(Order).filter(Order.customer_id == customer_id).order_by(Order.order_date.desc()).all()
+async def get_orders(
+    customer_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Page size; all orders when omitted"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get orders for a customer, newest first"""
+    return await fetch_page(
+        db, select(Order).where(Order.customer_id == customer_id), ORDER_KEYSET, response,
+        limit=limit, cursor=cursor
+    )
 
 
 # Return Endpoints
 @app.post("/api/returns", response_model=ReturnRequestResponse)
 async def create_return_request(
     return_req: ReturnRequestCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new return request"""
     # Verify order exists
-    order = db.query(Order).filter(Order.order_id == return_req.order_id).first()
+    order = await db.get(Order, return_req.order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
         
@@ -334,23 +431,32 @@ async def create_return_request(
         return_status="PENDING"
     )
     db.add(db_return)
-    db.commit()
-    db.refresh(db_return)
+    await db.commit()
+    await db.refresh(db_return)
     return db_return
 
 
 @app.get("/api/returns", response_model=List[ReturnRequestResponse])
-async def get_returns(customer_id: int, db: Session = Depends(get_db)):
-    """Get return requests for a customer"""
-    return db.query(ReturnRequest).join(Order).filter(Order.customer_id == customer_id).order_by(ReturnRequest.requested_date.desc()).all()
+async def get_returns(
+    customer_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Page size; all returns when omitted"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get return requests for a customer, newest first"""
+    return await fetch_page(
+        db, select(ReturnRequest).join(Order).where(Order.customer_id == customer_id), RETURN_KEYSET, response,
+        limit=limit, cursor=cursor
+    )
 
 
 @app.get("/api/customers/{customer_id}/style-profile")
-async def get_style_profile(customer_id: int, db: Session = Depends(get_db)):
+async def get_style_profile(customer_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get customer style profile"""
-    profile = db.query(StyleProfile).filter(
+    profile = await db.scalar(select(StyleProfile).where(
         StyleProfile.customer_id == customer_id
-    ).first()
+    ))
     if not profile:
         raise HTTPException(status_code=404, detail="Style profile not found")
     return {
@@ -370,11 +476,9 @@ async def get_style_profile(customer_id: int, db: Session = Depends(get_db)):
 
 
 @app.get("/api/returns/{return_id}", response_model=ReturnRequestResponse)
-async def get_return_request(return_id: int, db: Session = Depends(get_db)):
+async def get_return_request(return_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get return request by ID"""
-    return_request = db.query(ReturnRequest).filter(
-        ReturnRequest.return_id == return_id
-    ).first()
+    return_request = await db.get(ReturnRequest, return_id)
     if not return_request:
         raise HTTPException(status_code=404, detail="Return request not found")
     return return_request
@@ -384,7 +488,7 @@ async def get_return_request(return_id: int, db: Session = Depends(get_db)):
 @app.post("/api/agent/chat", response_model=AgentResponse)
 async def chat_with_agent(
     request: AgentRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Chat with the multi-agent system"""
     try:
@@ -392,20 +496,109 @@ async def chat_with_agent(
             message=request.message,
             customer_id=request.customer_id,
             context=request.context or {},
-            db=db
+            db=db,
+            session_id=request.session_id
         )
         return response
+    except LLMOverloadedError as e:
+        raise overloaded_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def overloaded_exception(error: LLMOverloadedError) -> HTTPException:
+    """503 with Retry-After for requests rejected by LLM admission control"""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    )
+
+
+@app.post("/api/agent/chat/stream")
+async def chat_with_agent_stream(
+    request: AgentRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Chat with the multi-agent system, streaming the reply as server-sent events
+    
+    Emits an `agent` event once routing is done, `token` events as the agent's
+    LLM output arrives, and a final `done` event carrying the same payload as
+    /api/agent/chat.
+    """
+    events = orchestrator.stream_message(
+        message=request.message,
+        customer_id=request.customer_id,
+        context=request.context or {},
+        db=db,
+        session_id=request.session_id
+    )
+    
+    # Route before the response starts so overload can still be a 503
+    first_event = None
+    try:
+        first_event = await events.__anext__()
+    except LLMOverloadedError as e:
+        raise overloaded_exception(e)
+    except StopAsyncIteration:
+        failure = RuntimeError("no reply was produced")
+    except Exception as e:
+        failure = e
+    
+    def format_event(event: dict) -> str:
+        return f"event: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+    
+    async def event_stream():
+        if first_event is None:
+            # Same apology as /api/agent/chat, after an error event
+            yield format_event({"event": "error", "data": {"detail": str(failure)}})
+            yield format_event({"event": "done", "data": orchestrator.error_response(None, failure)})
+            return
+        yield format_event(first_event)
+        try:
+            async for event in events:
+                yield format_event(event)
+        except LLMOverloadedError as e:
+            yield format_event({"event": "error", "data": {"detail": str(e), "retry_after": e.retry_after}})
+        except Exception as e:
+            yield format_event({"event": "error", "data": {"detail": str(e)}})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/api/agent/status")
 async def get_agent_status():
     """Get agent system status"""
     from config import Config
+    from llm_cache import get_llm_cache
+    from llm_provider import get_llm_provider, get_llm_scheduler
+    from agents.product_enrichment import get_product_enricher
+    from agents.catalog_index import get_catalog_index
+    from agents.hierarchy import get_hierarchy_index
+    from agents.facet_index import get_facet_index
+    from agents.attribute_index import get_attribute_index
+    from embeddings import get_query_embedding_cache
+    llm_cache = get_llm_cache()
+    llm_scheduler = get_llm_scheduler()
+    failover_stats = getattr(get_llm_provider(), "get_failover_stats", None)
     return {
         "status": "active",
         "agents": orchestrator.get_agent_status(),
+        "routing_cache": orchestrator.get_routing_stats(),
+        "conversation_store": await orchestrator.get_conversation_stats(),
+        "llm_cache": llm_cache.get_stats() if llm_cache else None,
+        "llm_scheduler": llm_scheduler.get_stats() if llm_scheduler else None,
+        "llm_failover": failover_stats() if failover_stats else None,
+        "product_enrichment": get_product_enricher().get_stats(),
+        "catalog_index": get_catalog_index().get_stats(),
+        "product_hierarchy": get_hierarchy_index().get_stats(),
+        "facet_index": get_facet_index().get_stats(),
+        "attribute_index": get_attribute_index().get_stats(),
+        "query_embeddings": get_query_embedding_cache().get_stats(),
         "llm_provider": Config.LLM_PROVIDER,
         "version": "1.0.0"
     }
@@ -0,0 +1,64 @@
+"""
+Database migrations
+
+SQL files in migrations/ are applied once each, in name order, after the
+ORM tables exist. Every run takes a transaction-scoped advisory lock, so
+several workers starting together apply a migration exactly once. Applied
+names are recorded in retail.schema_migration. Only PostgreSQL is
+migrated; other dialects (e.g. SQLite in local experiments) are skipped.
+
+Usage:
+    python migrate.py
+"""
+
+import asyncio
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Arbitrary key shared by every process that runs migrations
+MIGRATION_LOCK_ID = 72_410_001
+
+
+async def apply_migrations(conn: AsyncConnection) -> List[str]:
+    """Apply pending migrations inside the caller's transaction; returns their names"""
+    if conn.dialect.name != "postgresql":
+        return []
+
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS retail.schema_migration ("
+        "name VARCHAR(200) PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    applied = set((await conn.execute(text("SELECT name FROM retail.schema_migration"))).scalars().all())
+
+    # Migration files hold several statements and plpgsql bodies, which need
+    # the driver's simple-query path rather than a prepared statement
+    raw = await conn.get_raw_connection()
+    pending = [path for path in sorted(MIGRATIONS_DIR.glob("*.sql")) if path.name not in applied]
+    for path in pending:
+        await raw.driver_connection.execute(path.read_text())
+        await conn.execute(text("INSERT INTO retail.schema_migration (name) VALUES (:name)"),
+                           {"name": path.name})
+    return [path.name for path in pending]
+
+
+async def main() -> None:
+    from database import async_engine
+    from models import Base
+
+    async with async_engine.begin() as conn:
+        await conn.execute(text("CREATE SCHEMA IF NOT EXISTS retail"))
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_engine.begin() as conn:
+        applied = await apply_migrations(conn)
+    await async_engine.dispose()
+    print(f"Applied {len(applied)} migration(s): {', '.join(applied) or 'none pending'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
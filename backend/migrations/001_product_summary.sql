@@ -0,0 +1,457 @@
+-- Denormalized product summary (price range, rating stats, sales, returns)
+--
+-- retail.product_summary holds one row per product and is kept current by
+-- row triggers on sku, product_variant, review, order, order_line_item and
+-- return_request, so list and trending reads are single primary-key or index
+-- lookups. Units sold are also bucketed per day in retail.product_sales_daily;
+-- the 7/30 day windows are incremented on write and re-derived from the
+-- buckets by retail.refresh_product_sales_windows() (run daily, see
+-- scripts/rebuild_product_summary.py --windows-only).
+
+CREATE TABLE IF NOT EXISTS retail.product_summary (
+    product_id INTEGER PRIMARY KEY REFERENCES retail.product(product_id) ON DELETE CASCADE,
+    price_min DECIMAL(10, 2),
+    price_max DECIMAL(10, 2),
+    active_sku_count INTEGER NOT NULL DEFAULT 0,
+    in_stock BOOLEAN NOT NULL DEFAULT FALSE,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_1 INTEGER NOT NULL DEFAULT 0,
+    rating_2 INTEGER NOT NULL DEFAULT 0,
+    rating_3 INTEGER NOT NULL DEFAULT 0,
+    rating_4 INTEGER NOT NULL DEFAULT 0,
+    rating_5 INTEGER NOT NULL DEFAULT 0,
+    units_sold_7d INTEGER NOT NULL DEFAULT 0,
+    units_sold_30d INTEGER NOT NULL DEFAULT 0,
+    units_sold_total INTEGER NOT NULL DEFAULT 0,
+    return_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS retail.product_sales_daily (
+    product_id INTEGER NOT NULL REFERENCES retail.product(product_id) ON DELETE CASCADE,
+    sales_date DATE NOT NULL,
+    units INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, sales_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_summary_trending
+    ON retail.product_summary(units_sold_30d DESC, units_sold_total DESC);
+CREATE INDEX IF NOT EXISTS idx_product_sales_daily_date ON retail.product_sales_daily(sales_date);
+
+-- Helpers
+
+CREATE OR REPLACE FUNCTION retail.product_for_sku(p_sku_id INTEGER)
+RETURNS INTEGER AS $$
+    SELECT v.product_id
+    FROM retail.sku s
+    JOIN retail.product_variant v ON v.variant_id = s.variant_id
+    WHERE s.sku_id = p_sku_id
+$$ LANGUAGE sql STABLE;
+
+-- Recompute price range and stock from the product's active SKUs. min/max
+-- cannot be maintained incrementally on delete, and a product has few SKUs.
+CREATE OR REPLACE FUNCTION retail.product_summary_refresh_prices(p_product_id INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_product_id IS NULL OR NOT EXISTS (
+        SELECT 1 FROM retail.product WHERE product_id = p_product_id
+    ) THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO retail.product_summary AS ps
+        (product_id, price_min, price_max, active_sku_count, in_stock, updated_at)
+    SELECT p_product_id, min(s.price), max(s.price), count(*),
+           coalesce(bool_or(s.inventory_quantity > 0), FALSE), CURRENT_TIMESTAMP
+    FROM retail.sku s
+    JOIN retail.product_variant v ON v.variant_id = s.variant_id
+    WHERE v.product_id = p_product_id AND s.status = 'ACTIVE'
+    ON CONFLICT (product_id) DO UPDATE SET
+        price_min = EXCLUDED.price_min,
+        price_max = EXCLUDED.price_max,
+        active_sku_count = EXCLUDED.active_sku_count,
+        in_stock = EXCLUDED.in_stock,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION retail.product_summary_add_rating(
+    p_product_id INTEGER, p_rating INTEGER, p_sign INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    IF p_rating IS NULL OR NOT EXISTS (
+        SELECT 1 FROM retail.product WHERE product_id = p_product_id
+    ) THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO retail.product_summary AS ps
+        (product_id, rating_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+    VALUES (
+        p_product_id, p_sign, p_sign * p_rating,
+        p_sign * (p_rating = 1)::int, p_sign * (p_rating = 2)::int, p_sign * (p_rating = 3)::int,
+        p_sign * (p_rating = 4)::int, p_sign * (p_rating = 5)::int
+    )
+    ON CONFLICT (product_id) DO UPDATE SET
+        rating_count = ps.rating_count + EXCLUDED.rating_count,
+        rating_sum = ps.rating_sum + EXCLUDED.rating_sum,
+        rating_1 = ps.rating_1 + EXCLUDED.rating_1,
+        rating_2 = ps.rating_2 + EXCLUDED.rating_2,
+        rating_3 = ps.rating_3 + EXCLUDED.rating_3,
+        rating_4 = ps.rating_4 + EXCLUDED.rating_4,
+        rating_5 = ps.rating_5 + EXCLUDED.rating_5,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Units sold on one day; p_quantity is negative when sales are removed
+CREATE OR REPLACE FUNCTION retail.product_summary_add_units(
+    p_product_id INTEGER, p_sold_on DATE, p_quantity INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    IF p_product_id IS NULL OR NOT EXISTS (
+        SELECT 1 FROM retail.product WHERE product_id = p_product_id
+    ) THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO retail.product_sales_daily AS d (product_id, sales_date, units)
+    VALUES (p_product_id, p_sold_on, p_quantity)
+    ON CONFLICT (product_id, sales_date) DO UPDATE SET units = d.units + EXCLUDED.units;
+
+    INSERT INTO retail.product_summary AS ps
+        (product_id, units_sold_7d, units_sold_30d, units_sold_total)
+    VALUES (
+        p_product_id,
+        CASE WHEN p_sold_on > CURRENT_DATE - 7 THEN p_quantity ELSE 0 END,
+        CASE WHEN p_sold_on > CURRENT_DATE - 30 THEN p_quantity ELSE 0 END,
+        p_quantity
+    )
+    ON CONFLICT (product_id) DO UPDATE SET
+        units_sold_7d = ps.units_sold_7d + EXCLUDED.units_sold_7d,
+        units_sold_30d = ps.units_sold_30d + EXCLUDED.units_sold_30d,
+        units_sold_total = ps.units_sold_total + EXCLUDED.units_sold_total,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- p_quantity is negative when a line item is removed
+CREATE OR REPLACE FUNCTION retail.product_summary_add_sale(
+    p_sku_id INTEGER, p_order_id INTEGER, p_quantity INTEGER, p_fallback_date TIMESTAMP
+)
+RETURNS VOID AS $$
+DECLARE
+    v_sold_on DATE;
+BEGIN
+    SELECT o.order_date::date INTO v_sold_on FROM retail."order" o WHERE o.order_id = p_order_id;
+    PERFORM retail.product_summary_add_units(
+        retail.product_for_sku(p_sku_id), coalesce(v_sold_on, p_fallback_date::date, CURRENT_DATE), p_quantity
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION retail.product_summary_add_returns(p_product_id INTEGER, p_delta INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_product_id IS NULL OR p_delta = 0 OR NOT EXISTS (
+        SELECT 1 FROM retail.product WHERE product_id = p_product_id
+    ) THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO retail.product_summary AS ps (product_id, return_count)
+    VALUES (p_product_id, p_delta)
+    ON CONFLICT (product_id) DO UPDATE SET
+        return_count = ps.return_count + EXCLUDED.return_count,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION retail.product_summary_add_return(p_line_item_id INTEGER, p_delta INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    PERFORM retail.product_summary_add_returns(retail.product_for_sku(li.sku_id), p_delta)
+    FROM retail.order_line_item li
+    WHERE li.line_item_id = p_line_item_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Move a SKU's sales and returns to the product it now belongs to
+CREATE OR REPLACE FUNCTION retail.product_summary_move_sku(
+    p_sku_id INTEGER, p_from_product INTEGER, p_to_product INTEGER
+)
+RETURNS VOID AS $$
+DECLARE
+    v_sale RECORD;
+    v_returns INTEGER;
+BEGIN
+    FOR v_sale IN
+        SELECT o.order_date::date AS sold_on, sum(li.quantity)::int AS units
+        FROM retail.order_line_item li
+        JOIN retail."order" o ON o.order_id = li.order_id
+        WHERE li.sku_id = p_sku_id
+        GROUP BY 1
+    LOOP
+        PERFORM retail.product_summary_add_units(p_from_product, v_sale.sold_on, -v_sale.units);
+        PERFORM retail.product_summary_add_units(p_to_product, v_sale.sold_on, v_sale.units);
+    END LOOP;
+
+    SELECT count(*) INTO v_returns
+    FROM retail.return_request rr
+    JOIN retail.order_line_item li ON li.line_item_id = rr.line_item_id
+    WHERE li.sku_id = p_sku_id;
+    PERFORM retail.product_summary_add_returns(p_from_product, -v_returns);
+    PERFORM retail.product_summary_add_returns(p_to_product, v_returns);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Triggers
+
+CREATE OR REPLACE FUNCTION retail.sku_product_summary_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_old_product INTEGER;
+    v_new_product INTEGER;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT product_id INTO v_old_product FROM retail.product_variant WHERE variant_id = OLD.variant_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT product_id INTO v_new_product FROM retail.product_variant WHERE variant_id = NEW.variant_id;
+    END IF;
+
+    PERFORM retail.product_summary_refresh_prices(v_new_product);
+    IF v_old_product IS DISTINCT FROM v_new_product THEN
+        PERFORM retail.product_summary_refresh_prices(v_old_product);
+        IF TG_OP = 'UPDATE' THEN
+            PERFORM retail.product_summary_move_sku(NEW.sku_id, v_old_product, v_new_product);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION retail.review_product_summary_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM retail.product_summary_add_rating(OLD.product_id, OLD.rating, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM retail.product_summary_add_rating(NEW.product_id, NEW.rating, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION retail.line_item_product_summary_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM retail.product_summary_add_sale(OLD.sku_id, OLD.order_id, -OLD.quantity, OLD.created_at);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM retail.product_summary_add_sale(NEW.sku_id, NEW.order_id, NEW.quantity, NEW.created_at);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION retail.return_product_summary_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.line_item_id IS NOT NULL THEN
+        PERFORM retail.product_summary_add_return(OLD.line_item_id, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.line_item_id IS NOT NULL THEN
+        PERFORM retail.product_summary_add_return(NEW.line_item_id, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION retail.variant_product_summary_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM retail.product_summary_move_sku(s.sku_id, OLD.product_id, NEW.product_id)
+    FROM retail.sku s
+    WHERE s.variant_id = NEW.variant_id;
+    PERFORM retail.product_summary_refresh_prices(OLD.product_id);
+    PERFORM retail.product_summary_refresh_prices(NEW.product_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The line item cascade of an order delete runs once the order row is gone,
+-- so its sales would be taken off the wrong day. Delete them first.
+CREATE OR REPLACE FUNCTION retail.order_product_summary_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_sale RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM retail.order_line_item WHERE order_id = OLD.order_id;
+        RETURN OLD;
+    END IF;
+
+    FOR v_sale IN
+        SELECT retail.product_for_sku(sku_id) AS product_id, sum(quantity)::int AS units
+        FROM retail.order_line_item
+        WHERE order_id = NEW.order_id
+        GROUP BY 1
+    LOOP
+        PERFORM retail.product_summary_add_units(v_sale.product_id, OLD.order_date::date, -v_sale.units);
+        PERFORM retail.product_summary_add_units(v_sale.product_id, NEW.order_date::date, v_sale.units);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sku_product_summary ON retail.sku;
+CREATE TRIGGER sku_product_summary
+    AFTER INSERT OR DELETE OR UPDATE OF variant_id, price, status, inventory_quantity ON retail.sku
+    FOR EACH ROW EXECUTE FUNCTION retail.sku_product_summary_trigger();
+
+DROP TRIGGER IF EXISTS variant_product_summary ON retail.product_variant;
+CREATE TRIGGER variant_product_summary
+    AFTER UPDATE OF product_id ON retail.product_variant
+    FOR EACH ROW WHEN (OLD.product_id IS DISTINCT FROM NEW.product_id)
+    EXECUTE FUNCTION retail.variant_product_summary_trigger();
+
+DROP TRIGGER IF EXISTS review_product_summary ON retail.review;
+CREATE TRIGGER review_product_summary
+    AFTER INSERT OR DELETE OR UPDATE OF product_id, rating ON retail.review
+    FOR EACH ROW EXECUTE FUNCTION retail.review_product_summary_trigger();
+
+DROP TRIGGER IF EXISTS line_item_product_summary ON retail.order_line_item;
+CREATE TRIGGER line_item_product_summary
+    AFTER INSERT OR DELETE OR UPDATE OF sku_id, order_id, quantity ON retail.order_line_item
+    FOR EACH ROW EXECUTE FUNCTION retail.line_item_product_summary_trigger();
+
+DROP TRIGGER IF EXISTS order_product_summary_delete ON retail."order";
+CREATE TRIGGER order_product_summary_delete
+    BEFORE DELETE ON retail."order"
+    FOR EACH ROW EXECUTE FUNCTION retail.order_product_summary_trigger();
+
+DROP TRIGGER IF EXISTS order_product_summary ON retail."order";
+CREATE TRIGGER order_product_summary
+    AFTER UPDATE OF order_date ON retail."order"
+    FOR EACH ROW WHEN (OLD.order_date::date IS DISTINCT FROM NEW.order_date::date)
+    EXECUTE FUNCTION retail.order_product_summary_trigger();
+
+DROP TRIGGER IF EXISTS return_product_summary ON retail.return_request;
+CREATE TRIGGER return_product_summary
+    AFTER INSERT OR DELETE OR UPDATE OF line_item_id ON retail.return_request
+    FOR EACH ROW EXECUTE FUNCTION retail.return_product_summary_trigger();
+
+-- Maintenance
+
+-- Re-derive the 7/30 day windows from the daily buckets so sales age out
+CREATE OR REPLACE FUNCTION retail.refresh_product_sales_windows()
+RETURNS INTEGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    -- Hold off trigger increments so none is overwritten by a stale total
+    LOCK TABLE retail.product_summary IN EXCLUSIVE MODE;
+
+    UPDATE retail.product_summary ps SET
+        units_sold_7d = coalesce(w.units_7d, 0),
+        units_sold_30d = coalesce(w.units_30d, 0),
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT s.product_id,
+               sum(d.units) FILTER (WHERE d.sales_date > CURRENT_DATE - 7) AS units_7d,
+               sum(d.units) AS units_30d
+        FROM retail.product_summary s
+        LEFT JOIN retail.product_sales_daily d
+            ON d.product_id = s.product_id AND d.sales_date > CURRENT_DATE - 30
+        WHERE s.units_sold_30d <> 0 OR d.product_id IS NOT NULL
+        GROUP BY s.product_id
+    ) w
+    WHERE ps.product_id = w.product_id
+      AND (ps.units_sold_7d, ps.units_sold_30d)
+          IS DISTINCT FROM (coalesce(w.units_7d, 0), coalesce(w.units_30d, 0));
+
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute every row from the base tables. Readers keep seeing the previous
+-- contents until commit; concurrent writes wait for the lock.
+CREATE OR REPLACE FUNCTION retail.rebuild_product_summary()
+RETURNS INTEGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    LOCK TABLE retail.product_summary, retail.product_sales_daily IN EXCLUSIVE MODE;
+
+    DELETE FROM retail.product_sales_daily;
+    INSERT INTO retail.product_sales_daily (product_id, sales_date, units)
+    SELECT v.product_id, coalesce(o.order_date, li.created_at, CURRENT_TIMESTAMP)::date, sum(li.quantity)
+    FROM retail.order_line_item li
+    JOIN retail."order" o ON o.order_id = li.order_id
+    JOIN retail.sku s ON s.sku_id = li.sku_id
+    JOIN retail.product_variant v ON v.variant_id = s.variant_id
+    GROUP BY 1, 2;
+
+    DELETE FROM retail.product_summary;
+    INSERT INTO retail.product_summary (
+        product_id, price_min, price_max, active_sku_count, in_stock,
+        rating_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5,
+        units_sold_7d, units_sold_30d, units_sold_total, return_count, updated_at
+    )
+    SELECT
+        p.product_id, pr.price_min, pr.price_max,
+        coalesce(pr.active_sku_count, 0), coalesce(pr.in_stock, FALSE),
+        coalesce(r.rating_count, 0), coalesce(r.rating_sum, 0),
+        coalesce(r.rating_1, 0), coalesce(r.rating_2, 0), coalesce(r.rating_3, 0),
+        coalesce(r.rating_4, 0), coalesce(r.rating_5, 0),
+        coalesce(sd.units_7d, 0), coalesce(sd.units_30d, 0), coalesce(sd.units_total, 0),
+        coalesce(rt.return_count, 0), CURRENT_TIMESTAMP
+    FROM retail.product p
+    LEFT JOIN (
+        SELECT v.product_id, min(s.price) AS price_min, max(s.price) AS price_max,
+               count(*) AS active_sku_count, bool_or(s.inventory_quantity > 0) AS in_stock
+        FROM retail.sku s
+        JOIN retail.product_variant v ON v.variant_id = s.variant_id
+        WHERE s.status = 'ACTIVE'
+        GROUP BY v.product_id
+    ) pr ON pr.product_id = p.product_id
+    LEFT JOIN (
+        SELECT product_id, count(rating) AS rating_count, sum(rating) AS rating_sum,
+               count(*) FILTER (WHERE rating = 1) AS rating_1,
+               count(*) FILTER (WHERE rating = 2) AS rating_2,
+               count(*) FILTER (WHERE rating = 3) AS rating_3,
+               count(*) FILTER (WHERE rating = 4) AS rating_4,
+               count(*) FILTER (WHERE rating = 5) AS rating_5
+        FROM retail.review
+        GROUP BY product_id
+    ) r ON r.product_id = p.product_id
+    LEFT JOIN (
+        SELECT product_id,
+               sum(units) FILTER (WHERE sales_date > CURRENT_DATE - 7) AS units_7d,
+               sum(units) FILTER (WHERE sales_date > CURRENT_DATE - 30) AS units_30d,
+               sum(units) AS units_total
+        FROM retail.product_sales_daily
+        GROUP BY product_id
+    ) sd ON sd.product_id = p.product_id
+    LEFT JOIN (
+        SELECT v.product_id, count(*) AS return_count
+        FROM retail.return_request rr
+        JOIN retail.order_line_item li ON li.line_item_id = rr.line_item_id
+        JOIN retail.sku s ON s.sku_id = li.sku_id
+        JOIN retail.product_variant v ON v.variant_id = s.variant_id
+        GROUP BY v.product_id
+    ) rt ON rt.product_id = p.product_id;
+
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT retail.rebuild_product_summary();
@@ -0,0 +1,74 @@
+-- Weighted full-text search over the product catalog
+--
+-- retail.product.search_vector combines, by weight:
+--   A  product name and brand
+--   B  hierarchy path (e.g. "Women Dresses Casual") and product type
+--   C  metadata style and occasion
+--   D  description
+-- A generated column cannot read the hierarchy table, so the vector is set
+-- by a BEFORE trigger on product and refreshed when a hierarchy path changes.
+
+ALTER TABLE retail.product ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION retail.product_search_document(
+    p_name TEXT, p_brand TEXT, p_type TEXT, p_description TEXT, p_metadata JSONB, p_hierarchy_id INTEGER
+)
+RETURNS tsvector AS $$
+    SELECT
+        setweight(to_tsvector('english', coalesce(p_name, '') || ' ' || coalesce(p_brand, '')), 'A') ||
+        setweight(to_tsvector('english',
+            coalesce((SELECT replace(h.hierarchy_path, '/', ' ')
+                      FROM retail.product_hierarchy h
+                      WHERE h.hierarchy_id = p_hierarchy_id), '')
+            || ' ' || coalesce(p_type, '')), 'B') ||
+        setweight(to_tsvector('english',
+            coalesce(p_metadata ->> 'style', '') || ' ' || coalesce(p_metadata ->> 'occasion', '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(p_description, '')), 'D')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION retail.product_search_vector_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := retail.product_search_document(
+        NEW.product_name, NEW.brand_name, NEW.product_type, NEW.product_description,
+        NEW.metadata::jsonb, NEW.hierarchy_id
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION retail.hierarchy_search_vector_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE retail.product p
+    SET search_vector = retail.product_search_document(
+        p.product_name, p.brand_name, p.product_type, p.product_description,
+        p.metadata::jsonb, p.hierarchy_id
+    )
+    WHERE p.hierarchy_id = NEW.hierarchy_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS product_search_vector ON retail.product;
+CREATE TRIGGER product_search_vector
+    BEFORE INSERT OR UPDATE OF product_name, brand_name, product_type, product_description, metadata, hierarchy_id
+    ON retail.product
+    FOR EACH ROW EXECUTE FUNCTION retail.product_search_vector_trigger();
+
+DROP TRIGGER IF EXISTS hierarchy_search_vector ON retail.product_hierarchy;
+CREATE TRIGGER hierarchy_search_vector
+    AFTER UPDATE OF hierarchy_path ON retail.product_hierarchy
+    FOR EACH ROW WHEN (OLD.hierarchy_path IS DISTINCT FROM NEW.hierarchy_path)
+    EXECUTE FUNCTION retail.hierarchy_search_vector_trigger();
+
+-- Backfill existing rows
+UPDATE retail.product p
+SET search_vector = retail.product_search_document(
+    p.product_name, p.brand_name, p.product_type, p.product_description,
+    p.metadata::jsonb, p.hierarchy_id
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_search ON retail.product USING GIN (search_vector);
+
+ANALYZE retail.product;
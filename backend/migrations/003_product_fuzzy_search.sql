@@ -0,0 +1,11 @@
+-- Trigram indexes for typo-tolerant product name and brand lookup
+--
+-- agents/catalog_search.py falls back to word-similarity matching
+-- ('sneekers' <% product_name) when full-text search finds nothing; these
+-- GIN indexes keep that lookup index-backed. The operator uses the server's
+-- pg_trgm.word_similarity_threshold (default 0.6) as its index cut-off.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_product_name_trgm ON retail.product USING GIN (product_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_product_brand_trgm ON retail.product USING GIN (brand_name gin_trgm_ops);
@@ -0,0 +1,9 @@
+-- Content hashes for the embedding columns
+--
+-- scripts/generate_embeddings.py stores md5(embedder name + embedded text)
+-- next to each vector and only re-embeds rows whose hash no longer matches,
+-- i.e. rows never embedded, edited since, or embedded by another model.
+
+ALTER TABLE retail.product ADD COLUMN IF NOT EXISTS embedding_hash TEXT;
+ALTER TABLE retail.review ADD COLUMN IF NOT EXISTS embedding_hash TEXT;
+ALTER TABLE retail.style_profile ADD COLUMN IF NOT EXISTS embedding_hash TEXT;
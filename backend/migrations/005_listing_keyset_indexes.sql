@@ -0,0 +1,19 @@
+-- Indexes for keyset (cursor) pagination of the listing endpoints
+--
+-- Each listing pages on (sort key, id) within its filter column, so the
+-- next page is an index range scan starting after the cursor row instead
+-- of reading and discarding every row before it (pagination.py).
+-- Products page on product_id alone, which the primary key covers.
+
+CREATE INDEX IF NOT EXISTS idx_review_product_created
+    ON retail.review (product_id, created_at DESC, review_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_order_customer_date
+    ON retail."order" (customer_id, order_date DESC, order_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_return_request_order_requested
+    ON retail.return_request (order_id, requested_date DESC, return_id DESC);
+
+-- Leading columns of the indexes above
+DROP INDEX IF EXISTS retail.idx_review_product;
+DROP INDEX IF EXISTS retail.idx_order_customer;
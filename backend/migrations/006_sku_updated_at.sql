@@ -0,0 +1,23 @@
+-- Keep sku.updated_at current on every update, and index it
+--
+-- The in-memory attribute index (agents/attribute_index.py) picks up SKU
+-- changes by polling updated_at. database/init.sql stamps it with the
+-- update_sku_updated_at trigger, but databases created by the startup
+-- create_all or scripts/load_data.py have no trigger, and inventory or
+-- status updates written in plain SQL would go unseen. The same function
+-- and trigger are (re)created here, so every path ends up identical, and an
+-- index keeps the poll a short range scan.
+
+CREATE OR REPLACE FUNCTION public.update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_sku_updated_at ON retail.sku;
+CREATE TRIGGER update_sku_updated_at BEFORE UPDATE ON retail.sku
+    FOR EACH ROW EXECUTE FUNCTION public.update_updated_at_column();
+
+CREATE INDEX IF NOT EXISTS idx_sku_updated_at ON retail.sku (updated_at);
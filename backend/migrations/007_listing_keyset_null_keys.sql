@@ -0,0 +1,24 @@
+-- Keyset pagination over nullable sort keys
+--
+-- review.created_at, order.order_date and return_request.requested_date
+-- are nullable. pagination.py compares them as coalesce(key, '-infinity'),
+-- so rows without a date sort last and their cursors stay valid; the
+-- listing indexes from 005 are rebuilt on that expression so the next page
+-- is still a range scan.
+--
+-- Returns are listed across all of a customer's orders, which no index on
+-- return_request can order; the (order_id, requested_date, return_id)
+-- index only ever served the join, so it becomes a plain order_id index.
+
+CREATE INDEX IF NOT EXISTS idx_review_product_created_key
+    ON retail.review (product_id, coalesce(created_at, '-infinity'::timestamp) DESC, review_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_order_customer_date_key
+    ON retail."order" (customer_id, coalesce(order_date, '-infinity'::timestamp) DESC, order_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_return_request_order
+    ON retail.return_request (order_id);
+
+DROP INDEX IF EXISTS retail.idx_review_product_created;
+DROP INDEX IF EXISTS retail.idx_order_customer_date;
+DROP INDEX IF EXISTS retail.idx_return_request_order_requested;
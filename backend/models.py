@@ -5,10 +5,11 @@ Following DDD conventions and Oracle RDM standards
 
 from sqlalchemy import (
     Column, Integer, String, Text, Numeric, Boolean, 
-    Date, DateTime, ForeignKey, JSON, ARRAY, CheckConstraint
+    Date, DateTime, ForeignKey, JSON, ARRAY, CheckConstraint, Index, text
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
 from datetime import datetime
@@ -49,8 +50,12 @@ class Product(Base):
     season = Column(String(50))
     year = Column(Integer)
     status = Column(String(50), default='ACTIVE')
-    embedding = Column(Vector(1536))  # OpenAI ada-002
+    # Deferred: loaded only on access (or with undefer_group("embedding")); queries use the column
+    embedding = deferred(Column(Vector(1536)), group="embedding")  # OpenAI ada-002
+    embedding_hash = deferred(Column(Text), group="embedding")  # md5 of embedder + embedded text (scripts/generate_embeddings.py)
     product_metadata = Column('metadata', JSON)  # Using 'metadata' as column name, 'product_metadata' as attribute
+    # Weighted full-text document, set by trigger (migrations/002_product_search.sql)
+    search_vector = deferred(Column(TSVECTOR))
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -145,7 +150,8 @@ class StyleProfile(Base):
     price_range_max = Column(Numeric(10, 2))
     brand_preferences = Column(ARRAY(Text))
     occasion_preferences = Column(ARRAY(Text))
-    embedding = Column(Vector(1536))
+    embedding = deferred(Column(Vector(1536)), group="embedding")
+    embedding_hash = deferred(Column(Text), group="embedding")
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -188,7 +194,8 @@ class Review(Base):
     review_text = Column(Text)
     verified_purchase = Column(Boolean, default=False)
     helpful_count = Column(Integer, default=0)
-    embedding = Column(Vector(1536))
+    embedding = deferred(Column(Vector(1536)), group="embedding")
+    embedding_hash = deferred(Column(Text), group="embedding")
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -269,3 +276,50 @@ class ReturnRequest(Base):
     order = relationship("Order", back_populates="return_requests")
     line_item = relationship("OrderLineItem", back_populates="return_requests")
 
+
+class ProductSummary(Base):
+    """Denormalized per-product price, rating, sales and return figures
+
+    Maintained by the triggers in migrations/001_product_summary.sql;
+    rebuilt in full by scripts/rebuild_product_summary.py.
+    """
+    __tablename__ = "product_summary"
+    __table_args__ = (
+        Index('idx_product_summary_trending', text('units_sold_30d DESC'), text('units_sold_total DESC')),
+        {'schema': 'retail'}
+    )
+
+    product_id = Column(Integer, ForeignKey('retail.product.product_id', ondelete='CASCADE'), primary_key=True)
+    price_min = Column(Numeric(10, 2))  # Active SKUs only
+    price_max = Column(Numeric(10, 2))
+    active_sku_count = Column(Integer, nullable=False, server_default=text('0'))
+    in_stock = Column(Boolean, nullable=False, server_default=text('false'))
+    rating_count = Column(Integer, nullable=False, server_default=text('0'))
+    rating_sum = Column(Integer, nullable=False, server_default=text('0'))
+    rating_1 = Column(Integer, nullable=False, server_default=text('0'))
+    rating_2 = Column(Integer, nullable=False, server_default=text('0'))
+    rating_3 = Column(Integer, nullable=False, server_default=text('0'))
+    rating_4 = Column(Integer, nullable=False, server_default=text('0'))
+    rating_5 = Column(Integer, nullable=False, server_default=text('0'))
+    units_sold_7d = Column(Integer, nullable=False, server_default=text('0'))
+    units_sold_30d = Column(Integer, nullable=False, server_default=text('0'))
+    units_sold_total = Column(Integer, nullable=False, server_default=text('0'))
+    return_count = Column(Integer, nullable=False, server_default=text('0'))
+    updated_at = Column(DateTime, server_default=func.now())
+
+    @property
+    def rating_avg(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+
+class ProductSalesDaily(Base):
+    """Units sold per product per day; source of the rolling sales windows"""
+    __tablename__ = "product_sales_daily"
+    __table_args__ = (
+        Index('idx_product_sales_daily_date', 'sales_date'),
+        {'schema': 'retail'}
+    )
+
+    product_id = Column(Integer, ForeignKey('retail.product.product_id', ondelete='CASCADE'), primary_key=True)
+    sales_date = Column(Date, primary_key=True)
+    units = Column(Integer, nullable=False, server_default=text('0'))
@@ -0,0 +1,137 @@
+"""
+Keyset (cursor) pagination for list endpoints
+
+A listing is ordered by (sort key, id). Each page ends with an opaque
+cursor holding the last row's values; the next page continues with
+`WHERE (sort key, id) < (cursor values)`. For products, reviews and
+orders the matching composite index answers that as a range scan
+(migrations/007_listing_keyset_null_keys.sql), so page N costs the same as
+page 1. Returns are listed across a customer's orders, so they are sorted
+per request; a customer's returns are few. Either way, rows inserted
+meanwhile do not shift later pages.
+
+Nullable sort keys are compared as coalesce(key, '-infinity'): rows
+without a date sort last (newest first) and their cursors stay valid.
+
+Endpoints return the cursor in the X-Next-Cursor header, set only when
+another page follows. `skip` keeps working as an offset after the cursor
+position for older clients.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, func, literal_column, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Order, Product, ReturnRequest, Review
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 20
+
+# What a NULL sort key is compared as, by type (the expression indexes use the same)
+_LOWEST = {datetime: "'-infinity'::timestamp", date: "'-infinity'::date"}
+
+
+class Keyset:
+    """Sort order of a listing: sort columns, the last one unique"""
+
+    def __init__(self, name: str, *columns, descending: bool = True):
+        self.name = name
+        self.columns = columns
+        self.descending = descending
+        self.keys = [func.coalesce(c, _lowest(c)) if _nullable(c) else c for c in columns]
+
+    def order(self, query: Select) -> Select:
+        return query.order_by(*[k.desc() if self.descending else k.asc() for k in self.keys])
+
+    def after(self, query: Select, cursor: str) -> Select:
+        """Rows after the cursor position"""
+        values = self.decode(cursor)
+        position = tuple_(*self.keys)
+        return query.where(position < tuple_(*values) if self.descending else position > tuple_(*values))
+
+    def encode(self, row: Any) -> str:
+        values = [_to_json(getattr(row, c.key)) for c in self.columns]
+        payload = json.dumps({"k": self.name, "v": values}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> List[Any]:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if payload.get("k") != self.name or len(payload["v"]) != len(self.columns):
+                raise ValueError("cursor belongs to another listing")
+            return [_from_json(value, c) for value, c in zip(payload["v"], self.columns)]
+        except (binascii.Error, AttributeError, KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _nullable(column) -> bool:
+    return column.property.columns[0].nullable
+
+
+def _lowest(column):
+    return literal_column(_LOWEST[column.type.python_type])
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _from_json(value: Any, column) -> Any:
+    """Cursor value as a query parameter (a NULL key as the value it sorts as)"""
+    if value is None:
+        if not _nullable(column):
+            raise ValueError("cursor rows need a sort key")
+        return _lowest(column)
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+PRODUCT_KEYSET = Keyset("product", Product.product_id, descending=False)
+REVIEW_KEYSET = Keyset("review", Review.created_at, Review.review_id)
+ORDER_KEYSET = Keyset("order", Order.order_date, Order.order_id)
+RETURN_KEYSET = Keyset("return", ReturnRequest.requested_date, ReturnRequest.return_id)
+
+
+async def fetch_page(
+    db: AsyncSession,
+    query: Select,
+    keyset: Keyset,
+    response: Response,
+    limit: Optional[int] = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Sequence[Any]:
+    """One page of `query` in keyset order; sets X-Next-Cursor when more rows follow
+
+    limit=None without a cursor returns every row (unpaginated listings).
+    """
+    query = keyset.order(query)
+    if cursor:
+        query = keyset.after(query, cursor)
+        limit = limit or DEFAULT_PAGE_SIZE
+    if skip:
+        query = query.offset(skip)
+    if limit is None:
+        return (await db.execute(query)).scalars().all()
+
+    # One extra row tells whether there is a next page
+    rows = (await db.execute(query.limit(limit + 1))).scalars().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = keyset.encode(rows[-1])
+    return rows
@@ -219,16 +219,30 @@ class ProductSearchRequest(BaseModel):
     offset: int = 0
 
 
+class ProductSearchResponse(BaseModel):
+    products: List[ProductResponse]
+    # Counts per facet over the matches (null while the facet index is disabled or not built)
+    facets: Optional[Dict[str, Any]] = None
+
+
 class VectorSearchRequest(BaseModel):
-    query_embedding: List[float]
-    limit: int = 20
-    threshold: float = 0.7
+    query_embedding: Optional[List[float]] = None
+    query: Optional[str] = None  # embedded server-side when query_embedding is not given
+    limit: int = Field(20, ge=1, le=100)
+    threshold: float = 0.7  # minimum cosine similarity
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+
+
+class VectorSearchResult(ProductResponse):
+    similarity: float
 
 
 # Agent Schemas
 class AgentRequest(BaseModel):
     message: str
     customer_id: Optional[int] = None
+    session_id: Optional[str] = Field(None, max_length=128)
     context: Optional[Dict[str, Any]] = None
 
 
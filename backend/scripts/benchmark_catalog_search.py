@@ -0,0 +1,130 @@
+"""
+Benchmark catalog keyword search: ilike scans vs full-text search
+
+Inflates the catalog to --products rows with products from the synthetic
+data generator, inside a transaction that is rolled back afterwards, so the
+database is left untouched. Then, for each search term, times the previous
+ilike query on name/description/brand and the weighted tsvector query from
+agents.catalog_search (GIN index + ts_rank), and reports whether the
+full-text plan used the index.
+
+Requires the migrations (python migrate.py) in DATABASE_URL.
+
+Usage:
+    python scripts/benchmark_catalog_search.py --products 1000000
+    python scripts/benchmark_catalog_search.py --products 100000 --terms dress "dress shoes" wedding
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from sqlalchemy import func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from agents.catalog_search import apply_keyword_search
+from models import Product
+from scripts.generate_synthetic_data import generate_products
+
+DEFAULT_TERMS = ["dress", "StyleCo jackets", "wedding", '"dress shoes" -loafers', "formal maxi", "xylophone"]
+COPY_COLUMNS = ["product_id", "product_name", "product_description", "brand_name", "hierarchy_id",
+                "product_type", "gender", "season", "year", "status", "metadata"]
+
+
+async def inflate_catalog(db: AsyncSession, target: int, chunk: int = 50_000) -> int:
+    """COPY synthetic products in until the catalog holds `target` rows; returns rows added"""
+    existing = await db.scalar(select(func.count(Product.product_id)))
+    next_id = (await db.scalar(select(func.max(Product.product_id)))) or 0
+    raw = (await (await db.connection()).get_raw_connection()).driver_connection
+    added = 0
+    while existing + added < target:
+        batch = generate_products(min(chunk, target - existing - added))
+        records = []
+        for product in batch:
+            next_id += 1
+            product["product_id"] = next_id
+            product["metadata"] = json.dumps(product["metadata"])
+            records.append(tuple(product[c] for c in COPY_COLUMNS))
+        # COPY fires the row trigger that builds search_vector
+        await raw.copy_records_to_table("product", schema_name="retail", columns=COPY_COLUMNS, records=records)
+        added += len(records)
+        print(f"  ... {existing + added:,} products", flush=True)
+    return added
+
+
+def legacy_query(term: str):
+    pattern = f"%{term}%"
+    return select(Product).where(
+        or_(
+            Product.product_name.ilike(pattern),
+            Product.product_description.ilike(pattern),
+            Product.brand_name.ilike(pattern)
+        ),
+        Product.status == "ACTIVE"
+    ).limit(20)
+
+
+def fulltext_query(term: str):
+    return apply_keyword_search(select(Product).where(Product.status == "ACTIVE"), term).limit(20)
+
+
+async def time_query(db: AsyncSession, query, repeats: int) -> tuple:
+    """Median and p99 in ms, plus the row count of the last run"""
+    timings: List[float] = []
+    rows = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = len((await db.execute(query)).all())
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(timings)), float(np.percentile(timings, 99)), rows
+
+
+async def uses_index(db: AsyncSession, query) -> bool:
+    compiled = query.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = "\n".join((await db.execute(text(f"EXPLAIN {compiled}"))).scalars().all())
+    return "idx_product_search" in plan
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark ilike vs full-text catalog search")
+    parser.add_argument("--products", type=int, default=1_000_000, help="catalog size to benchmark at")
+    parser.add_argument("--terms", nargs="+", default=DEFAULT_TERMS)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    from database import async_engine
+
+    async with async_engine.connect() as conn:
+        outer = await conn.begin()
+        db = AsyncSession(bind=conn, expire_on_commit=False)
+
+        print(f"Inflating catalog to {args.products:,} products (rolled back afterwards)")
+        start = time.perf_counter()
+        added = await inflate_catalog(db, args.products)
+        await db.execute(text("ANALYZE retail.product"))
+        print(f"Added {added:,} products in {time.perf_counter() - start:.1f}s\n")
+
+        print(f"{'term':<26} | {'ilike p50':>9} {'p99':>8} {'rows':>4} | "
+              f"{'fts p50':>8} {'p99':>8} {'rows':>4} {'gin':>4}")
+        for term in args.terms:
+            legacy = await time_query(db, legacy_query(term), args.repeats)
+            fts = await time_query(db, fulltext_query(term), args.repeats)
+            gin = await uses_index(db, fulltext_query(term))
+            print(f"{term[:26]:<26} | {legacy[0]:>7.1f}ms {legacy[1]:>6.1f}ms {legacy[2]:>4} | "
+                  f"{fts[0]:>6.1f}ms {fts[1]:>6.1f}ms {fts[2]:>4} {'yes' if gin else 'no':>4}")
+
+        await db.close()
+        await outer.rollback()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""
+Benchmark LLM client concurrency against a local fake LLM server
+
+Starts an OpenAI-compatible HTTP server on localhost that answers every chat
+completion after a fixed delay, then drives it at increasing concurrency with:
+
+- threaded: the previous approach, a synchronous SDK client wrapped in
+  asyncio.to_thread (bounded by the default executor's thread count)
+- async:    OpenAIProvider on the shared pooled httpx.AsyncClient
+
+No API key or network access is needed.
+
+Usage:
+    python scripts/benchmark_llm_concurrency.py --latency 0.2 --levels 1 8 32 64 128
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+
+def start_fake_llm_server(latency: float) -> ThreadingHTTPServer:
+    """Serve canned chat completions after `latency` seconds on a free port"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "fake-model",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "search"},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11}
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_level(call: Callable[[], Awaitable[str]], concurrency: int, requests: int) -> dict:
+    """Issue `requests` calls with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000.0
+    return {
+        "rps": requests / elapsed,
+        "p50": float(np.percentile(ms, 50)),
+        "p99": float(np.percentile(ms, 99)),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark LLM client concurrency")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM latency in seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 64, 128])
+    parser.add_argument("--requests-per-level", type=int, default=4,
+                        help="requests issued per level, as a multiple of the concurrency")
+    args = parser.parse_args()
+
+    server = start_fake_llm_server(args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    messages = [{"role": "user", "content": "route this message"}]
+
+    from openai import OpenAI
+    from llm_provider import OpenAIProvider, close_http_client
+
+    sync_client = OpenAI(api_key="bench", base_url=base_url)
+    provider = OpenAIProvider(api_key="bench", base_url=base_url)
+
+    async def threaded_call() -> str:
+        response = await asyncio.to_thread(
+            sync_client.chat.completions.create, model="fake-model", messages=messages
+        )
+        return response.choices[0].message.content
+
+    async def async_call() -> str:
+        return await provider.chat_completion(messages, model="fake-model")
+
+    print(f"Fake LLM latency: {args.latency * 1000:.0f}ms\n")
+    print(f"{'concurrency':>11} | {'threaded rps':>12} {'p50':>8} {'p99':>8} | "
+          f"{'async rps':>10} {'p50':>8} {'p99':>8}")
+    for level in args.levels:
+        total = level * args.requests_per_level
+        threaded = await run_level(threaded_call, level, total)
+        pooled = await run_level(async_call, level, total)
+        print(f"{level:>11} | {threaded['rps']:>12.1f} {threaded['p50']:>7.0f}ms {threaded['p99']:>7.0f}ms | "
+              f"{pooled['rps']:>10.1f} {pooled['p50']:>7.0f}ms {pooled['p99']:>7.0f}ms")
+
+    await close_http_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+"""
+Benchmark customer recommendation candidate selection against order history size
+
+Compares the previous per-order / per-line-item lookup loop with the single
+CTE query in PostPurchaseRecommenderAgent._select_customer_candidates. For
+each history size a synthetic customer with that many completed orders is
+inserted inside a transaction that is rolled back afterwards, so the
+database is left untouched. Both paths are checked to pick the same
+candidates, and statements are counted per call.
+
+Requires a loaded catalog (scripts/load_data.py) in DATABASE_URL.
+
+Usage:
+    python scripts/benchmark_recommendations.py --orders 1 5 10 --items-per-order 3
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from sqlalchemy import desc, event, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from agents.recommender_agent import PostPurchaseRecommenderAgent
+from models import Customer, Order, OrderLineItem, Product, ProductVariant, SKU
+
+
+async def legacy_candidates(db: AsyncSession, customer_id: int, limit: int = 10) -> List[Product]:
+    """The previous N+1 implementation, kept here for comparison"""
+    orders = (await db.execute(select(Order).where(
+        Order.customer_id == customer_id,
+        Order.order_status == "COMPLETED"
+    ).order_by(desc(Order.order_date)).limit(10))).scalars().all()
+
+    product_ids = set()
+    for order in orders:
+        line_items = (await db.execute(select(OrderLineItem).where(
+            OrderLineItem.order_id == order.order_id
+        ))).scalars().all()
+        for item in line_items:
+            sku = (await db.execute(select(SKU).where(SKU.sku_id == item.sku_id))).scalar()
+            if sku:
+                variant = (await db.execute(select(ProductVariant).where(
+                    ProductVariant.variant_id == sku.variant_id
+                ))).scalar()
+                if variant:
+                    product_ids.add(variant.product_id)
+
+    if not product_ids:
+        return []
+    purchased = (await db.execute(select(Product).where(
+        Product.product_id.in_(list(product_ids))
+    ))).scalars().all()
+    return list((await db.execute(select(Product).where(
+        Product.product_id.notin_(list(product_ids)),
+        Product.status == "ACTIVE",
+        (Product.hierarchy_id.in_([p.hierarchy_id for p in purchased])) |
+        (Product.brand_name.in_([p.brand_name for p in purchased]))
+    ).limit(limit))).scalars().all())
+
+
+async def seed_history(db: AsyncSession, sku_ids: List[int], orders: int,
+                       items_per_order: int, rng: random.Random) -> int:
+    """Insert a customer with `orders` completed orders; returns the customer id"""
+    customer = Customer(email=f"bench-{uuid.uuid4().hex}@example.com",
+                        first_name="Bench", last_name="Customer")
+    db.add(customer)
+    await db.flush()
+    now = datetime.now()
+    for n in range(orders):
+        order = Order(customer_id=customer.customer_id, order_number=f"BENCH-{uuid.uuid4().hex[:12]}",
+                      order_status="COMPLETED", order_date=now - timedelta(days=n),
+                      subtotal=0, tax_amount=0, shipping_amount=0, total_amount=0)
+        db.add(order)
+        await db.flush()
+        for sku_id in rng.sample(sku_ids, min(items_per_order, len(sku_ids))):
+            db.add(OrderLineItem(order_id=order.order_id, sku_id=sku_id, quantity=1,
+                                 unit_price=0, line_total=0))
+    await db.flush()
+    return customer.customer_id
+
+
+async def run_benchmark(engine: AsyncEngine, order_levels: List[int], items_per_order: int,
+                        repeats: int, seed: int = 42) -> None:
+    statements = {"count": 0}
+
+    def count_statement(*args):
+        statements["count"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+    agent = PostPurchaseRecommenderAgent()
+    rng = random.Random(seed)
+
+    print(f"{'orders':>6} {'lines':>6} | {'legacy ms':>10} {'queries':>8} | "
+          f"{'cte ms':>8} {'queries':>8} | same")
+    async with engine.connect() as conn:
+        outer = await conn.begin()
+        db = AsyncSession(bind=conn, expire_on_commit=False)
+        sku_ids = list((await db.execute(
+            select(SKU.sku_id).where(SKU.status == "ACTIVE").order_by(func.random()).limit(500)
+        )).scalars().all())
+        if not sku_ids:
+            print("No active SKUs found; load the catalog first (scripts/load_data.py)")
+            await outer.rollback()
+            return
+
+        for orders in order_levels:
+            customer_id = await seed_history(db, sku_ids, orders, items_per_order, rng)
+            results = {}
+            for name, select_candidates in (
+                ("legacy", lambda: legacy_candidates(db, customer_id)),
+                ("cte", lambda: agent._select_customer_candidates(db, customer_id)),
+            ):
+                timings = []
+                for _ in range(repeats):
+                    db.expunge_all()
+                    statements["count"] = 0
+                    start = time.perf_counter()
+                    await select_candidates()
+                    timings.append((time.perf_counter() - start) * 1000.0)
+                results[name] = (float(np.median(timings)), statements["count"])
+            # Compare full candidate sets; the timed calls are LIMITed without an ORDER BY
+            same = ({p.product_id for p in await legacy_candidates(db, customer_id, limit=100000)} ==
+                    {p.product_id for p in await agent._select_customer_candidates(db, customer_id, limit=100000)})
+            legacy, cte = results["legacy"], results["cte"]
+            print(f"{orders:>6} {orders * items_per_order:>6} | {legacy[0]:>10.1f} {legacy[1]:>8} | "
+                  f"{cte[0]:>8.1f} {cte[1]:>8} | {same}")
+
+        await db.close()
+        await outer.rollback()
+    event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark customer recommendation queries")
+    parser.add_argument("--orders", type=int, nargs="+", default=[1, 2, 5, 10, 20])
+    parser.add_argument("--items-per-order", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    from database import async_engine
+    await run_benchmark(async_engine, args.orders, args.items_per_order, args.repeats)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
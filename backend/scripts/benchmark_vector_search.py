@@ -0,0 +1,202 @@
+"""
+Benchmark pgvector indexes: recall@k against exact search, QPS and latency
+
+For each source table (product, review) and scale, fills a scratch table
+with that many vectors: the table's real embeddings, then perturbed copies
+of them beyond the real row count. Exact top-k similarities for a set of
+perturbed query vectors are computed in numpy while loading. Then, for each
+index configuration (HNSW m/ef_construction, ivfflat lists), it builds the
+index with vector_index.build_vector_index and, for each ef_search or
+probes value, reports recall@k, queries per second and p50/p99 latency.
+The scratch table is dropped afterwards.
+
+Requires embeddings (python scripts/generate_embeddings.py).
+
+Usage:
+    python scripts/benchmark_vector_search.py
+    python scripts/benchmark_vector_search.py --sources product --scales 10000 100000 1000000
+    python scripts/benchmark_vector_search.py --hnsw 16:64 32:128 --ef-search 20 40 100 --ivfflat-lists 0 --probes 1 10 30
+    python scripts/benchmark_vector_search.py --concurrency 8 --queries 500 --k 20
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from pgvector.asyncpg import register_vector
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database import async_engine
+from embeddings import EMBEDDING_DIMENSIONS
+from vector_index import build_vector_index, describe_index, ivfflat_lists
+
+BENCH_TABLE = "vector_benchmark"
+BENCH_INDEX = "idx_vector_benchmark"
+KNN_SQL = f"SELECT id, embedding <=> $1 AS distance FROM retail.{BENCH_TABLE} ORDER BY 2 LIMIT $2"
+
+
+def perturb(vectors: np.ndarray, noise: float, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors near `vectors`; noise is relative to a unit vector's per-component scale"""
+    scale = noise / np.sqrt(vectors.shape[1])
+    out = vectors + rng.normal(0.0, scale, vectors.shape).astype(np.float32)
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+async def load_scratch_table(conn, base: np.ndarray, queries: np.ndarray, scale: int, k: int,
+                             noise: float, rng: np.random.Generator, chunk: int = 20_000) -> np.ndarray:
+    """Fill the scratch table with `scale` vectors; returns each query's exact k-th best similarity"""
+    await conn.execute(f"DROP TABLE IF EXISTS retail.{BENCH_TABLE}")
+    await conn.execute(
+        f"CREATE UNLOGGED TABLE retail.{BENCH_TABLE} (id INTEGER PRIMARY KEY, embedding vector({EMBEDDING_DIMENSIONS}))"
+    )
+    best_sims = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, scale, chunk):
+        ids = np.arange(start, min(start + chunk, scale))
+        vectors = base[ids % len(base)]
+        copies = ids >= len(base)
+        if copies.any():
+            vectors = vectors.copy()
+            vectors[copies] = perturb(vectors[copies], noise, rng)
+        await conn.copy_records_to_table(
+            BENCH_TABLE, schema_name="retail", columns=["id", "embedding"],
+            records=[(int(i), v) for i, v in zip(ids, vectors)]
+        )
+        # Running exact top-k similarities (cosine similarity on unit vectors)
+        sims = queries @ (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).T
+        best_sims = -np.sort(-np.concatenate([best_sims, sims], axis=1), axis=1)[:, :k]
+    await conn.execute(f"ANALYZE retail.{BENCH_TABLE}")
+    return best_sims[:, -1]
+
+
+async def run_queries(conns, queries: np.ndarray, kth_similarity: np.ndarray, k: int,
+                      settings: Dict[str, object]) -> Tuple[float, float, float, float]:
+    """Recall@k, QPS, p50 and p99 ms with the queries spread over the connections
+
+    A hit counts when it is at least as similar as the exact k-th neighbour,
+    so duplicate vectors (identical reviews) do not make ties look like misses.
+    """
+    for conn in conns:
+        for name, value in settings.items():
+            await conn.execute(f"SET {name} = '{value}'")
+        await conn.fetch(KNN_SQL, queries[0], k)  # warm-up
+    latencies: List[float] = []
+    recalls: List[float] = []
+
+    async def worker(conn, indexes) -> None:
+        for i in indexes:
+            start = time.perf_counter()
+            rows = await conn.fetch(KNN_SQL, queries[i], k)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            hits = sum(1 for row in rows if 1.0 - row["distance"] >= kth_similarity[i] - 1e-5)
+            recalls.append(hits / k)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        worker(conn, range(n, len(queries), len(conns))) for n, conn in enumerate(conns)
+    ])
+    elapsed = time.perf_counter() - start
+    for conn in conns:
+        await conn.execute("RESET ALL")
+    return (float(np.mean(recalls)), len(queries) / elapsed,
+            float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99)))
+
+
+def print_row(label: str, build: str, size: str, search: str, result) -> None:
+    recall, qps, p50, p99 = result
+    print(f"  {label:<30} {build:>8} {size:>8} | {search:<14} {recall:>6.3f} {qps:>8.1f} "
+          f"{p50:>7.2f}ms {p99:>7.2f}ms", flush=True)
+
+
+async def benchmark_scale(conns, source: str, base: np.ndarray, scale: int, args, rng) -> None:
+    queries = perturb(base[rng.integers(0, len(base), args.queries)], args.noise, rng)
+    print(f"\n{source} @ {scale:,} vectors ({len(base):,} real), k={args.k}, "
+          f"{args.queries} queries, concurrency {len(conns)}")
+    start = time.perf_counter()
+    kth_similarity = await load_scratch_table(conns[0], base, queries, scale, args.k, args.noise, rng)
+    print(f"  loaded in {time.perf_counter() - start:.1f}s")
+    print(f"  {'index':<30} {'build':>8} {'size':>8} | {'search':<14} {'recall':>6} {'QPS':>8} "
+          f"{'p50':>9} {'p99':>9}")
+
+    if not args.skip_exact:
+        exact = await run_queries(conns, queries[:args.exact_queries], kth_similarity[:args.exact_queries],
+                                  args.k, {"enable_indexscan": "off"})
+        print_row("exact (sequential scan)", "-", "-", "-", exact)
+
+    configs = [("hnsw", {"m": m, "ef_construction": ef}) for m, ef in args.hnsw]
+    configs += [("ivfflat", {"lists": lists or ivfflat_lists(scale)}) for lists in args.ivfflat_lists]
+    for method, options in configs:
+        build_seconds = await build_vector_index(conns[0], BENCH_TABLE, BENCH_INDEX, method, options)
+        size_mb = (await describe_index(conns[0], BENCH_INDEX))["bytes"] / 2**20
+        label = f"{method} " + " ".join(f"{k}={v}" for k, v in options.items())
+        if method == "hnsw":
+            sweep = [("hnsw.ef_search", value) for value in args.ef_search]
+        else:
+            sweep = [("ivfflat.probes", value) for value in args.probes if value <= options["lists"]]
+        for name, value in sweep:
+            # Timed through the index even where the planner would rather scan
+            result = await run_queries(conns, queries, kth_similarity, args.k,
+                                       {name: value, "enable_seqscan": "off"})
+            print_row(label, f"{build_seconds:.1f}s", f"{size_mb:.0f}MB", f"{name.split('.')[1]}={value}", result)
+            label = ""
+        await conns[0].execute(f"DROP INDEX retail.{BENCH_INDEX}")
+
+
+def hnsw_config(value: str) -> Tuple[int, int]:
+    m, _, ef_construction = value.partition(":")
+    return int(m), int(ef_construction or 64)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark pgvector index recall, QPS and latency")
+    parser.add_argument("--sources", nargs="+", choices=["product", "review"], default=["product", "review"])
+    parser.add_argument("--scales", nargs="+", type=int, default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--hnsw", nargs="*", type=hnsw_config, default=[(16, 64), (32, 128)],
+                        metavar="M:EF_CONSTRUCTION")
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[20, 40, 100, 200])
+    parser.add_argument("--ivfflat-lists", nargs="*", type=int, default=[0],
+                        help="list counts to try, 0 = sized from the scale")
+    parser.add_argument("--probes", nargs="+", type=int, default=[1, 5, 10, 30])
+    parser.add_argument("--noise", type=float, default=0.5,
+                        help="perturbation of copied and query vectors")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--exact-queries", type=int, default=50, help="queries timed without an index")
+    parser.add_argument("--skip-exact", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    sa_conns = [await async_engine.connect() for _ in range(max(1, args.concurrency))]
+    conns = []
+    for sa_conn in sa_conns:
+        raw = (await sa_conn.get_raw_connection()).driver_connection
+        await register_vector(raw)
+        conns.append(raw)
+
+    try:
+        for source in args.sources:
+            rows = await conns[0].fetch(f"SELECT embedding FROM retail.{source} WHERE embedding IS NOT NULL")
+            if not rows:
+                print(f"No {source} embeddings; run scripts/generate_embeddings.py first")
+                continue
+            base = np.stack([row["embedding"] for row in rows]).astype(np.float32)
+            for scale in args.scales:
+                await benchmark_scale(conns, source, base, scale, args, rng)
+    finally:
+        await conns[0].execute(f"DROP TABLE IF EXISTS retail.{BENCH_TABLE}")
+        for sa_conn in sa_conns:
+            # Connections carry the binary vector codec; do not pool them
+            await sa_conn.invalidate()
+            await sa_conn.close()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
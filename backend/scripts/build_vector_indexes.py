@@ -0,0 +1,61 @@
+"""
+Build or retrain the pgvector indexes on the embedding columns
+
+Builds an HNSW (default) or ivfflat index per table with the parameters
+from config or the command line, skipping indexes that already match (see
+vector_index.py). Run it after loading or embedding data;
+scripts/generate_embeddings.py does so itself.
+
+Usage:
+    python scripts/build_vector_indexes.py
+    python scripts/build_vector_indexes.py --method ivfflat --tables product
+    python scripts/build_vector_indexes.py --method hnsw --m 24 --ef-construction 128 --force
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import Config
+from database import async_engine
+from vector_index import VECTOR_INDEXES, ensure_vector_indexes
+
+
+def print_results(results) -> None:
+    for result in results:
+        options = ", ".join(f"{k}={v}" for k, v in result["options"].items())
+        if result["action"] == "built":
+            print(f"✓ {result['index']}: built {result['method']} ({options}) over "
+                  f"{result['rows']:,} vectors in {result['seconds']:.1f}s [{result['reason']}]")
+        elif result["action"] == "skipped":
+            print(f"- {result['index']}: skipped, {result['reason']}")
+        else:
+            print(f"✓ {result['index']}: up to date ({result['method']}, {options})")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Build pgvector indexes on the embedding columns")
+    parser.add_argument("--tables", nargs="+", choices=list(VECTOR_INDEXES), default=list(VECTOR_INDEXES))
+    parser.add_argument("--method", choices=["hnsw", "ivfflat"], default=Config.VECTOR_INDEX_TYPE)
+    parser.add_argument("--m", type=int, help="HNSW graph degree")
+    parser.add_argument("--ef-construction", type=int, help="HNSW build candidate list size")
+    parser.add_argument("--lists", type=int, help="ivfflat list count (default: from row count)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the index matches")
+    args = parser.parse_args()
+
+    async with async_engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        results = await ensure_vector_indexes(
+            raw, args.tables, method=args.method, force=args.force,
+            m=args.m, ef_construction=args.ef_construction, lists=args.lists
+        )
+    await async_engine.dispose()
+    print_results(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
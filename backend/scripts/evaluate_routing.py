@@ -0,0 +1,141 @@
+"""
+Offline evaluation of agent routing
+
+Compares the local intent classifier, the hybrid router used in production
+(classifier with LLM fallback below the confidence threshold) and the pure LLM
+router on a held-out labeled set. Reports accuracy, p50/p99 routing latency
+and how many LLM routing calls each strategy makes.
+
+Usage:
+    python scripts/evaluate_routing.py            # classifier only, no API calls
+    python scripts/evaluate_routing.py --llm      # also run hybrid and LLM routers
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Awaitable, List, Tuple
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import Config
+from agents.intent_classifier import IntentClassifier
+
+# Held-out utterances; none of these appear in TRAINING_EXAMPLES
+EVAL_EXAMPLES: List[Tuple[str, str]] = [
+    ("what would look good for a garden party", "stylist"),
+    ("how do i style white sneakers with a dress", "stylist"),
+    ("what should i wear to my cousin's graduation", "stylist"),
+    ("can i wear a denim jacket to the office", "stylist"),
+    ("which colors go well with olive pants", "stylist"),
+    ("tips to dress for a rainy day", "stylist"),
+    ("show me dresses under 50", "search"),
+    ("find a black leather belt", "search"),
+    ("do you have cashmere sweaters", "search"),
+    ("looking for womens ankle boots in size 8", "search"),
+    ("i need running shorts for men", "search"),
+    ("search for silk scarves", "search"),
+    ("show me anything from luxuryline", "search"),
+    ("create a vacation lookbook", "lookbook"),
+    ("put together 4 outfits for a weekend trip", "lookbook"),
+    ("build a formal lookbook in navy", "lookbook"),
+    ("make me a party lookbook", "lookbook"),
+    ("compose outfit combinations for date night", "lookbook"),
+    ("proceed to checkout", "checkout"),
+    ("is shipping free over 50", "checkout"),
+    ("do you take apple pay", "checkout"),
+    ("when does my order arrive", "checkout"),
+    ("place the order for my cart", "checkout"),
+    ("what is the status of my order", "checkout"),
+    ("i'd like to return these jeans", "returns"),
+    ("how do refunds work", "returns"),
+    ("can i swap this for a bigger size", "returns"),
+    ("track my return", "returns"),
+    ("this shirt came damaged", "returns"),
+    ("what is the return window", "returns"),
+    ("recommend shoes to go with my last purchase", "recommender"),
+    ("what's popular this week", "recommender"),
+    ("show me things similar to my jacket", "recommender"),
+    ("what should i buy next", "recommender"),
+    ("any recommendations for me", "recommender"),
+    ("what are people buying right now", "recommender"),
+]
+
+
+def percentile_ms(latencies: List[float], q: float) -> float:
+    """Percentile of latencies (seconds) in milliseconds"""
+    return float(np.percentile(np.array(latencies) * 1000.0, q)) if latencies else 0.0
+
+
+async def evaluate(name: str, route: Callable[[str], Awaitable[Tuple[str, bool]]]) -> None:
+    """Run one routing strategy over the eval set and print a summary line"""
+    correct = 0
+    llm_calls = 0
+    latencies: List[float] = []
+    misses: List[Tuple[str, str, str]] = []
+
+    for message, expected in EVAL_EXAMPLES:
+        start = time.perf_counter()
+        predicted, used_llm = await route(message)
+        latencies.append(time.perf_counter() - start)
+        llm_calls += int(used_llm)
+        if predicted == expected:
+            correct += 1
+        else:
+            misses.append((message, expected, predicted))
+
+    total = len(EVAL_EXAMPLES)
+    print(
+        f"{name:<12} accuracy={correct / total:6.1%}  "
+        f"p50={percentile_ms(latencies, 50):9.3f}ms  "
+        f"p99={percentile_ms(latencies, 99):9.3f}ms  "
+        f"llm_calls={llm_calls}/{total}"
+    )
+    for message, expected, predicted in misses:
+        print(f"    miss: {message!r} expected={expected} got={predicted}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate agent routing strategies")
+    parser.add_argument("--llm", action="store_true",
+                        help="also evaluate the LLM and hybrid routers (makes API calls)")
+    parser.add_argument("--threshold", type=float, default=Config.ROUTING_CONFIDENCE_THRESHOLD,
+                        help="classifier confidence threshold for the hybrid router")
+    args = parser.parse_args()
+
+    classifier = IntentClassifier()
+
+    async def route_classifier(message: str) -> Tuple[str, bool]:
+        agent_name, _ = classifier.classify(message)
+        return agent_name, False
+
+    print(f"Evaluating {len(EVAL_EXAMPLES)} held-out messages "
+          f"(hybrid threshold={args.threshold})\n")
+    await evaluate("classifier", route_classifier)
+
+    if not args.llm:
+        return
+
+    from agents.orchestrator import AgentOrchestrator
+    orchestrator = AgentOrchestrator()
+
+    async def route_llm(message: str) -> Tuple[str, bool]:
+        return await orchestrator._route_with_llm(message, {}), True
+
+    async def route_hybrid(message: str) -> Tuple[str, bool]:
+        agent_name, confidence = classifier.classify(message)
+        if confidence >= args.threshold:
+            return agent_name, False
+        return await orchestrator._route_with_llm(message, {}), True
+
+    await evaluate("hybrid", route_hybrid)
+    await evaluate("llm", route_llm)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
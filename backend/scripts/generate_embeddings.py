@@ -0,0 +1,227 @@
+"""
+Generate embeddings for products, reviews and style profiles
+
+Streams the rows whose embedding is missing or stale in primary-key order,
+chunk by chunk, embeds them and writes the vectors back with one binary
+COPY and one UPDATE per chunk. Each row's embedding_hash is md5(embedder
+name + embedded text), so a rerun only re-embeds rows that changed since,
+or that were embedded by a different embedder
+(migrations/004_embedding_hash.sql).
+
+Local embedders (EMBEDDING_PROVIDER=hashing) run in a process pool while the
+next chunks are read and earlier ones written; API embedders run as
+concurrent requests instead. Chunks are committed as they are written, so an
+interrupted run resumes where it stopped. The vector indexes are built or
+retrained afterwards (vector_index.py) unless --skip-index is given.
+
+Usage:
+    python scripts/generate_embeddings.py
+    python scripts/generate_embeddings.py --tables product --workers 8 --chunk-size 1000
+    python scripts/generate_embeddings.py --embedder openai --chunk-size 100 --workers 4
+    python scripts/generate_embeddings.py --force
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from collections import deque
+
+import numpy as np
+from pgvector.asyncpg import register_vector
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import Config
+from database import async_engine
+from embeddings import BaseEmbedder, create_embedder
+from migrate import apply_migrations
+from scripts.build_vector_indexes import print_results
+from vector_index import ensure_vector_indexes
+
+# What each table embeds: `document` is a SQL expression over `source`
+# (the table aliased as t)
+TARGETS: Dict[str, Dict[str, str]] = {
+    "product": {
+        "key": "product_id",
+        "source": "retail.product t LEFT JOIN retail.product_hierarchy h ON h.hierarchy_id = t.hierarchy_id",
+        "document": "concat_ws(' ', t.product_name, t.brand_name, t.product_type, "
+                    "replace(h.hierarchy_path, '/', ' '), t.metadata::jsonb ->> 'style', "
+                    "t.metadata::jsonb ->> 'occasion', t.product_description)",
+    },
+    "review": {
+        "key": "review_id",
+        "source": "retail.review t",
+        "document": "concat_ws(' ', t.review_title, t.review_text)",
+    },
+    "style_profile": {
+        "key": "profile_id",
+        "source": "retail.style_profile t",
+        "document": "concat_ws(' ', t.style_preferences::text, array_to_string(t.favorite_colors, ' '), "
+                    "array_to_string(t.brand_preferences, ' '), array_to_string(t.occasion_preferences, ' '))",
+    },
+}
+
+
+def _select_stale(table: str, force: bool) -> str:
+    """Next chunk of rows after $1 whose stored hash does not match ($2 = embedder name)"""
+    target = TARGETS[table]
+    stale = "TRUE" if force else \
+        "(d.embedding IS NULL OR d.embedding_hash IS DISTINCT FROM md5($2 || ':' || d.document))"
+    return f"""
+        SELECT d.id, d.document, md5($2 || ':' || d.document) AS hash
+        FROM (
+            SELECT t.{target['key']} AS id, {target['document']} AS document,
+                   t.embedding, t.embedding_hash
+            FROM {target['source']}
+        ) d
+        WHERE d.id > $1 AND {stale}
+        ORDER BY d.id
+        LIMIT $3
+    """
+
+
+def _bulk_update(table: str) -> str:
+    """Apply the chunk staged in embedding_batch"""
+    key = TARGETS[table]["key"]
+    return f"""
+        UPDATE retail.{table} t
+        SET embedding = b.embedding, embedding_hash = b.hash
+        FROM embedding_batch b
+        WHERE t.{key} = b.id
+    """
+
+
+# Embedder of each pool worker process
+_worker_embedder: Optional[BaseEmbedder] = None
+
+
+def _init_worker(provider: str) -> None:
+    global _worker_embedder
+    _worker_embedder = create_embedder(provider)
+
+
+def _embed_in_worker(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_embedder.embed_batch(texts), dtype=np.float32)
+
+
+async def embed_table(
+    table: str,
+    embedder: BaseEmbedder,
+    pool: Optional[ProcessPoolExecutor],
+    chunk_size: int,
+    in_flight: int,
+    force: bool = False
+) -> Dict[str, Any]:
+    """Embed one table's stale rows; returns counts and throughput"""
+    loop = asyncio.get_running_loop()
+    select_sql = _select_stale(table, force)
+    update_sql = _bulk_update(table)
+    stats = {"table": table, "embedded": 0, "chunks": 0, "seconds": 0.0}
+    start = time.perf_counter()
+
+    async with async_engine.connect() as read_conn, async_engine.connect() as write_conn:
+        reader = (await read_conn.get_raw_connection()).driver_connection
+        writer = (await write_conn.get_raw_connection()).driver_connection
+        # Chunks are COPYed (binary vectors) into a staging table, then
+        # applied with one UPDATE ... FROM in the same transaction
+        await register_vector(writer)
+        await writer.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS embedding_batch "
+            "(id INTEGER, embedding vector, hash TEXT) ON COMMIT DELETE ROWS"
+        )
+        total = await reader.fetchval(f"SELECT count(*) FROM retail.{table}")
+
+        pending: Deque[Tuple[List[Any], "asyncio.Future"]] = deque()
+
+        async def write_oldest() -> None:
+            rows, future = pending.popleft()
+            vectors = await future
+            async with writer.transaction():
+                await writer.copy_records_to_table(
+                    "embedding_batch",
+                    records=[(row["id"], np.asarray(vector, dtype=np.float32), row["hash"])
+                             for row, vector in zip(rows, vectors)]
+                )
+                await writer.execute(update_sql)
+            stats["embedded"] += len(rows)
+            stats["chunks"] += 1
+            elapsed = time.perf_counter() - start
+            print(f"  {table}: {stats['embedded']:,} embedded "
+                  f"({stats['embedded'] / elapsed:,.0f} rows/s)", flush=True)
+
+        after = 0
+        while True:
+            rows = await reader.fetch(select_sql, after, embedder.name, chunk_size)
+            if not rows:
+                break
+            after = rows[-1]["id"]
+            texts = [row["document"] for row in rows]
+            if pool is not None:
+                future = loop.run_in_executor(pool, _embed_in_worker, texts)
+            else:
+                future = asyncio.ensure_future(embedder.embed(texts))
+            pending.append((rows, future))
+            if len(pending) >= in_flight:
+                await write_oldest()
+        while pending:
+            await write_oldest()
+
+        # Do not hand the connection, with its vector codec, back to the pool
+        await write_conn.invalidate()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["up_to_date"] = total - stats["embedded"]
+    stats["rows_per_second"] = stats["embedded"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Embed products, reviews and style profiles")
+    parser.add_argument("--tables", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--embedder", choices=["hashing", "openai"], default=Config.EMBEDDING_PROVIDER,
+                        help="must match EMBEDDING_PROVIDER used for queries")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for local embedders, concurrent requests for API ones")
+    parser.add_argument("--force", action="store_true", help="re-embed every row")
+    parser.add_argument("--skip-index", action="store_true",
+                        help="do not build or retrain the vector indexes afterwards")
+    args = parser.parse_args()
+
+    async with async_engine.begin() as conn:
+        await apply_migrations(conn)
+
+    embedder = create_embedder(args.embedder)
+    pool = ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker, initargs=(args.embedder,)
+    ) if embedder.local else None
+    print(f"Embedding with {embedder.name}, {args.workers} {'processes' if pool else 'concurrent requests'}, "
+          f"chunks of {args.chunk_size}")
+
+    try:
+        for table in args.tables:
+            stats = await embed_table(
+                table, embedder, pool, args.chunk_size, in_flight=max(2, args.workers * 2), force=args.force
+            )
+            print(f"✓ {table}: {stats['embedded']:,} embedded, {stats['up_to_date']:,} up to date "
+                  f"in {stats['seconds']:.1f}s ({stats['rows_per_second']:,.0f} rows/s)")
+
+        if not args.skip_index:
+            # ivfflat has to be (re)trained on the vectors just written
+            async with async_engine.connect() as conn:
+                raw = (await conn.get_raw_connection()).driver_connection
+                print_results(await ensure_vector_indexes(raw, args.tables))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
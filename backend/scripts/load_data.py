@@ -2,6 +2,7 @@
 Load synthetic data into PostgreSQL database
 """
 
+import asyncio
 import json
 import sys
 from pathlib import Path
@@ -351,6 +352,21 @@ def load_line_items(db: Session):
     print(f"✅ Loaded {loaded} line items, skipped {skipped} duplicates")
 
 
+def load_product_summary():
+    """Rebuild retail.product_summary; its triggers keep it current afterwards"""
+    from scripts.rebuild_product_summary import rebuild
+    from database import async_engine
+
+    async def run():
+        try:
+            return await rebuild()
+        finally:
+            await async_engine.dispose()
+
+    rows = asyncio.run(run())
+    print(f"✅ Rebuilt product summary for {rows} products")
+
+
 def main():
     """Main function to load all data"""
     print("=" * 50)
@@ -372,6 +388,7 @@ def main():
         load_reviews(db)
         load_orders(db)
         load_line_items(db)
+        load_product_summary()
         
         print("\n" + "=" * 50)
         print("✅ Data loading complete!")
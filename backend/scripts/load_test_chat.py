@@ -0,0 +1,111 @@
+"""
+Load test the chat API
+
+Drives a running backend with concurrent /api/agent/chat (or /chat/stream)
+requests drawn from the routing evaluation set and reports throughput,
+latency percentiles and status codes per concurrency level. Start the
+backend with LLM_PROVIDER=mock to benchmark offline under simulated LLM
+latency, e.g.
+
+    LLM_PROVIDER=mock LLM_MOCK_LATENCY_MEDIAN_MS=400 uvicorn main:app --workers 2
+
+Usage:
+    python scripts/load_test_chat.py --url http://localhost:8000 --levels 1 16 64
+    python scripts/load_test_chat.py --stream --requests-per-level 8
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+import httpx
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.evaluate_routing import EVAL_EXAMPLES
+
+
+async def one_request(client: httpx.AsyncClient, stream: bool, message: str) -> tuple:
+    """Send one chat; returns (status, total seconds, seconds to first byte)"""
+    payload = {"message": message, "session_id": uuid.uuid4().hex}
+    start = time.perf_counter()
+    if not stream:
+        response = await client.post("/api/agent/chat", json=payload)
+        elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, elapsed
+
+    first_byte = None
+    async with client.stream("POST", "/api/agent/chat/stream", json=payload) as response:
+        async for _ in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    return response.status_code, elapsed, first_byte or elapsed
+
+
+async def run_level(client: httpx.AsyncClient, stream: bool, concurrency: int,
+                    requests: int, rng: random.Random) -> dict:
+    """Issue `requests` chats with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[tuple] = []
+
+    async def worker(message: str):
+        async with semaphore:
+            try:
+                results.append(await one_request(client, stream, message))
+            except httpx.HTTPError as e:
+                results.append((type(e).__name__, 0.0, 0.0))
+
+    messages = [rng.choice(EVAL_EXAMPLES)[0] for _ in range(requests)]
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(m) for m in messages))
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r[0] == 200]
+    totals = np.array([r[1] for r in ok]) * 1000.0 if ok else np.zeros(1)
+    firsts = np.array([r[2] for r in ok]) * 1000.0 if ok else np.zeros(1)
+    return {
+        "rps": len(ok) / elapsed,
+        "p50": float(np.percentile(totals, 50)),
+        "p99": float(np.percentile(totals, 99)),
+        "ttfb_p50": float(np.percentile(firsts, 50)),
+        "statuses": Counter(str(r[0]) for r in results),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the chat API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests-per-level", type=int, default=4,
+                        help="requests issued per level, as a multiple of the concurrency")
+    parser.add_argument("--stream", action="store_true", help="use the SSE endpoint")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=max(args.levels), max_keepalive_connections=max(args.levels))
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        status = (await client.get("/api/agent/status")).json()
+        print(f"Target: {args.url} (provider: {status.get('llm_provider')}, "
+              f"endpoint: {'stream' if args.stream else 'chat'})\n")
+        print(f"{'concurrency':>11} | {'rps':>7} {'p50':>8} {'p99':>8} {'ttfb p50':>9} | statuses")
+        for level in args.levels:
+            result = await run_level(client, args.stream, level,
+                                     level * args.requests_per_level, rng)
+            statuses = ", ".join(f"{code}: {count}" for code, count in sorted(result["statuses"].items()))
+            print(f"{level:>11} | {result['rps']:>7.1f} {result['p50']:>7.0f}ms {result['p99']:>7.0f}ms "
+                  f"{result['ttfb_p50']:>8.0f}ms | {statuses}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
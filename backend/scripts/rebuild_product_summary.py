@@ -0,0 +1,55 @@
+"""
+Rebuild the denormalized product summary
+
+retail.product_summary is kept current by triggers (migrations/
+001_product_summary.sql). This script recomputes it from the base tables,
+e.g. after a bulk load or to repair drift, and with --windows-only just
+re-derives the 7/30 day sales windows from the daily buckets so old sales
+age out. Schedule the latter once a day:
+
+    0 3 * * * cd backend && python scripts/rebuild_product_summary.py --windows-only
+
+Usage:
+    python scripts/rebuild_product_summary.py
+    python scripts/rebuild_product_summary.py --windows-only
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database import async_engine
+from migrate import apply_migrations
+
+
+async def rebuild(windows_only: bool = False) -> int:
+    """Run the rebuild (or window refresh) in one transaction; returns rows written"""
+    async with async_engine.begin() as conn:
+        await apply_migrations(conn)
+    function = "refresh_product_sales_windows" if windows_only else "rebuild_product_summary"
+    async with async_engine.begin() as conn:
+        return await conn.scalar(text(f"SELECT retail.{function}()"))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild retail.product_summary")
+    parser.add_argument("--windows-only", action="store_true",
+                        help="only refresh units_sold_7d / units_sold_30d")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = await rebuild(args.windows_only)
+    await async_engine.dispose()
+    what = "sales windows updated" if args.windows_only else "summary rows rebuilt"
+    print(f"✅ {rows} {what} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,8 @@
+"""Shared test setup: backend modules import as top-level packages, LLM calls stay offline"""
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault("LLM_PROVIDER", "mock")
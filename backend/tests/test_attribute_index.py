@@ -0,0 +1,131 @@
+"""SKU attribute bitmaps: sparse/dense slot sets and product matches against brute force"""
+
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from agents.attribute_index import DENSE_FRACTION, AttributeSnapshot, SlotSet, intersect, union
+
+COLORS = ["Black", "White", "Red", "Navy"]
+SIZES = ["S", "M", "L"]
+MATERIALS = ["Cotton", "Silk", None]
+PATTERNS = ["Solid", "Striped", None]
+
+
+def sku(sku_id, product_id, rng, active=None, in_stock=None):
+    return SimpleNamespace(
+        sku_id=sku_id, product_id=product_id,
+        active=rng.random() < 0.85 if active is None else active,
+        in_stock=rng.random() < 0.6 if in_stock is None else in_stock,
+        color=rng.choice(COLORS), size=rng.choice(SIZES),
+        material=rng.choice(MATERIALS), pattern=rng.choice(PATTERNS), updated_at=None,
+    )
+
+
+def skus(seed, n=400):
+    rng = random.Random(seed)
+    return [sku(sku_id, 1 + sku_id // 4, rng) for sku_id in range(1, n * 2, 2)]
+
+
+def brute_force_match(rows, filters, in_stock=False):
+    return sorted({
+        row.product_id for row in rows
+        if row.active and (row.in_stock or not in_stock)
+        and all((getattr(row, a) or "").lower() in {v.lower() for v in wanted} for a, wanted in filters.items())
+    })
+
+
+FILTERS = [
+    ({}, False),
+    ({}, True),
+    ({"color": ["black"]}, False),
+    ({"color": ["Black", "RED"], "size": ["M"]}, True),
+    ({"size": ["S", "L"], "material": ["silk"], "pattern": ["Solid"]}, False),
+    ({"color": ["purple"]}, False),
+]
+
+
+def test_slot_set_turns_dense_and_back_to_the_same_members():
+    capacity = 640
+    slot_set = SlotSet()
+    members = set()
+    rng = random.Random(0)
+    for slot in rng.sample(range(capacity), int(capacity * DENSE_FRACTION) + 5):
+        slot_set.add(slot, capacity)
+        slot_set.add(slot, capacity)  # idempotent
+        members.add(slot)
+    assert slot_set.words is not None and slot_set.array is None
+    assert len(slot_set) == len(members)
+    assert slot_set.slots().tolist() == sorted(members)
+
+    for slot in list(members)[:10] + [capacity - 1]:
+        slot_set.discard(slot)
+        members.discard(slot)
+    probe = np.arange(capacity, dtype=np.uint32)
+    assert probe[slot_set.contains(probe)].tolist() == sorted(members)
+
+    slot_set.grow(capacity * 4)
+    slot_set.add(capacity * 4 - 1, capacity * 4)
+    assert slot_set.slots().tolist() == sorted(members | {capacity * 4 - 1})
+
+
+def test_sparse_slot_set_add_discard_contains():
+    slot_set = SlotSet.from_slots(np.array([3, 9, 40]), capacity=10_000)
+    assert slot_set.words is None
+    slot_set.add(5, 10_000)
+    slot_set.discard(9)
+    slot_set.discard(7)  # not a member
+    assert slot_set.slots().tolist() == [3, 5, 40]
+    assert slot_set.contains(np.array([0, 3, 5, 9, 40, 9999], dtype=np.uint32)).tolist() == \
+        [False, True, True, False, True, False]
+    assert not SlotSet().contains(np.array([1], dtype=np.uint32)).any()
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_union_and_intersect_match_python_sets(seed):
+    rng = random.Random(seed)
+    capacity = 2_000
+    members = [set(rng.sample(range(capacity), rng.choice([5, 40, 300]))) for _ in range(4)]
+    sets = [SlotSet.from_slots(np.array(sorted(m)), capacity) for m in members]
+    assert any(s.words is None for s in sets) and any(s.words is not None for s in sets)
+
+    assert union(sets, capacity).slots().tolist() == sorted(set.union(*members))
+    assert union(sets[:1], capacity) is sets[0]
+    for group in (sets, sets[:2], [s for s in sets if s.words is not None]):
+        expected = set.intersection(*[members[sets.index(s)] for s in group])
+        assert intersect(group).tolist() == sorted(expected)
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_match_agrees_with_brute_force(seed):
+    rows = skus(seed)
+    snapshot = AttributeSnapshot.build(rows)
+    for filters, in_stock in FILTERS:
+        assert snapshot.match(filters, in_stock).tolist() == brute_force_match(rows, filters, in_stock)
+
+
+def test_upsert_changes_and_appends_in_place():
+    rng = random.Random(5)
+    rows = skus(5)
+    snapshot = AttributeSnapshot.build(rows)
+
+    # Edit existing SKUs, deactivate some, and append new ids past the last
+    changed = [sku(row.sku_id, row.product_id, rng) for row in rng.sample(rows, 60)]
+    changed += [sku(row.sku_id, row.product_id, rng, active=False) for row in rng.sample(rows, 10)]
+    appended = [sku(rows[-1].sku_id + 2 * i, 10_000 + i, rng, active=True) for i in range(1, 2000)]
+    assert snapshot.upsert(sorted(changed, key=lambda r: r.sku_id) + appended)
+
+    current = {row.sku_id: row for row in rows}
+    current.update({row.sku_id: row for row in changed + appended})
+    assert len(snapshot) == len(current)
+    for filters, in_stock in FILTERS:
+        assert snapshot.match(filters, in_stock).tolist() == \
+            brute_force_match(current.values(), filters, in_stock)
+
+
+def test_upsert_refuses_an_id_inside_the_slot_range():
+    snapshot = AttributeSnapshot.build(skus(6))
+    # Odd ids only: an even id would need a slot between existing ones
+    assert not snapshot.upsert([sku(4, 1, random.Random(0))])
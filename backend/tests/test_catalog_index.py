@@ -0,0 +1,189 @@
+"""BM25 index against a brute-force scorer
+
+The parquet catch-up test needs a loaded catalog in DATABASE_URL (skipped
+otherwise); its product changes are rolled back.
+"""
+
+import asyncio
+import math
+import random
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pytest
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from agents.catalog_index import BM25Index, CatalogIndex, _fields, _product_query, document_terms, tokenize
+from database import ASYNC_DATABASE_URL, _async_connect_args
+from models import Product
+
+WORDS = ["red", "blue", "dress", "dresses", "shirt", "linen", "cotton", "boot", "boots", "summer",
+         "winter", "jacket", "denim", "silk", "party", "casual", "wool", "scarf", "floral", "striped"]
+
+
+def random_fields(rng: random.Random) -> Dict[str, str]:
+    return {
+        "name": " ".join(rng.choices(WORDS, k=rng.randint(1, 4))),
+        "brand": rng.choice(["Acme", "Northwind", "Contoso"]),
+        "path": "/".join(rng.choices(["Women", "Men", "Dresses", "Shirts", "Outerwear"], k=2)),
+        "type": rng.choice(["Dress", "Shirt", "Jacket"]),
+        "metadata": {"style": rng.choice(WORDS), "size": 10},
+    }
+
+
+def brute_force(documents: Dict[int, Dict], query: str, k: int, avg_length: float,
+                k1: float = 1.2, b: float = 0.75) -> List[Tuple[int, float]]:
+    terms = {product_id: document_terms(fields) for product_id, fields in documents.items()}
+    n_docs = len(documents)
+    scores: Dict[int, float] = {}
+    for term in dict.fromkeys(tokenize(query)):
+        df = sum(1 for doc in terms.values() if term in doc)
+        if not df:
+            continue
+        idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        for product_id, doc in terms.items():
+            if term in doc:
+                length = sum(doc.values())
+                tf = doc[term]
+                norm = k1 * (1.0 - b + b * length / avg_length)
+                scores[product_id] = scores.get(product_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:k]
+
+
+def assert_same_ranking(actual: List[Tuple[int, float]], expected: List[Tuple[int, float]]) -> None:
+    assert len(actual) == len(expected)
+    np.testing.assert_allclose([s for _, s in actual], [s for _, s in expected], rtol=1e-4)
+    # Ids may only differ where scores tie
+    for (a_id, a_score), (e_id, e_score) in zip(actual, expected):
+        if a_id != e_id:
+            assert a_score == pytest.approx(e_score, rel=1e-4)
+
+
+QUERIES = ["red dress", "boots", "linen summer shirt", "Acme", "dresses party floral denim", "nothing here"]
+
+
+@pytest.fixture
+def corpus():
+    rng = random.Random(11)
+    documents = {product_id: random_fields(rng) for product_id in range(1, 401)}
+    return rng, documents
+
+
+def test_tokenize_stems_plurals_and_drops_stop_words():
+    assert tokenize("The Dresses and Boots for Parties") == ["dress", "boot", "party"]
+    assert tokenize(None) == []
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("k", [1, 5, 50])
+def test_search_matches_brute_force(corpus, query, k):
+    _, documents = corpus
+    index = BM25Index.build(documents.items())
+    assert_same_ranking(index.search(query, k), brute_force(documents, query, k, index._avg_length))
+
+
+def test_updates_and_removals_match_brute_force_after_merge(corpus):
+    rng, documents = corpus
+    index = BM25Index.build(documents.items())
+    for product_id in rng.sample(sorted(documents), 80):
+        documents[product_id] = random_fields(rng)
+        index.upsert(product_id, documents[product_id])
+    for product_id in rng.sample(sorted(documents), 40):
+        del documents[product_id]
+        index.remove(product_id)
+    for product_id in range(1000, 1030):
+        documents[product_id] = random_fields(rng)
+        index.upsert(product_id, documents[product_id])
+
+    # Before the merge removed products are never returned
+    for query in QUERIES:
+        assert {product_id for product_id, _ in index.search(query, 500)} <= set(documents)
+
+    index.merge()
+    assert len(index) == len(documents)
+    for query in QUERIES:
+        assert_same_ranking(index.search(query, 20), brute_force(documents, query, 20, index._avg_length))
+
+
+def test_removing_most_matches_without_a_merge_matches_brute_force(corpus):
+    _, documents = corpus
+    index = BM25Index.build(documents.items())
+    matching = [product_id for product_id, fields in documents.items() if "dress" in document_terms(fields)]
+    # Stale postings then outnumber the live documents (idf < 0 if counted)
+    for product_id in matching[:250]:
+        del documents[product_id]
+        index.remove(product_id)
+    assert index.merges == 0
+    assert len(matching) > len(documents)
+
+    for query in ["dress", "red dress", "dresses party floral denim"]:
+        results = index.search(query, 50)
+        assert all(score > 0 for _, score in results)
+        assert_same_ranking(results, brute_force(documents, query, 50, index._avg_length))
+
+
+def test_merge_reclaims_slots_of_replaced_documents(corpus):
+    rng, documents = corpus
+    index = BM25Index.build(documents.items())
+    for _ in range(20):
+        for product_id in range(1, 51):
+            index.upsert(product_id, documents[product_id])
+    index.merge()
+    assert index.get_stats()["slots"] == len(documents)
+    assert_same_ranking(index.search("red dress", 10), brute_force(documents, "red dress", 10, index._avg_length))
+
+
+def test_empty_index_and_queries():
+    index = BM25Index()
+    assert index.search("dress") == []
+    index.upsert(7, {"name": "Red dress"})
+    assert [product_id for product_id, _ in index.search("dresses")] == [7]
+    assert index.search("the and", 5) == []
+    assert index.remove(7) and not index.remove(7)
+    assert index.search("dress") == []
+
+
+async def catch_up_parquet_export():
+    """A stale export caught up against the database, in a rolled-back transaction"""
+    engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool, connect_args=_async_connect_args())
+    try:
+        async with engine.connect() as conn:
+            outer = await conn.begin()
+            db = AsyncSession(bind=conn, expire_on_commit=False)
+            rows = (await db.execute(
+                _product_query().where(Product.status == "ACTIVE").order_by(Product.product_id).limit(50)
+            )).all()
+            if len(rows) < 50:
+                pytest.skip("no catalog loaded")
+            ids = [row.product_id for row in rows]
+            exported = (await db.scalar(select(func.extract("epoch", func.now())))) - 1
+
+            # The export missed ids[0], still has ids[1] (deactivated since) and an old name for ids[2]
+            export = [(row.product_id, _fields(row)) for row in rows[1:]]
+            export[1] = (ids[2], {**export[1][1], "name": "zzstale"})
+            index = BM25Index.build(export)
+            await db.execute(update(Product).where(Product.product_id == ids[1]).values(status="INACTIVE"))
+            await db.execute(update(Product).where(Product.product_id == ids[2])
+                             .values(product_name=Product.product_name + " zzfresh"))
+
+            applied = await CatalogIndex()._catch_up(db, index, float(exported))
+            await db.close()
+            await outer.rollback()
+    except OSError as e:
+        pytest.skip(f"database unavailable: {e}")
+    finally:
+        await engine.dispose()
+    return ids, index, {row.product_id for row in applied}
+
+
+def test_parquet_build_catches_up_with_the_database():
+    ids, index, applied = asyncio.run(catch_up_parquet_export())
+    assert ids[0] in index and ids[1] not in index and ids[2] in index
+    # Of the exported range, only the missing and the edited product are re-read
+    assert applied & set(ids) == {ids[0], ids[2]}
+    assert index.search("zzstale") == []
+    assert [product_id for product_id, _ in index.search("zzfresh")] == [ids[2]]
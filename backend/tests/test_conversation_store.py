@@ -0,0 +1,109 @@
+"""Conversation history: trimming, per-session budgets and SQLite work off the event loop"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agents.conversation_store import (
+    InMemoryConversationStore, SQLiteConversationStore, decode_messages, encode_messages
+)
+
+
+def message(n: int, role: str = "user") -> dict:
+    return {"role": role, "content": f"message {n} " + "x" * (n % 7) * 100}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryConversationStore(max_messages=4)
+    return SQLiteConversationStore(str(tmp_path / "conversations.db"), max_messages=4)
+
+
+def test_encoding_round_trips_compressed_and_raw():
+    for messages in ([message(1)], [message(n, "assistant") for n in range(30)]):
+        assert decode_messages(encode_messages(messages)) == messages
+
+
+def test_append_keeps_the_last_messages_per_session(store):
+    async def run():
+        for n in range(6):
+            await store.append("session:a", message(n))
+        await store.append("session:b", message(99))
+        return await store.get("session:a"), await store.get("session:b"), await store.get_stats()
+
+    a, b, stats = asyncio.run(run())
+    assert a == [message(n) for n in range(2, 6)]
+    assert b == [message(99)]
+    assert stats["sessions"] == 2
+
+
+def test_concurrent_appends_to_one_session_lose_nothing(store):
+    async def run():
+        await asyncio.gather(*[store.append("session:a", message(n)) for n in range(4)])
+        return await store.get("session:a")
+
+    assert sorted(m["content"] for m in asyncio.run(run())) == sorted(message(n)["content"] for n in range(4))
+
+
+def test_memory_store_evicts_least_recently_used_sessions():
+    size = len(encode_messages([message(6)]))
+    store = InMemoryConversationStore(max_messages=10, max_bytes=3 * size, max_session_bytes=size)
+
+    async def run():
+        for key in ("a", "b", "c"):
+            await store.save(key, [message(6)])
+        await store.get("a")
+        await store.save("d", [message(6)])
+        return [await store.get(key) != [] for key in ("a", "b", "c", "d")]
+
+    assert asyncio.run(run()) == [True, False, True, True]
+    assert store.evictions == 1
+
+
+def test_sqlite_calls_run_off_the_event_loop(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"))
+    loop_thread = threading.get_ident()
+    threads = set()
+    read = store._read
+
+    def slow_read(key):
+        threads.add(threading.get_ident())
+        time.sleep(0.2)
+        return read(key)
+
+    store._read = slow_read
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await store.append("session:a", message(1))
+        task.cancel()
+        return ticks
+
+    # The loop kept running while the read slept
+    assert asyncio.run(run()) >= 5
+    assert threads and loop_thread not in threads
+
+
+def test_sqlite_prune_drops_expired_and_excess_sessions(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"), ttl_seconds=60, max_sessions=3)
+
+    async def run():
+        for n in range(5):
+            await store.save(f"session:{n}", [message(n)])
+        await store._run(store._conn.execute, "UPDATE conversation SET updated_at = 0 WHERE session_key = ?",
+                         ("session:4",))
+        store._prune_executor.submit(store._prune).result()
+        return await store.get_stats()
+
+    assert asyncio.run(run())["sessions"] == 3
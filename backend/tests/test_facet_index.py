@@ -0,0 +1,118 @@
+"""Facet counts against a naive count over the same rows"""
+
+import asyncio
+import random
+
+import numpy as np
+import pytest
+
+from agents import search_agent
+from agents.facet_index import FacetIndex, FacetSnapshot, pack, popcount, price_bucket_labels
+from agents.hierarchy import HierarchyTree
+
+BOUNDS = [25, 50, 100, 200]
+BRANDS = ["Acme", "Borealis", "Cirrus", None]
+GENDERS = ["Women", "Men", "Unisex", None]
+COLORS = ["Black", "White", "Red", "Navy", "Green"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+
+TREE = HierarchyTree.build([
+    {"hierarchy_id": 1, "hierarchy_name": "Women", "parent_hierarchy_id": None,
+     "hierarchy_path": "Women", "hierarchy_level": "Department"},
+    {"hierarchy_id": 2, "hierarchy_name": "Dresses", "parent_hierarchy_id": 1,
+     "hierarchy_path": "Women/Dresses", "hierarchy_level": "Category"},
+    {"hierarchy_id": 3, "hierarchy_name": "Tops", "parent_hierarchy_id": 1,
+     "hierarchy_path": "Women/Tops", "hierarchy_level": "Category"},
+    {"hierarchy_id": 4, "hierarchy_name": "Men", "parent_hierarchy_id": None,
+     "hierarchy_path": "Men", "hierarchy_level": "Department"},
+])
+PARENTS = {1: None, 2: 1, 3: 1, 4: None}
+
+
+def catalog(seed: int, n: int = 300):
+    """Products (sorted ids with gaps) and their (product_id, value) pairs, some for inactive products"""
+    rng = random.Random(seed)
+    ids = sorted(rng.sample(range(1, n * 3), n))
+    products = [(pid, rng.choice(BRANDS), rng.choice(GENDERS), rng.choice([2, 3, 4, None])) for pid in ids]
+    inactive = [pid for pid in range(1, n * 3) if pid not in set(ids)][:20]
+    colors = {(pid, c) for pid in ids + inactive for c in rng.sample(COLORS, rng.randint(0, 2))}
+    sizes = {(pid, s) for pid in ids + inactive for s in rng.sample(SIZES, rng.randint(0, 3))}
+    prices = {(pid, rng.randint(0, len(BOUNDS))) for pid in ids + inactive for _ in range(rng.randint(0, 2))}
+    return products, sorted(colors), sorted(sizes), sorted(prices)
+
+
+def naive_counts(products, colors, sizes, prices, matched_ids):
+    active = {p[0]: p for p in products}
+    matched = set(matched_ids) & set(active)
+
+    def tally(values):
+        counts = {}
+        for value in values:
+            counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    categories = {}
+    for pid in matched:
+        node = active[pid][3]
+        while node is not None:
+            categories[node] = categories.get(node, 0) + 1
+            node = PARENTS[node]
+    return {
+        "brand": tally(active[pid][1] for pid in matched if active[pid][1] is not None),
+        "gender": tally(active[pid][2] for pid in matched if active[pid][2] is not None),
+        "color": tally(c for pid, c in colors if pid in matched),
+        "size": tally(s for pid, s in sizes if pid in matched),
+        "price": tally(b for pid, b in prices if pid in matched),
+        "category": categories,
+    }
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_counts_match_a_naive_count(seed):
+    products, colors, sizes, prices = catalog(seed)
+    snapshot = FacetSnapshot.build(products, colors, sizes, prices, BOUNDS)
+    rng = random.Random(seed)
+    # A sample of products, duplicates, and ids the index does not know
+    matched = rng.sample([p[0] for p in products], 120) + [products[0][0], 10 ** 6, -5]
+    facets = snapshot.count(matched, TREE, max_values=100)
+    expected = naive_counts(products, colors, sizes, prices, matched)
+
+    for facet in ("brand", "gender", "color", "size"):
+        assert {v["value"]: v["count"] for v in facets[facet]} == expected[facet], facet
+        counts = [v["count"] for v in facets[facet]]
+        assert counts == sorted(counts, reverse=True)
+    assert [b["count"] for b in facets["price"]] == [expected["price"].get(i, 0) for i in range(len(BOUNDS) + 1)]
+    assert {c["hierarchy_id"]: c["count"] for c in facets["category"]} == expected["category"]
+
+
+def test_counts_are_capped_at_max_values_and_empty_for_no_matches():
+    products, colors, sizes, prices = catalog(4)
+    snapshot = FacetSnapshot.build(products, colors, sizes, prices, BOUNDS)
+    assert len(snapshot.count([p[0] for p in products], TREE, max_values=2)["color"]) == 2
+
+    facets = snapshot.count([], TREE)
+    assert all(not facets[facet] for facet in ("brand", "gender", "color", "size", "category"))
+    assert [b["count"] for b in facets["price"]] == [0] * (len(BOUNDS) + 1)
+
+
+def test_popcount_matches_a_bit_count():
+    rng = np.random.default_rng(0)
+    for n in (0, 1, 63, 64, 65, 1000):
+        bits = rng.random(n) < 0.3
+        assert popcount(pack(bits)) == int(bits.sum())
+    words = np.array([0, 2 ** 64 - 1, 0x8000000000000001], dtype=np.uint64)
+    assert popcount(words) == 66
+
+
+def test_price_bucket_labels():
+    assert [b["value"] for b in price_bucket_labels([25, 50])] == ["Under $25", "$25-$50", "$50+"]
+
+
+def test_agent_reads_no_match_ids_before_the_index_is_built(monkeypatch):
+    async def fail(*args, **kwargs):
+        raise AssertionError("match ids read without a facet index")
+
+    monkeypatch.setattr(search_agent, "match_ids", fail)
+    monkeypatch.setattr(search_agent, "get_facet_index", lambda: FacetIndex())
+    agent = search_agent.CatalogSearchAgent()
+    assert asyncio.run(agent._count_facets(None, None, "dress", [], False)) is None
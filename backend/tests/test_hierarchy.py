@@ -0,0 +1,68 @@
+"""Category tree: descendant sets and name/path resolution"""
+
+from agents.hierarchy import HierarchyTree
+
+
+def row(hierarchy_id, name, parent=None, path=None, level=None):
+    return {"hierarchy_id": hierarchy_id, "hierarchy_name": name, "parent_hierarchy_id": parent,
+            "hierarchy_path": path, "hierarchy_level": level}
+
+
+ROWS = [
+    row(1, "Women", path="Women", level="Department"),
+    row(2, "Dresses", 1, "Women/Dresses", "Category"),
+    row(3, "Casual", 2, "Women/Dresses/Casual", "Subcategory"),
+    row(4, "Evening", 2, "Women/Dresses/Evening", "Subcategory"),
+    row(5, "Men", path="Men", level="Department"),
+    row(6, "Dresses", 5, "Men/Dresses", "Category"),
+    row(7, "Dress Shirts", 5, "Men/Dress Shirts", "Category"),
+    row(8, "Oxford", 7, "Men/Dress Shirts/Oxford", "Subcategory"),
+]
+
+
+def brute_force_descendants(rows, hierarchy_id):
+    ids = {hierarchy_id}
+    while True:
+        more = {r["hierarchy_id"] for r in rows if r["parent_hierarchy_id"] in ids} - ids
+        if not more:
+            return ids
+        ids |= more
+
+
+def test_descendant_sets_match_brute_force():
+    tree = HierarchyTree.build(ROWS)
+    for hierarchy_id, node in tree.nodes.items():
+        assert set(node.descendant_ids) == brute_force_descendants(ROWS, hierarchy_id)
+    assert {node.hierarchy_id for node in tree.roots} == {1, 5}
+    assert tree.get_stats() == {"nodes": 8, "roots": 2, "depth": 3}
+
+
+def test_names_match_whole_words_ignoring_case_and_plurals():
+    tree = HierarchyTree.build(ROWS)
+    # Both genders' Dresses and everything below them, but not "Dress Shirts"
+    assert tree.resolve("dress") == {2, 3, 4, 6}
+    assert tree.resolve("DRESSES") == {2, 3, 4, 6}
+    assert tree.resolve("dress shirt") == {7, 8}
+
+
+def test_partial_names_fall_back_to_containing_names():
+    tree = HierarchyTree.build(ROWS)
+    assert tree.resolve("shirt") == {7, 8}
+    assert tree.resolve("sweater") == frozenset()
+    assert tree.resolve("") == frozenset()
+
+
+def test_paths_pick_a_single_node():
+    tree = HierarchyTree.build(ROWS)
+    assert tree.resolve("Women/Dresses") == {2, 3, 4}
+    assert tree.resolve("/men/dresses/") == {6}
+    assert tree.resolve("Women/Shoes") == frozenset()
+
+
+def test_cycles_and_orphans_do_not_hang():
+    rows = ROWS + [row(9, "Loop A", 10), row(10, "Loop B", 9), row(11, "Orphan", 99)]
+    tree = HierarchyTree.build(rows)
+    assert 11 in {node.hierarchy_id for node in tree.roots}
+    assert tree.resolve("orphan") == {11}
+    # Nodes on a cycle unreachable from a root keep just themselves
+    assert tree.resolve("loop a") == {9}
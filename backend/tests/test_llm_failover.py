@@ -0,0 +1,147 @@
+"""Circuit breaker and failover chain"""
+
+import asyncio
+
+import pytest
+
+from llm_failover import CircuitBreaker, FailoverLLMProvider
+from llm_provider import BaseLLMProvider
+from llm_scheduler import LLMScheduler, ScheduledLLMProvider
+
+
+class FakeProvider(BaseLLMProvider):
+    """Answers with its name, fails while `failing`, sleeps `delay` seconds"""
+
+    def __init__(self, name: str, failing: bool = False, delay: float = 0.0):
+        self.name = name
+        self.failing = failing
+        self.delay = delay
+        self.calls = 0
+
+    async def chat_completion(self, messages, model=None, temperature=0.7, tools=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.failing:
+            raise RuntimeError(f"{self.name} down")
+        return self.name
+
+    async def chat_completion_stream(self, messages, model=None, temperature=0.7, tools=None):
+        yield await self.chat_completion(messages, model, temperature, tools)
+
+
+def half_open(breaker: CircuitBreaker) -> None:
+    """Trip the breaker and let its open period lapse"""
+    breaker._trip()
+    breaker.opened_at -= breaker.open_seconds
+
+
+def make_chain(primary: FakeProvider, fallback: FakeProvider, hedge: bool = False) -> FailoverLLMProvider:
+    return FailoverLLMProvider(
+        [("primary", primary), ("fallback", fallback)],
+        hedge=hedge,
+        hedge_min_delay=0.01,
+        hedge_max_delay=0.01,
+        breaker_factory=lambda: CircuitBreaker(min_calls=2, open_seconds=60.0)
+    )
+
+
+def complete(chain: FailoverLLMProvider) -> str:
+    return asyncio.run(chain.chat_completion([{"role": "user", "content": "hi"}]))
+
+
+def test_breaker_opens_on_error_rate_and_closes_after_probe():
+    breaker = CircuitBreaker(min_calls=2, open_seconds=60.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.is_available()
+
+    half_open(breaker)
+    assert breaker.is_available()
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()  # one probe at a time
+    breaker.record_success(0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_is_available_does_not_claim_the_probe():
+    breaker = CircuitBreaker()
+    half_open(breaker)
+    for _ in range(3):
+        assert breaker.is_available()
+    assert breaker.allow_request()
+
+
+def test_unused_fallback_recovers_after_primary_successes():
+    primary, fallback = FakeProvider("primary"), FakeProvider("fallback")
+    chain = make_chain(primary, fallback)
+    half_open(chain.breakers["fallback"])
+
+    # The primary answers; the fallback is listed but never called
+    assert complete(chain) == "primary"
+    assert complete(chain) == "primary"
+    assert fallback.calls == 0
+
+    # Its probe is still free, so it takes over when the primary fails
+    primary.failing = True
+    assert complete(chain) == "fallback"
+    assert chain.breakers["fallback"].state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_hedge_releases_the_probe():
+    primary, fallback = FakeProvider("primary"), FakeProvider("fallback", delay=0.5)
+    chain = make_chain(primary, fallback, hedge=True)
+    breaker = chain.breakers["fallback"]
+    half_open(breaker)
+    for _ in range(5):
+        breaker._latencies.append(0.001)
+    chain.breakers["primary"]._latencies.extend([0.001] * 5)
+    primary.delay = 0.05
+
+    # The hedge to the fallback fires, then loses and is cancelled
+    assert complete(chain) == "primary"
+    assert fallback.calls == 1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.is_available()
+
+    primary.failing = True
+    fallback.delay = 0.0
+    assert complete(chain) == "fallback"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize("requests_per_second", [1.0, 100.0])
+def test_hedges_are_charged_to_the_scheduler(requests_per_second):
+    primary, fallback = FakeProvider("primary", delay=0.1), FakeProvider("fallback", delay=0.5)
+    chain = make_chain(primary, fallback, hedge=True)
+    scheduler = LLMScheduler(requests_per_second=requests_per_second)
+    chain.scheduler = scheduler
+    provider = ScheduledLLMProvider(chain, scheduler)
+
+    assert asyncio.run(provider.chat_completion([{"role": "user", "content": "hi"}])) == "primary"
+    if requests_per_second == 1.0:
+        # The outer call took the only request token: no hedge goes upstream
+        assert (fallback.calls, chain.hedges_skipped, scheduler.admitted) == (0, 1, 1)
+    else:
+        assert (fallback.calls, chain.hedges_fired, scheduler.admitted) == (1, 1, 2)
+    # The losing hedge gave its slot back
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_primary_failures_trip_over_to_fallback(stream):
+    primary, fallback = FakeProvider("primary", failing=True), FakeProvider("fallback")
+    chain = make_chain(primary, fallback)
+
+    async def run() -> str:
+        if stream:
+            return "".join([chunk async for chunk in chain.chat_completion_stream([])])
+        return await chain.chat_completion([])
+
+    assert asyncio.run(run()) == "fallback"
+    assert asyncio.run(run()) == "fallback"
+    assert chain.breakers["primary"].state == CircuitBreaker.OPEN
+    primary.calls = 0
+    assert asyncio.run(run()) == "fallback"
+    assert primary.calls == 0
@@ -0,0 +1,119 @@
+"""Keyset cursors: round trip, rejection of foreign or malformed cursors, NULL sort keys
+
+The page walk needs a loaded catalog in DATABASE_URL (skipped otherwise);
+its reviews are inserted in a transaction that is rolled back.
+"""
+
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from database import ASYNC_DATABASE_URL, _async_connect_args
+from models import Customer, Product, Review
+from pagination import (NEXT_CURSOR_HEADER, ORDER_KEYSET, PRODUCT_KEYSET, REVIEW_KEYSET, fetch_page)
+
+
+def cursor_of(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def sql(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 17, 9, 30, 15, 250000)
+    cursor = REVIEW_KEYSET.encode(SimpleNamespace(created_at=created_at, review_id=42))
+    assert "=" not in cursor
+    assert REVIEW_KEYSET.decode(cursor) == [created_at, 42]
+    assert PRODUCT_KEYSET.decode(PRODUCT_KEYSET.encode(SimpleNamespace(product_id=7))) == [7]
+
+
+@pytest.mark.parametrize("cursor", [
+    # Another listing's cursor
+    ORDER_KEYSET.encode(SimpleNamespace(order_date=datetime(2024, 1, 1), order_id=1)),
+    cursor_of({"k": "review", "v": [1]}),
+    cursor_of({"k": "review", "v": ["yesterday", 1]}),
+    cursor_of(["review", 1]),
+    "not base64!",
+    "",
+])
+def test_foreign_or_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        REVIEW_KEYSET.decode(cursor)
+    assert error.value.status_code == 400
+
+
+def test_null_sort_key_round_trips_as_the_lowest_value():
+    cursor = REVIEW_KEYSET.encode(SimpleNamespace(created_at=None, review_id=42))
+    lowest, review_id = REVIEW_KEYSET.decode(cursor)
+    assert review_id == 42
+    assert lowest.name == "'-infinity'::timestamp"
+    assert "coalesce(retail.review.created_at, '-infinity'::timestamp)" in sql(REVIEW_KEYSET.after(select(Review), cursor))
+
+
+def test_null_is_rejected_for_a_not_null_key():
+    with pytest.raises(HTTPException) as error:
+        PRODUCT_KEYSET.decode(cursor_of({"k": "product", "v": [None]}))
+    assert error.value.status_code == 400
+    assert "coalesce" not in sql(PRODUCT_KEYSET.order(select(Product)))
+
+
+async def walk_reviews(page_size: int):
+    """Review ids of a seeded product, page by page, and the ids expected in order"""
+    engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool, connect_args=_async_connect_args())
+    try:
+        async with engine.connect() as conn:
+            outer = await conn.begin()
+            db = AsyncSession(bind=conn, expire_on_commit=False)
+            product_id = await db.scalar(select(Product.product_id).order_by(Product.product_id).limit(1))
+            customer_id = await db.scalar(select(Customer.customer_id).order_by(Customer.customer_id).limit(1))
+            if product_id is None or customer_id is None:
+                pytest.skip("no catalog loaded")
+            await db.execute(Review.__table__.delete().where(Review.product_id == product_id))
+
+            now = datetime.now()
+            # Three share a timestamp, three have none
+            dates = [now, now - timedelta(days=1), now - timedelta(days=1), now - timedelta(days=1),
+                     None, now - timedelta(days=2), None, None]
+            reviews = [Review(product_id=product_id, customer_id=customer_id, rating=4, review_text="test")
+                       for _ in dates]
+            db.add_all(reviews)
+            await db.flush()
+            for review, created_at in zip(reviews, dates):
+                review.created_at = created_at
+            await db.flush()
+            expected = [r.review_id for r in sorted(
+                reviews, key=lambda r: (r.created_at or datetime.min, r.review_id), reverse=True)]
+
+            pages, cursor = [], None
+            while True:
+                response = Response()
+                rows = await fetch_page(db, select(Review).where(Review.product_id == product_id),
+                                        REVIEW_KEYSET, response, limit=page_size, cursor=cursor)
+                pages.append([r.review_id for r in rows])
+                cursor = response.headers.get(NEXT_CURSOR_HEADER)
+                if cursor is None:
+                    break
+            await db.close()
+            await outer.rollback()
+    except OSError as e:
+        pytest.skip(f"database unavailable: {e}")
+    finally:
+        await engine.dispose()
+    return pages, expected
+
+
+def test_pages_cover_every_row_once_including_null_keys():
+    pages, expected = asyncio.run(walk_reviews(page_size=3))
+    assert [len(page) for page in pages] == [3, 3, 2]
+    assert [review_id for page in pages for review_id in page] == expected
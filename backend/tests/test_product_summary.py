@@ -0,0 +1,173 @@
+"""Trigger-maintained product summary against retail.rebuild_product_summary()
+
+Needs a loaded catalog in DATABASE_URL with migrations/001_product_summary.sql
+applied (skipped otherwise). Every write happens in a transaction that is
+rolled back.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Tuple
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from database import ASYNC_DATABASE_URL, _async_connect_args
+
+SUMMARY_SQL = """
+    SELECT product_id, price_min, price_max, active_sku_count, in_stock,
+           rating_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5,
+           units_sold_7d, units_sold_30d, units_sold_total, return_count
+    FROM retail.product_summary
+    ORDER BY product_id
+"""
+# Triggers leave a bucket at zero when its sales are removed; the rebuild has none
+DAILY_SQL = """
+    SELECT product_id, sales_date, units FROM retail.product_sales_daily
+    WHERE units <> 0 ORDER BY product_id, sales_date
+"""
+
+
+async def tables(conn: AsyncConnection) -> Tuple[List[Any], List[Any]]:
+    return (await conn.execute(text(SUMMARY_SQL))).all(), (await conn.execute(text(DAILY_SQL))).all()
+
+
+async def write_everything(conn: AsyncConnection) -> Dict[str, int]:
+    """SKU, review, line item, return, move and cascading delete writes; returns the ids involved"""
+    async def one(sql: str, **params) -> Any:
+        return (await conn.execute(text(sql), params)).scalar()
+
+    ids: Dict[str, int] = {}
+    ids["customer"] = await one("SELECT min(customer_id) FROM retail.customer")
+    # Two existing products with an active SKU each, and a new one
+    ids["p"], ids["q"] = (await conn.execute(text("""
+        SELECT v.product_id FROM retail.product_variant v JOIN retail.sku s ON s.variant_id = v.variant_id
+        WHERE s.status = 'ACTIVE' GROUP BY v.product_id HAVING count(*) >= 2 ORDER BY v.product_id LIMIT 2
+    """))).scalars().all()
+    for name in ("p", "q"):
+        ids[f"{name}_variant"] = await one(
+            "SELECT min(variant_id) FROM retail.product_variant WHERE product_id = :p", p=ids[name])
+    ids["n"] = await one("INSERT INTO retail.product (product_name, status) VALUES ('Summary test', 'ACTIVE') "
+                         "RETURNING product_id")
+    ids["n_variant"] = await one("INSERT INTO retail.product_variant (product_id, color) VALUES (:p, 'Red') "
+                                 "RETURNING variant_id", p=ids["n"])
+
+    # SKUs: insert, reprice, restock, deactivate, move between products, delete
+    for n, price in enumerate((19.5, 42.0, 7.25)):
+        ids[f"n_sku{n}"] = await one(
+            "INSERT INTO retail.sku (variant_id, sku_code, price, inventory_quantity) "
+            "VALUES (:v, :code, :price, :qty) RETURNING sku_id",
+            v=ids["n_variant"], code=f"SUMMARY-TEST-{n}", price=price, qty=n)
+    ids["p_sku"] = await one("SELECT min(s.sku_id) FROM retail.sku s WHERE s.variant_id = :v AND status = 'ACTIVE'",
+                             v=ids["p_variant"])
+    await conn.execute(text("UPDATE retail.sku SET price = price + 1000 WHERE sku_id = :s"), {"s": ids["p_sku"]})
+    await conn.execute(text("UPDATE retail.sku SET inventory_quantity = 0 WHERE variant_id = :v"),
+                       {"v": ids["q_variant"]})
+    await conn.execute(text("UPDATE retail.sku SET status = 'INACTIVE' WHERE sku_id = :s"), {"s": ids["n_sku1"]})
+    await conn.execute(text("UPDATE retail.sku SET variant_id = :v WHERE sku_id = :s"),
+                       {"v": ids["q_variant"], "s": ids["n_sku2"]})
+    await conn.execute(text("DELETE FROM retail.sku WHERE sku_id = :s"), {"s": ids["n_sku1"]})
+
+    # Reviews: insert, re-rate, move, delete, and one without a rating
+    review_ids = []
+    for rating in (5, 4, 1, 3):
+        review_ids.append(await one(
+            "INSERT INTO retail.review (product_id, customer_id, rating) VALUES (:p, :c, :r) RETURNING review_id",
+            p=ids["n"], c=ids["customer"], r=rating))
+    await conn.execute(text("UPDATE retail.review SET rating = 2 WHERE review_id = :r"), {"r": review_ids[0]})
+    await conn.execute(text("UPDATE retail.review SET product_id = :p WHERE review_id = :r"),
+                       {"p": ids["p"], "r": review_ids[1]})
+    await conn.execute(text("DELETE FROM retail.review WHERE review_id = :r"), {"r": review_ids[2]})
+
+    # Orders today, 10 and 40 days ago (inside and outside the 7/30 day windows)
+    orders = []
+    for days in (0, 10, 40):
+        orders.append(await one(
+            "INSERT INTO retail.\"order\" (customer_id, order_number, order_date, subtotal, total_amount) "
+            "VALUES (:c, :number, CURRENT_TIMESTAMP - make_interval(days => :days), 0, 0) RETURNING order_id",
+            c=ids["customer"], number=f"SUMMARY-TEST-{days}", days=days))
+    line_items = []
+    for order_id in orders:
+        for sku_key, quantity in (("n_sku0", 2), ("p_sku", 3), ("n_sku2", 1)):
+            line_items.append(await one(
+                "INSERT INTO retail.order_line_item (order_id, sku_id, quantity, unit_price, line_total) "
+                "VALUES (:o, :s, :q, 0, 0) RETURNING line_item_id",
+                o=order_id, s=ids[sku_key], q=quantity))
+    await conn.execute(text("UPDATE retail.order_line_item SET quantity = 5 WHERE line_item_id = :l"),
+                       {"l": line_items[0]})
+    await conn.execute(text("UPDATE retail.order_line_item SET sku_id = :s WHERE line_item_id = :l"),
+                       {"s": ids["p_sku"], "l": line_items[3]})
+    await conn.execute(text("UPDATE retail.order_line_item SET order_id = :o WHERE line_item_id = :l"),
+                       {"o": orders[2], "l": line_items[1]})
+    await conn.execute(text("DELETE FROM retail.order_line_item WHERE line_item_id = :l"), {"l": line_items[4]})
+
+    # Returns: insert, point at another line item, delete, and one without a line item
+    returns = []
+    for order_id, line_item_id in ((orders[0], line_items[0]), (orders[0], line_items[2]),
+                                   (orders[1], line_items[5]), (orders[1], None)):
+        returns.append(await one(
+            "INSERT INTO retail.return_request (order_id, line_item_id) VALUES (:o, :l) RETURNING return_id",
+            o=order_id, l=line_item_id))
+    await conn.execute(text("UPDATE retail.return_request SET line_item_id = :l WHERE return_id = :r"),
+                       {"l": line_items[1], "r": returns[1]})
+    await conn.execute(text("DELETE FROM retail.return_request WHERE return_id = :r"), {"r": returns[2]})
+
+    # Moves: an order to another day, a SKU with sales and a return, and a variant of another product
+    await conn.execute(text("UPDATE retail.\"order\" SET order_date = order_date - interval '20 days' "
+                            "WHERE order_id = :o"), {"o": orders[0]})
+    await conn.execute(text("UPDATE retail.sku SET variant_id = :v WHERE sku_id = :s"),
+                       {"v": ids["q_variant"], "s": ids["n_sku0"]})
+    await conn.execute(text("UPDATE retail.product_variant SET product_id = :p WHERE variant_id = :v"),
+                       {"p": ids["n"], "v": ids["q_variant"]})
+
+    # Cascades: an order takes its line items along, then a product its variants, SKUs and reviews
+    await conn.execute(text("DELETE FROM retail.return_request WHERE order_id = :o"), {"o": orders[1]})
+    await conn.execute(text("DELETE FROM retail.\"order\" WHERE order_id = :o"), {"o": orders[1]})
+    ids["gone"] = await one("INSERT INTO retail.product (product_name) VALUES ('Summary test gone') "
+                            "RETURNING product_id")
+    gone_variant = await one("INSERT INTO retail.product_variant (product_id) VALUES (:p) RETURNING variant_id",
+                             p=ids["gone"])
+    await conn.execute(text("INSERT INTO retail.sku (variant_id, sku_code, price) VALUES (:v, 'SUMMARY-GONE', 5)"),
+                       {"v": gone_variant})
+    await conn.execute(text("INSERT INTO retail.review (product_id, rating) VALUES (:p, 4)"), {"p": ids["gone"]})
+    await conn.execute(text("DELETE FROM retail.product WHERE product_id = :p"), {"p": ids["gone"]})
+    return ids
+
+
+async def compare_with_rebuild():
+    engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool, connect_args=_async_connect_args())
+    try:
+        async with engine.connect() as conn:
+            outer = await conn.begin()
+            if await conn.scalar(text("SELECT to_regproc('retail.rebuild_product_summary')")) is None:
+                pytest.skip("product summary migration not applied")
+            if not await conn.scalar(text("SELECT count(*) >= 2 FROM retail.customer")):
+                pytest.skip("no catalog loaded")
+            # Start from a summary consistent with the base tables
+            await conn.execute(text("SELECT retail.rebuild_product_summary()"))
+            before = await tables(conn)
+
+            ids = await write_everything(conn)
+            maintained = await tables(conn)
+            await conn.execute(text("SELECT retail.rebuild_product_summary()"))
+            rebuilt = await tables(conn)
+            await outer.rollback()
+    except OSError as e:
+        pytest.skip(f"database unavailable: {e}")
+    finally:
+        await engine.dispose()
+    return ids, before, maintained, rebuilt
+
+
+def test_triggers_keep_the_summary_equal_to_a_rebuild():
+    ids, before, maintained, rebuilt = asyncio.run(compare_with_rebuild())
+    (summary, daily), (rebuilt_summary, rebuilt_daily) = maintained, rebuilt
+
+    assert summary == rebuilt_summary
+    assert daily == rebuilt_daily
+    # The writes did change the summary, and the deleted product has no row
+    assert summary != before[0]
+    assert ids["gone"] not in {row.product_id for row in summary}
+    n = next(row for row in summary if row.product_id == ids["n"])
+    assert n.rating_count == 2 and n.units_sold_total > 0 and n.return_count > 0
@@ -0,0 +1,101 @@
+"""Customer recommendations cost a fixed number of statements, whatever the history size
+
+Needs a loaded catalog in DATABASE_URL (skipped otherwise). The order
+history is inserted in a transaction that is rolled back.
+"""
+
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+import agents.recommender_agent as recommender_agent
+from agents.product_enrichment import ProductEnricher
+from database import ASYNC_DATABASE_URL, _async_connect_args
+from models import Customer, Order, OrderLineItem, SKU
+
+ORDER_COUNTS = [1, 25]
+
+
+async def seed_customer(db: AsyncSession, sku_ids: List[int], orders: int, rng: random.Random) -> int:
+    customer = Customer(email=f"test-{uuid.uuid4().hex}@example.com", first_name="Test", last_name="Customer")
+    db.add(customer)
+    await db.flush()
+    now = datetime.now()
+    for n in range(orders):
+        order = Order(customer_id=customer.customer_id, order_number=f"TEST-{uuid.uuid4().hex[:12]}",
+                      order_status="COMPLETED", order_date=now - timedelta(days=n),
+                      subtotal=0, tax_amount=0, shipping_amount=0, total_amount=0)
+        db.add(order)
+        await db.flush()
+        for sku_id in rng.sample(sku_ids, 3):
+            db.add(OrderLineItem(order_id=order.order_id, sku_id=sku_id, quantity=1, unit_price=0, line_total=0))
+    await db.flush()
+    return customer.customer_id
+
+
+async def count_statements(order_counts: List[int]) -> Dict[int, Dict[str, int]]:
+    """Statements per candidate selection and per full recommendation, by history size"""
+    engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool, connect_args=_async_connect_args())
+    statements = {"count": 0}
+
+    def count_statement(*args):
+        statements["count"] += 1
+
+    try:
+        async with engine.connect() as conn:
+            outer = await conn.begin()
+            db = AsyncSession(bind=conn, expire_on_commit=False)
+            sku_ids = list((await db.execute(
+                select(SKU.sku_id).where(SKU.status == "ACTIVE").order_by(SKU.sku_id).limit(300)
+            )).scalars().all())
+            if len(sku_ids) < 3:
+                pytest.skip("no catalog loaded")
+
+            agent = recommender_agent.PostPurchaseRecommenderAgent()
+            rng = random.Random(7)
+            counts = {}
+            event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+            for orders in order_counts:
+                event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+                customer_id = await seed_customer(db, sku_ids, orders, rng)
+                event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+                db.expunge_all()
+
+                statements["count"] = 0
+                candidates = await agent._select_customer_candidates(db, customer_id)
+                selection = statements["count"]
+
+                statements["count"] = 0
+                recommendations = await agent._get_customer_recommendations(db, customer_id)
+                counts[orders] = {"selection": selection, "recommendation": statements["count"],
+                                  "candidates": len(candidates), "recommended": len(recommendations)}
+            event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+            await db.close()
+            await outer.rollback()
+    except OSError as e:
+        pytest.skip(f"database unavailable: {e}")
+    finally:
+        await engine.dispose()
+    return counts
+
+
+def test_customer_recommendations_use_a_fixed_number_of_statements(monkeypatch):
+    # Uncached enrichment, so every call pays its one lookup
+    enricher = ProductEnricher(ttl_seconds=0)
+    monkeypatch.setattr(recommender_agent, "get_product_enricher", lambda: enricher)
+
+    counts = asyncio.run(count_statements(ORDER_COUNTS))
+
+    for orders in ORDER_COUNTS:
+        assert counts[orders]["candidates"] > 0, counts
+        # One CTE query selects the candidates...
+        assert counts[orders]["selection"] == 1, counts
+        # ...and one batched query enriches them
+        assert counts[orders]["recommendation"] == 2, counts
@@ -0,0 +1,178 @@
+"""
+Vector index management
+
+pgvector ANN indexes on the embedding columns. ivfflat trains its list
+centroids on the rows present when the index is built, so an index created
+on an empty table (as init.sql used to) clusters nothing and has to be
+rebuilt once vectors are loaded, and again as the table grows. HNSW needs
+no training and absorbs inserts, at the cost of a slower build and a
+larger index.
+
+ensure_vector_indexes() builds an index only when it is missing, has a
+different type or parameters than configured, or is an ivfflat index
+trained on less than half of today's rows. Builds run CONCURRENTLY under a
+temporary name and are then swapped in, so writes continue meanwhile. The
+row count an index was built on is kept in its comment.
+
+Run it with scripts/build_vector_indexes.py (generate_embeddings.py also
+calls it after embedding).
+"""
+
+import math
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import Config
+
+# Table -> index on its embedding column (names as created by init.sql)
+VECTOR_INDEXES: Dict[str, str] = {
+    "product": "idx_product_embedding",
+    "review": "idx_review_embedding",
+    "style_profile": "idx_style_profile_embedding",
+}
+
+# pgvector's defaults, for indexes created without WITH (...)
+DEFAULT_OPTIONS: Dict[str, Dict[str, int]] = {
+    "hnsw": {"m": 16, "ef_construction": 64},
+    "ivfflat": {"lists": 100},
+}
+
+_COMMENT_RE = re.compile(r"vector_index rows=(\d+)")
+
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector's sizing guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond"""
+    return max(1, rows // 1000) if rows <= 1_000_000 else int(math.sqrt(rows))
+
+
+def index_options(method: str, rows: int, m: Optional[int] = None,
+                  ef_construction: Optional[int] = None, lists: Optional[int] = None) -> Dict[str, int]:
+    """Build parameters for `method`, from the arguments or config"""
+    if method == "hnsw":
+        return {
+            "m": m or Config.VECTOR_INDEX_HNSW_M,
+            "ef_construction": ef_construction or Config.VECTOR_INDEX_HNSW_EF_CONSTRUCTION,
+        }
+    if method == "ivfflat":
+        return {"lists": lists or Config.VECTOR_INDEX_IVFFLAT_LISTS or ivfflat_lists(rows)}
+    raise ValueError(f"Invalid vector index type: {method}. Must be one of: ['hnsw', 'ivfflat']")
+
+
+async def describe_index(conn, index_name: str, schema: str = "retail") -> Optional[Dict[str, Any]]:
+    """Type, options and trained row count of an existing index (None if absent)"""
+    row = await conn.fetchrow(
+        """
+        SELECT am.amname, c.reloptions, obj_description(c.oid, 'pg_class') AS comment,
+               pg_relation_size(c.oid) AS bytes
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE n.nspname = $1 AND c.relname = $2
+        """,
+        schema, index_name
+    )
+    if row is None:
+        return None
+    options = dict(DEFAULT_OPTIONS.get(row["amname"], {}))
+    for option in row["reloptions"] or []:
+        name, _, value = option.partition("=")
+        options[name] = int(value) if value.isdigit() else value
+    built = _COMMENT_RE.search(row["comment"] or "")
+    return {
+        "method": row["amname"],
+        "options": options,
+        "built_rows": int(built.group(1)) if built else None,
+        "bytes": row["bytes"],
+    }
+
+
+def rebuild_reason(current: Optional[Dict[str, Any]], method: str,
+                   options: Dict[str, int], rows: int) -> Optional[str]:
+    """Why the index should be (re)built, or None when it is fine as is"""
+    if current is None:
+        return "missing"
+    if current["method"] != method:
+        return f"{current['method']} -> {method}"
+    if method == "ivfflat":
+        built = current["built_rows"]
+        if built is None:
+            return "ivfflat of unknown training size"
+        if rows >= 2 * max(built, 1):
+            return f"trained on {built:,} rows, now {rows:,}"
+        # An explicit list count must match; an automatic one may drift until retraining
+        if Config.VECTOR_INDEX_IVFFLAT_LISTS and current["options"].get("lists") != options["lists"]:
+            return "lists changed"
+        return None
+    changed = [name for name, value in options.items() if current["options"].get(name) != value]
+    return f"{', '.join(changed)} changed" if changed else None
+
+
+async def build_vector_index(
+    conn,
+    table: str,
+    index_name: str,
+    method: str,
+    options: Dict[str, int],
+    schema: str = "retail",
+    column: str = "embedding",
+    opclass: str = "vector_cosine_ops"
+) -> float:
+    """(Re)build an index and swap it in; returns build seconds
+
+    `conn` is a raw asyncpg connection outside any transaction, as
+    CREATE INDEX CONCURRENTLY requires.
+    """
+    staging = f"{index_name}_build"
+    with_clause = ", ".join(f"{name} = {value}" for name, value in options.items())
+    rows = await conn.fetchval(f"SELECT count({column}) FROM {schema}.{table}")
+
+    # Left over (invalid) when an earlier build was interrupted
+    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema}.{staging}")
+    await conn.execute(f"SET maintenance_work_mem = '{Config.VECTOR_INDEX_MAINTENANCE_WORK_MEM}'")
+    start = time.perf_counter()
+    try:
+        await conn.execute(
+            f"CREATE INDEX CONCURRENTLY {staging} ON {schema}.{table} "
+            f"USING {method} ({column} {opclass}) WITH ({with_clause})"
+        )
+    finally:
+        await conn.execute("RESET maintenance_work_mem")
+    seconds = time.perf_counter() - start
+
+    async with conn.transaction():
+        await conn.execute(f"DROP INDEX IF EXISTS {schema}.{index_name}")
+        await conn.execute(f"ALTER INDEX {schema}.{staging} RENAME TO {index_name}")
+        await conn.execute(f"COMMENT ON INDEX {schema}.{index_name} IS 'vector_index rows={rows}'")
+    return seconds
+
+
+async def ensure_vector_indexes(
+    conn,
+    tables: Optional[Iterable[str]] = None,
+    method: Optional[str] = None,
+    force: bool = False,
+    **option_overrides: Optional[int]
+) -> List[Dict[str, Any]]:
+    """Bring each table's embedding index in line with config; returns what was done per table"""
+    method = (method or Config.VECTOR_INDEX_TYPE).lower()
+    results = []
+    for table in tables or VECTOR_INDEXES:
+        index_name = VECTOR_INDEXES[table]
+        rows = await conn.fetchval(f"SELECT count(embedding) FROM retail.{table}")
+        options = index_options(method, rows, **option_overrides)
+        current = await describe_index(conn, index_name)
+        reason = "forced" if force else rebuild_reason(current, method, options, rows)
+        result = {"table": table, "index": index_name, "method": method, "options": options,
+                  "rows": rows, "action": "kept", "reason": reason}
+        if reason is not None:
+            if method == "ivfflat" and rows == 0:
+                # Training on nothing is what this module exists to avoid
+                result["action"] = "skipped"
+                result["reason"] = "no embeddings to train ivfflat on yet"
+            else:
+                result["seconds"] = await build_vector_index(conn, table, index_name, method, options)
+                result["action"] = "built"
+        results.append(result)
+    return results
+
@@ -174,15 +174,14 @@ CREATE TABLE IF NOT EXISTS retail.return_request (
 
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_product_hierarchy ON retail.product(hierarchy_id);
-CREATE INDEX IF NOT EXISTS idx_product_embedding ON retail.product USING ivfflat (embedding vector_cosine_ops);
 CREATE INDEX IF NOT EXISTS idx_sku_variant ON retail.sku(variant_id);
 CREATE INDEX IF NOT EXISTS idx_variant_product ON retail.product_variant(product_id);
 CREATE INDEX IF NOT EXISTS idx_review_product ON retail.review(product_id);
-CREATE INDEX IF NOT EXISTS idx_review_embedding ON retail.review USING ivfflat (embedding vector_cosine_ops);
 CREATE INDEX IF NOT EXISTS idx_order_customer ON retail.order(customer_id);
 CREATE INDEX IF NOT EXISTS idx_order_date ON retail.order(order_date);
 CREATE INDEX IF NOT EXISTS idx_style_profile_customer ON retail.style_profile(customer_id);
-CREATE INDEX IF NOT EXISTS idx_style_profile_embedding ON retail.style_profile USING ivfflat (embedding vector_cosine_ops);
+-- Embedding indexes (HNSW or trained ivfflat) are built once vectors exist:
+-- backend/scripts/build_vector_indexes.py, run by generate_embeddings.py
 
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -3,17 +3,17 @@
 import { useState, useRef, useEffect } from 'react'
 import { Send, Bot, User, Sparkles } from 'lucide-react'
 import { motion, AnimatePresence } from 'framer-motion'
-import axios from 'axios'
 import { useChatStore, Message } from '@/store/chatStore'
 import { useCartStore } from '@/store/cartStore'
 import { useAuthStore } from '@/store/authStore'
+import { API_URL } from '@/lib/config'
 
 interface ChatInterfaceProps {
   onProductsUpdate?: (products: any[]) => void
 }
 
 export default function ChatInterface({ onProductsUpdate }: ChatInterfaceProps) {
-  const { messages, addMessage } = useChatStore()
+  const { sessionId, messages, addMessage, updateLastMessage } = useChatStore()
   const { items, clearCart } = useCartStore()
   const { user } = useAuthStore()
 
@@ -50,32 +50,68 @@ export default function ChatInterface({ onProductsUpdate }: ChatInterfaceProps)
     setIsLoading(true)
 
     try {
-      const response = await axios.post('http://localhost:8000/api/agent/chat', {
-        message: input,
-        customer_id: user?.customer_id,
-        context: {
-          cart_items: items,
-          page_context: window.location.pathname
-        }
+      const response = await fetch(`${API_URL}/api/agent/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          message: input,
+          customer_id: user?.customer_id,
+          session_id: sessionId,
+          context: {
+            cart_items: items,
+            page_context: window.location.pathname
+          }
+        })
       })
-
-      const assistantMessage: Message = {
-        role: 'assistant',
-        content: response.data.response,
-        agent: response.data.agent_name,
-        data: response.data.data
+      if (!response.ok || !response.body) {
+        throw new Error(`Chat request failed with status ${response.status}`)
       }
 
-      addMessage(assistantMessage)
-
-      // Handle client-side actions based on agent response
-      if (response.data.data?.clear_cart) {
-        clearCart()
-      }
-
-      // Update products if search results
-      if (response.data.data?.products && onProductsUpdate) {
-        onProductsUpdate(response.data.data.products)
+      // Server-sent events: agent -> token* -> done
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let content = ''
+      let streamDone = false
+
+      while (!streamDone) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+
+        const events = buffer.split('\n\n')
+        buffer = events.pop() || ''
+
+        for (const raw of events) {
+          const eventName = raw.match(/^event: (.*)$/m)?.[1]
+          const payload = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}')
+
+          if (eventName === 'agent') {
+            addMessage({ role: 'assistant', content: '', agent: payload.agent_name })
+          } else if (eventName === 'token') {
+            content += payload.text
+            updateLastMessage({ content })
+          } else if (eventName === 'done') {
+            updateLastMessage({
+              content: payload.response,
+              agent: payload.agent_name,
+              data: payload.data
+            })
+
+            // Handle client-side actions based on agent response
+            if (payload.data?.clear_cart) {
+              clearCart()
+            }
+
+            // Update products if search results
+            if (payload.data?.products && onProductsUpdate) {
+              onProductsUpdate(payload.data.products)
+            }
+            streamDone = true
+          } else if (eventName === 'error') {
+            throw new Error(payload.detail)
+          }
+        }
       }
     } catch (error) {
       console.error('Failed to send message:', error)
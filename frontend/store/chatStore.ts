@@ -9,8 +9,10 @@ export interface Message {
 }
 
 interface ChatState {
+    sessionId: string
     messages: Message[]
     addMessage: (message: Message) => void
+    updateLastMessage: (update: Partial<Message>) => void
     setMessages: (messages: Message[]) => void
     clearMessages: () => void
 }
@@ -18,6 +20,7 @@ interface ChatState {
 export const useChatStore = create<ChatState>()(
     persist(
         (set) => ({
+            sessionId: crypto.randomUUID(),
             messages: [
                 {
                     role: 'assistant',
@@ -26,8 +29,15 @@ export const useChatStore = create<ChatState>()(
                 }
             ],
             addMessage: (message) => set((state) => ({ messages: [...state.messages, message] })),
+            updateLastMessage: (update) => set((state) => ({
+                messages: [
+                    ...state.messages.slice(0, -1),
+                    { ...state.messages[state.messages.length - 1], ...update }
+                ]
+            })),
             setMessages: (messages) => set({ messages }),
             clearMessages: () => set({
+                sessionId: crypto.randomUUID(),
                 messages: [{
                     role: 'assistant',
                     content: "Hi! I'm your AI shopping assistant. How can I help you today?",